@@ -7,14 +7,16 @@ by differentiating the discrepancy function.
 @author: shvatov
 """
 from dataclasses import dataclass
-from typing import List
 
 import numpy as np
-from sympy import I, shape, simplify, expand, Symbol, Expr
+from scipy.sparse import csr_matrix
+from sympy import I, shape
 from sympy.matrices import Matrix, zeros
 from sympy.printing import pprint
 
-from equation import EquationSystem
+from assembly import SYSTEM_VAR_NUM, vector_to_mesh
+from discrepancy import discrepancy
+from jacobian import calculate_colored_jacobian
 
 DISCREPANCY_ITER_DELTA = 1.0
 APPROXIMATION_DELTA = complex(1.0, 0)
@@ -30,7 +32,11 @@ class MatrixAnalysisParams:
     print_matrix: bool = False
     compare_with_fortran: bool = False
     compare_with_discrepancy: bool = False
-    calc_cond_number: bool = False
+
+    def is_required(self) -> bool:
+        return self.print_matrix \
+               or self.compare_with_fortran \
+               or self.compare_with_discrepancy
 
 
 def load_fortran_matrix(fortran_matr_path: str, matrix_dim: int) -> Matrix:
@@ -70,61 +76,23 @@ def load_fortran_matrix(fortran_matr_path: str, matrix_dim: int) -> Matrix:
         return zeros(rows=matrix_dim, cols=matrix_dim)
 
 
-def calculate_discrepancy_matrix(iter_delta: complex, intervals_num: int) -> Matrix:
+def calculate_discrepancy_matrix(iter_delta: complex, intervals_num: int) -> csr_matrix:
     """
-    Calculates the Jacobian based on the discrepancy differential.
+    Calculates the Jacobian based on the discrepancy differential. Columns are perturbed
+    simultaneously using graph coloring of the stencil, see calculate_colored_jacobian.
     Parameters
     ----------
-    iter_delta - value of the delta, which will be added to one of the elements on each iteration.
+    iter_delta - value of the delta, which will be added to the perturbed elements on each iteration.
+    intervals_num - number of the intervals in the mesh.
 
     Returns
     -------
-    Jacobian matrix.
+    Sparse Jacobian matrix.
     """
-    equation_system = EquationSystem.acquire_equation_system(intervals_number=intervals_num)
-    equations, variables, coefficients = equation_system.ordered_equations(), \
-                                         equation_system.ordered_variables(), \
-                                         equation_system.coefficients()
-    const_sub_eq = [eq.subs(coefficients) for eq in equations]
-
-    def calculate_discrepancy(var: Symbol, zero_approx: List[Expr]) -> List[Expr]:
-        left_vars = list(variables)
-        left_vars.remove(var)
-
-        sub_eq = [eq.subs({v: 0.0 for v in left_vars}) for eq in const_sub_eq]
-        eval_eq = [eq.subs({var: iter_delta}) for eq in sub_eq]
-
-        return [
-            simplify(expand((e1 - e0) / iter_delta))
-            for e1, e0 in zip(eval_eq, zero_approx)
-        ]
-
-    columns = []
-    zero_discrepancy = [eq.subs({v: 0.0 for v in variables}) for eq in const_sub_eq]
-    for v in variables:
-        columns.append(calculate_discrepancy(v, zero_discrepancy))
-    return Matrix(columns).T
-
-
-def calculate_cond_number(matrix: Matrix) -> complex:
-    """
-    Calculates the condition number of the given matrix.
-    Parameters
-    ----------
-    matrix - matrix, which condition number is required to be calculated.
-
-    Returns
-    -------
-    Condition number of the matrix calculated using numpy or (0, 0) if something goes wrong.
-    """
-    # noinspection PyBroadException
-    try:
-        numpy_matr = np.array(matrix).astype(np.cdouble)
-        cond_number = np.linalg.cond(numpy_matr, p='fro')
-        return complex(cond_number.real, cond_number.imag)
-    except Exception as e:
-        print(f"Cannot calculate condition number: {e}")
-        return complex(0, 0)
+    zero_approximation = np.zeros((intervals_num + 1) * SYSTEM_VAR_NUM, dtype=np.cdouble)
+    return calculate_colored_jacobian(residual=lambda x: discrepancy(vector_to_mesh(x)),
+                                      approximation=zero_approximation,
+                                      delta=iter_delta)
 
 
 def compare_matrices(lhs: Matrix, rhs: Matrix, approx_delta: complex) -> None:
@@ -156,6 +124,31 @@ def compare_matrices(lhs: Matrix, rhs: Matrix, approx_delta: complex) -> None:
         print("No elements surpass specified delta!")
 
 
+def compare_sparse_matrices(lhs: csr_matrix, rhs: csr_matrix, approx_delta: complex) -> None:
+    """
+    Compares given sparse matrices and prints the elements, which differ by more than the specified delta.
+    Parameters
+    ----------
+    lhs - first matrix to compare
+    rhs - second matrix to compare
+    approx_delta - delta between elements, which considered to be a threshold value.
+
+    Returns
+    -------
+    None.
+    """
+    diff = (lhs - rhs).tocoo()
+    lhs, rhs = lhs.tocsr(), rhs.tocsr()
+
+    delta_present = False
+    for i, j, value in zip(diff.row, diff.col, diff.data):
+        if abs(value) > abs(approx_delta):
+            print(f"Delta{(i, j)} = {value} = {lhs[i, j]} - {rhs[i, j]}")
+            delta_present = True
+    if not delta_present:
+        print("No elements surpass specified delta!")
+
+
 def analyse_matrix(analytics_matr: Matrix,
                    params: MatrixAnalysisParams = None) -> None:
     """
@@ -177,10 +170,6 @@ def analyse_matrix(analytics_matr: Matrix,
         print("Analytics matrix:")
         pprint(analytics_matr)
 
-    if params.calc_cond_number:
-        analytics_matr_cond_number = calculate_cond_number(analytics_matr)
-        print(f"Condition number is {analytics_matr_cond_number}")
-
     analytics_matr_dim, _ = shape(analytics_matr)
     if params.compare_with_fortran:
         fortran_matr = load_fortran_matrix(fortran_matr_path=FORTRAN_MATRIX_PATH,
@@ -195,5 +184,7 @@ def analyse_matrix(analytics_matr: Matrix,
                                                         intervals_num=intervals)
 
         print("Discrepancy based matrix:")
-        pprint(discrepancy_matr)
-        compare_matrices(analytics_matr, discrepancy_matr, approx_delta=APPROXIMATION_DELTA)
+        print(discrepancy_matr)
+        compare_sparse_matrices(csr_matrix(np.array(analytics_matr).astype(np.cdouble)),
+                                discrepancy_matr,
+                                approx_delta=APPROXIMATION_DELTA)
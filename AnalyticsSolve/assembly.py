@@ -0,0 +1,358 @@
+r"""
+This module contains the numeric assembly of the equation system. Unlike EquationSystem,
+it never builds Sympy expressions: the block-tridiagonal matrix A and the right side vector b
+are calculated directly from numpy arrays of r[i], r[i +- 1/2], the Gaussian omega profile and
+the coefficients of the system. The ordering of the equations and variables is the same as in
+EquationSystem.ordered_equations() and EquationSystem.ordered_variables().
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from typing import Dict, Tuple, List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sympy import Symbol
+
+from equation import EquationSystem, DEFAULT_RADIUS
+
+# Number of the functions (variables) in a single point of the mesh
+SYSTEM_VAR_NUM = 8
+
+# Names of the functions in the order used by EquationSystem.ordered_variables()
+FUNCTION_NAMES = ("r11", "r22", "r33", "r12", "r11c", "r22c", "r33c", "r12c")
+
+# Values of the functions on the right border (i = N)
+RIGHT_BOUNDARY_VALUES = np.array([0.5, 0.5, 0.0, 0.0, 0.5, 0.5, 0.0, 0.0], dtype=np.cdouble)
+
+
+def default_coefficients() -> Dict[str, complex]:
+    r"""
+    Returns the values of the constant coefficients of the system, where key is the name
+    of the symbol used in EquationSystem (e.g. "C1", "Gamma", "D11").
+    """
+    return {c.symbol.name: c.value for c in EquationSystem.constant_coefficients()}
+
+
+def prepare_coefficients(overrides: Optional[Dict[str, complex]] = None) -> Dict[str, complex]:
+    r"""
+    Returns the default values of the coefficients updated with provided ones.
+    Parameters
+    ----------
+    overrides - dictionary, where key is the name of the coefficient and value is its new value.
+
+    Returns
+    -------
+    Dictionary with the values of all coefficients.
+    """
+    coefficients = default_coefficients()
+    if overrides is not None:
+        unknown = set(overrides.keys()) - set(coefficients.keys())
+        assert len(unknown) == 0, f"Unknown coefficients: {unknown}"
+        coefficients.update(overrides)
+    return coefficients
+
+
+def symbol_coefficients(coefficients: Dict[Symbol, complex]) -> Dict[str, complex]:
+    r"""
+    Converts the values of the coefficients of the equation system (see EquationSystem.coefficients()) into
+    the overrides of prepare_coefficients. The values of r and h of the mesh are skipped.
+    """
+    defaults = default_coefficients()
+    return {symbol.name: value for symbol, value in coefficients.items() if symbol.name in defaults}
+
+
+@dataclass
+class MeshValues:
+    r"""
+    Values of r[i], r[i + 1/2] and r[i - 1/2] in the points of the mesh.
+    r_plus_half[i] = r[i + 1/2] for i in [0; N - 1], r_minus_half[i] = r[i + 1 - 1/2] for i in [0; N - 1].
+    """
+    h: float
+    r: np.ndarray
+    r_plus_half: np.ndarray
+    r_minus_half: np.ndarray
+
+    @staticmethod
+    def create(intervals_number: int, radius: float) -> "MeshValues":
+        assert intervals_number > 0
+        assert radius > 0
+
+        # the same expressions as in EquationSystem, so that the values are equal bit by bit
+        n, indices = intervals_number, np.arange(0, intervals_number + 1)
+        return MeshValues(h=radius / n,
+                          r=radius / n * indices,
+                          r_plus_half=radius / n * indices[:-1] + radius / (2 * n),
+                          r_minus_half=radius / n * indices[1:] - radius / (2 * n))
+
+
+def calculate_omega(r: np.ndarray, rabi_frequency: complex, a: complex) -> np.ndarray:
+    r"""
+    Calculates the Gaussian profile of the Rabi frequency omega = C * exp(-(r / a) ^ 2).
+    """
+    return rabi_frequency * np.exp(-(r / a) ** 2)
+
+
+def calculate_optical_coherences(ro: np.ndarray,
+                                 omega_1: np.ndarray,
+                                 omega_2: np.ndarray,
+                                 coefficients: Dict[str, complex],
+                                 omega_1c: Optional[np.ndarray] = None,
+                                 omega_2c: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray,
+                                                                                 np.ndarray, np.ndarray]:
+    r"""
+    Calculates the adiabatically eliminated optical coherences Ro13, Ro13*, Ro23, Ro23*
+    (see calculate_relaxation_terms for the parameters).
+    """
+    r11, r22, r33, r12, r11c, r22c, r33c, r12c = ro
+    o1, o2 = omega_1, omega_2
+    o1c = np.conj(omega_1) if omega_1c is None else omega_1c
+    o2c = np.conj(omega_2) if omega_2c is None else omega_2c
+    gamma, delta_1, delta_2 = coefficients["Gamma"], coefficients["Delta1"], coefficients["Delta2"]
+
+    ro_13 = (1j * o2 * r12 - 1j * o1 * (r33 - r11)) / (1j * delta_1 + gamma)
+    ro_13c = (-1j * o2c * r12c + 1j * o1c * (r33c - r11c)) / (-1j * delta_1 + gamma)
+    ro_23 = (1j * o1 * r12c - 1j * o1 * (r33 - r22)) / (1j * delta_2 + gamma)
+    ro_23c = (-1j * o1c * r12 + 1j * o1c * (r33c - r22c)) / (-1j * delta_2 + gamma)
+    return ro_13, ro_13c, ro_23, ro_23c
+
+
+def calculate_relaxation_terms(ro: np.ndarray,
+                               omega_1: np.ndarray,
+                               omega_2: np.ndarray,
+                               coefficients: Dict[str, complex],
+                               omega_1c: Optional[np.ndarray] = None,
+                               omega_2c: Optional[np.ndarray] = None) -> np.ndarray:
+    r"""
+    Calculates the expressions A1, ..., A4, A1*, ..., A4* (same as calculateA1, ... in Discrepancy.f90),
+    which are multiplied by h * r[i] in the equations of the system.
+    Parameters
+    ----------
+    ro - array with the shape (8, ...), which contains values of the functions
+    Ro11, Ro22, Ro33, Ro12, Ro11*, Ro22*, Ro33*, Ro12*.
+    omega_1, omega_2 - values of the Rabi frequencies, must be broadcastable to ro[0].
+    coefficients - values of the coefficients, see prepare_coefficients.
+    omega_1c, omega_2c - values, which replace the complex conjugated Rabi frequencies, by default conj(omega).
+    They are required, when the fields depend on the functions, so that the terms stay analytic in Ro11, ..., Ro12*.
+
+    Returns
+    -------
+    Array with the same shape as ro.
+    """
+    r11, r22, r33, r12, r11c, r22c, r33c, r12c = ro
+    o1, o2 = omega_1, omega_2
+    o1c = np.conj(omega_1) if omega_1c is None else omega_1c
+    o2c = np.conj(omega_2) if omega_2c is None else omega_2c
+
+    gamma_31, gamma_32 = coefficients["Gamma31"], coefficients["Gamma32"]
+    delta_1, delta_2 = coefficients["Delta1"], coefficients["Delta2"]
+    g_parallel = coefficients["GParallel"]
+    ro_12_decay = coefficients["GPerpendicular"] + coefficients["q"] ** 2 * coefficients["D12"]
+    ro_13, ro_13c, ro_23, ro_23c = calculate_optical_coherences(ro, omega_1, omega_2, coefficients, o1c, o2c)
+
+    return np.stack([
+        1j * o1 * ro_13c - 1j * o1c * ro_13 - gamma_31 * r33 + g_parallel * (r11 - r22),
+        1j * o2 * ro_23c - 1j * o2c * ro_23 - gamma_32 * r33 + g_parallel * (r22 - r11),
+        1j * o1c * ro_13 - 1j * o1 * ro_13c + 1j * o2c * ro_23 - 1j * o2 * ro_23c + (gamma_31 + gamma_32) * r33,
+        (1j * (delta_2 - delta_1) + ro_12_decay) * r12 - 1j * o2c * ro_13 + 1j * o1 * ro_23c,
+        -1j * o1c * ro_13 + 1j * o1 * ro_13c - gamma_31 * r33c + g_parallel * (r11c - r22c),
+        -1j * o2c * ro_23 + 1j * o2 * ro_23c - gamma_32 * r33c + g_parallel * (r22c - r11c),
+        -1j * o1 * ro_13c + 1j * o1c * ro_13 - 1j * o2 * ro_23c + 1j * o2c * ro_23 + (gamma_31 + gamma_32) * r33c,
+        (-1j * (delta_2 - delta_1) + ro_12_decay) * r12c + 1j * o2 * ro_13c - 1j * o1c * ro_23,
+    ])
+
+
+def diffusion_coefficients(coefficients: Dict[str, complex]) -> np.ndarray:
+    r"""
+    Returns the diffusion coefficients for each of the 8 functions in a single point.
+    """
+    d = [coefficients["D11"], coefficients["D22"], coefficients["D33"], coefficients["D12"]]
+    return np.array(d + d, dtype=np.cdouble)
+
+
+def cell_weights(mesh: MeshValues) -> np.ndarray:
+    r"""
+    Returns the weights h * r[i] of the relaxation terms in the equations of the points of the mesh
+    (h * r[1/2] / 4 in the point 0, zero in the Dirichlet point N).
+    """
+    n = mesh.r.shape[0] - 1
+    weight = np.empty(n + 1)
+    weight[0] = 1 / 4 * mesh.r_plus_half[0] * mesh.h
+    weight[1:n] = mesh.r[1:n] * mesh.h
+    weight[n] = 0.0
+    return weight
+
+
+def cross_section_weights(mesh: MeshValues) -> np.ndarray:
+    r"""
+    Returns the weights of the values in the points of the mesh, which give the average over the cross-section
+    of the cell 2 / R^2 * integral(f(r) r dr) calculated by the trapezoidal rule.
+    """
+    weight = mesh.r * mesh.h
+    weight[[0, -1]] /= 2
+    return weight / (mesh.r[-1] ** 2 / 2)
+
+
+@dataclass
+class BlockTridiagonalSystem:
+    r"""
+    Numeric representation of the system Ax = b, where A is block-tridiagonal with 8x8 blocks.
+    Block row i contains the equations of the point i, block column j - the variables of the point j.
+    Blocks, that couple neighbouring points, come from the diffusion terms only, thus they are diagonal
+    and only their diagonals are stored.
+
+    diagonal - array (N + 1, 8, 8), diagonal[i] = A(i, i).
+    lower - array (N, 8), lower[i - 1] = diag(A(i, i - 1)) for i in [1; N].
+    upper - array (N, 8), upper[i] = diag(A(i, i + 1)) for i in [0; N - 1].
+    rhs - array (N + 1, 8), rhs[i] = b(i).
+    """
+    diagonal: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    rhs: np.ndarray
+
+    @property
+    def intervals_number(self) -> int:
+        return self.diagonal.shape[0] - 1
+
+    @property
+    def dimension(self) -> int:
+        return self.diagonal.shape[0] * SYSTEM_VAR_NUM
+
+    def rhs_vector(self) -> np.ndarray:
+        return self.rhs.reshape(-1)
+
+    def to_csr(self) -> csr_matrix:
+        r"""
+        Converts the matrix A into the CSR format without forming any dense matrix.
+        """
+        points, size = self.diagonal.shape[0], SYSTEM_VAR_NUM
+
+        # each row contains: element of the lower block, row of the diagonal block, element of the upper block,
+        # which are already sorted by the column index
+        data = np.zeros((points, size, size + 2), dtype=np.cdouble)
+        data[1:, :, 0] = self.lower
+        data[:, :, 1:size + 1] = self.diagonal
+        data[:-1, :, size + 1] = self.upper
+
+        columns = np.empty((points, size, size + 2), dtype=np.int64)
+        offsets = (np.arange(points) * size)[:, None]
+        columns[:, :, 0] = offsets - size + np.arange(size)
+        columns[:, :, 1:size + 1] = (offsets + np.arange(size))[:, None, :]
+        columns[:, :, size + 1] = offsets + size + np.arange(size)
+
+        non_zero = data != 0
+        row_lengths = non_zero.sum(axis=2).reshape(-1)
+        index_pointers = np.concatenate([[0], np.cumsum(row_lengths)])
+        return csr_matrix((data[non_zero], columns[non_zero], index_pointers),
+                          shape=(self.dimension, self.dimension))
+
+
+def assemble_blocks(intervals_number: int,
+                    radius: float = DEFAULT_RADIUS,
+                    coefficients: Optional[Dict[str, complex]] = None,
+                    omega_1: Optional[np.ndarray] = None,
+                    omega_2: Optional[np.ndarray] = None,
+                    omega_1c: Optional[np.ndarray] = None,
+                    omega_2c: Optional[np.ndarray] = None) -> BlockTridiagonalSystem:
+    r"""
+    Assembles the blocks of the system in O(N) time and memory.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    omega_1, omega_2 - values of the Rabi frequencies in the points of the mesh, which replace
+    the Gaussian profiles if provided.
+    omega_1c, omega_2c - values, which replace the complex conjugated Rabi frequencies
+    (see calculate_relaxation_terms).
+
+    Returns
+    -------
+    Block representation of the system, see BlockTridiagonalSystem.
+    """
+    coefficients = prepare_coefficients(coefficients)
+    mesh = MeshValues.create(intervals_number, radius)
+    n, h = intervals_number, mesh.h
+
+    if omega_1 is None:
+        omega_1 = calculate_omega(mesh.r, coefficients["C1"], coefficients["a"])
+    if omega_2 is None:
+        omega_2 = calculate_omega(mesh.r, coefficients["C2"], coefficients["a"])
+
+    # relaxation[i, k, j] - coefficient of the function j in A(k) in the point i
+    unit = np.eye(SYSTEM_VAR_NUM, dtype=np.cdouble)[:, :, None]
+    relaxation = calculate_relaxation_terms(unit, omega_1, omega_2, coefficients,
+                                            omega_1c, omega_2c).transpose((2, 0, 1))
+
+    d = diffusion_coefficients(coefficients)
+    flux_plus = d[None, :] * (mesh.r_plus_half / h)[:, None]
+    flux_minus = d[None, :] * (mesh.r_minus_half / h)[:, None]
+
+    weight = cell_weights(mesh)
+    diagonal = -weight[:, None, None] * relaxation
+    diagonal_view = np.einsum("ikk->ik", diagonal)
+    diagonal_view[0:n] -= flux_plus
+    diagonal_view[1:n] -= flux_minus[0:n - 1]
+    diagonal[n] = np.eye(SYSTEM_VAR_NUM)
+
+    upper = flux_plus.copy()
+    lower = np.zeros((n, SYSTEM_VAR_NUM), dtype=np.cdouble)
+    lower[0:n - 1] = flux_minus[0:n - 1]
+
+    rhs = np.zeros((n + 1, SYSTEM_VAR_NUM), dtype=np.cdouble)
+    rhs[n] = RIGHT_BOUNDARY_VALUES
+
+    return BlockTridiagonalSystem(diagonal=diagonal, lower=lower, upper=upper, rhs=rhs)
+
+
+def assemble_sparse_system(intervals_number: int,
+                           radius: float = DEFAULT_RADIUS,
+                           coefficients: Optional[Dict[str, complex]] = None) -> Tuple[csr_matrix, np.ndarray]:
+    r"""
+    Assembles the system Ax = b, where A is a sparse CSR matrix. Provides the same matrix
+    as linear_eq_to_matrix applied to EquationSystem.ordered_equations(), but without
+    building any symbolic expressions.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+
+    Returns
+    -------
+    Tuple of the matrix A and the vector b.
+    """
+    system = assemble_blocks(intervals_number, radius, coefficients)
+    return system.to_csr(), system.rhs_vector()
+
+
+def vector_to_mesh(vector: np.ndarray) -> np.ndarray:
+    r"""
+    Converts the vector of the variables ordered as in EquationSystem.ordered_variables()
+    into the matrix (8, N + 1) of the functions values in the points of the mesh.
+    """
+    return vector.reshape(-1, SYSTEM_VAR_NUM).T
+
+
+def mesh_to_vector(ro_mesh: np.ndarray) -> np.ndarray:
+    r"""
+    Converts the matrix (8, N + 1) of the functions values in the points of the mesh
+    into the vector of the variables ordered as in EquationSystem.ordered_variables().
+    """
+    return ro_mesh.T.reshape(-1)
+
+
+def backward_error(A: csr_matrix, b: np.ndarray, x: np.ndarray, matrix_norm: Optional[float] = None) -> float:
+    r"""
+    Returns the normwise backward error max|b - Ax| / (||A|| max|x| + max|b|), where ||A|| is the infinity norm.
+    """
+    matrix_norm = matrix_norm if matrix_norm is not None else float(abs(A).sum(axis=1).max())
+    return float(np.abs(b - A @ x).max() / (matrix_norm * np.abs(x).max() + np.abs(b).max()))
+
+
+def ordered_variable_names(intervals_number: int) -> List[str]:
+    r"""
+    Returns the names of the variables in the same order as EquationSystem.ordered_variables().
+    """
+    return [f"{func}[{i}]" for i in range(0, intervals_number + 1) for func in FUNCTION_NAMES]
@@ -0,0 +1,289 @@
+r"""
+This module contains the registry of the solver backends, which solve the assembled system (see BlockTridiagonalSystem),
+and the automatic selection of the backend.
+
+Available backends are the dense LU decomposition (numpy.linalg.solve), the sparse LU decomposition with the selectable
+fill-reducing ordering of the columns (see SparseOrdering), the banded LU decomposition (see banded), the block LU
+decomposition (see block_tridiagonal) and the preconditioned Krylov solver (see krylov). New backends can be added
+using register_backend.
+
+The fastest backend depends on N and on the machine, thus the selection uses the timing profile, which is measured once
+by autotune (python benchmark.py autotune) and stored in the JSON file. The profile contains the measured times and
+the crossover points: the values of N, starting from which each backend is the fastest one. If there is no profile
+for the current machine, then the backend is selected by the density of the matrix: the dense LU decomposition is
+used for the small dense matrices, the block LU decomposition otherwise.
+
+@author: shvatov
+"""
+import json
+import math
+import os
+import platform
+import time
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse.linalg import spsolve
+
+from assembly import SYSTEM_VAR_NUM, BlockTridiagonalSystem, assemble_blocks, backward_error
+from banded import solve_banded_system
+from block_tridiagonal import solve_block_tridiagonal
+from krylov import KrylovParams, solve_krylov
+
+# Default path of the timing profile
+DEFAULT_PROFILE_PATH = "../cache/profile.json"
+
+# Version of the format of the timing profile, profiles of other versions are ignored
+PROFILE_FORMAT_VERSION = 1
+
+# Default sizes of the mesh measured by the autotuning
+DEFAULT_AUTOTUNE_INTERVALS_NUMBERS = (4, 16, 64, 256, 1024, 4096, 16384)
+
+# Number of the measurements of each backend, the minimal time is used
+DEFAULT_AUTOTUNE_REPEATS = 3
+
+# Solutions with the larger backward error (see assembly.backward_error) are rejected by the autotuning
+AUTOTUNE_BACKWARD_ERROR = 1e-12
+
+# Maximal dimension of the matrix solved by the dense backend (the dense matrix takes 16 * dimension^2 bytes)
+DENSE_MAX_DIMENSION = 4096
+
+# Without the timing profile the dense backend is selected, if the density of the matrix is not less than this value
+DENSE_MIN_DENSITY = 0.05
+
+# Backend selected by default without the timing profile for the sparse matrices
+DEFAULT_BACKEND = "block_tridiagonal"
+
+# Maximal number of the restart cycles of the iterative backend, if the parameters of the Krylov solver are not provided
+ITERATIVE_MAX_RESTARTS = 20
+
+
+class SparseOrdering(Enum):
+    """
+    Fill-reducing ordering of the columns used by the sparse LU decomposition (permc_spec of scipy.sparse.linalg.splu).
+    """
+    NATURAL = 1
+    MMD_ATA = 2
+    MMD_AT_PLUS_A = 3
+    COLAMD = 4
+
+
+@dataclass
+class BackendParams:
+    """
+    Parameters of the backends.
+
+    sparse_ordering - ordering of the columns used by the sparse backend.
+    krylov_params - parameters of the iterative backend, see krylov.KrylovParams (unless maxiter is set, the number
+    of the restart cycles is limited by ITERATIVE_MAX_RESTARTS, so that the stagnating solver does not block
+    the autotuning).
+    """
+    sparse_ordering: SparseOrdering = SparseOrdering.COLAMD
+    krylov_params: Optional[KrylovParams] = None
+
+
+@dataclass
+class SolverBackend:
+    """
+    Solver of the assembled system.
+
+    solve - function, which returns the solution of the system.
+    max_dimension - maximal dimension of the matrix, which can be solved by the backend (None if not limited).
+    """
+    name: str
+    description: str
+    solve: Callable[[BlockTridiagonalSystem, BackendParams], np.ndarray]
+    max_dimension: Optional[int] = None
+
+    def supports(self, dimension: int) -> bool:
+        return self.max_dimension is None or dimension <= self.max_dimension
+
+
+@dataclass
+class TimingProfile:
+    """
+    Timing profile of the backends on the given machine.
+
+    timings - dictionary, where key is the name of the backend and value is the list of pairs (N, time in seconds).
+    crossovers - sorted list of pairs (N, name of the backend): the backend is the fastest one starting from this N.
+    """
+    machine: str
+    timings: Dict[str, List[Tuple[int, float]]] = field(default_factory=dict)
+    crossovers: List[Tuple[int, str]] = field(default_factory=list)
+
+    def fastest(self, intervals_number: int) -> str:
+        assert self.crossovers, "Profile does not contain the crossover points"
+        name = self.crossovers[0][1]
+        for n, backend in self.crossovers:
+            if n <= intervals_number:
+                name = backend
+        return name
+
+    def save(self, path: str = DEFAULT_PROFILE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as profile_file:
+            json.dump({"version": PROFILE_FORMAT_VERSION,
+                       "machine": self.machine,
+                       "timings": self.timings,
+                       "crossovers": self.crossovers}, profile_file, indent=2)
+
+    @staticmethod
+    def load(path: str = DEFAULT_PROFILE_PATH) -> Optional["TimingProfile"]:
+        r"""
+        Loads the profile from the file, returns None if the file does not exist or has another format version.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as profile_file:
+            content = json.load(profile_file)
+        if content.get("version") != PROFILE_FORMAT_VERSION:
+            return None
+        return TimingProfile(machine=content["machine"],
+                             timings={name: [(int(n), float(t)) for n, t in values]
+                                      for name, values in content["timings"].items()},
+                             crossovers=[(int(n), str(name)) for n, name in content["crossovers"]])
+
+
+# Registered backends, the key is the name of the backend
+BACKENDS: Dict[str, SolverBackend] = dict()
+
+
+def register_backend(backend: SolverBackend) -> SolverBackend:
+    assert backend.name not in BACKENDS, f"Backend {backend.name} is already registered"
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def solve_dense(system: BlockTridiagonalSystem, params: BackendParams) -> np.ndarray:
+    return np.linalg.solve(system.to_csr().toarray(), system.rhs_vector())
+
+
+def solve_sparse_lu(system: BlockTridiagonalSystem, params: BackendParams) -> np.ndarray:
+    return spsolve(system.to_csr().tocsc(), system.rhs_vector(), permc_spec=params.sparse_ordering.name)
+
+
+def solve_banded(system: BlockTridiagonalSystem, params: BackendParams) -> np.ndarray:
+    return solve_banded_system(system.to_csr(), system.rhs_vector())[0]
+
+
+def solve_block_lu(system: BlockTridiagonalSystem, params: BackendParams) -> np.ndarray:
+    return solve_block_tridiagonal(system)
+
+
+def solve_iterative(system: BlockTridiagonalSystem, params: BackendParams) -> np.ndarray:
+    krylov_params = params.krylov_params if params.krylov_params is not None else KrylovParams()
+    if krylov_params.maxiter is None:
+        krylov_params = replace(krylov_params, maxiter=ITERATIVE_MAX_RESTARTS)
+    return solve_krylov(system.intervals_number, params=krylov_params, system=system)[0]
+
+
+register_backend(SolverBackend(name="dense", description="dense LU decomposition (numpy.linalg.solve)",
+                               solve=solve_dense, max_dimension=DENSE_MAX_DIMENSION))
+register_backend(SolverBackend(name="sparse", description="sparse LU decomposition (scipy.sparse.linalg.spsolve)",
+                               solve=solve_sparse_lu))
+register_backend(SolverBackend(name="banded", description="banded LU decomposition (LAPACK zgbtrf)",
+                               solve=solve_banded))
+register_backend(SolverBackend(name="block_tridiagonal", description="block LU decomposition (block Thomas)",
+                               solve=solve_block_lu))
+register_backend(SolverBackend(name="iterative", description="preconditioned Krylov solver (see krylov)",
+                               solve=solve_iterative))
+
+
+def machine_signature() -> str:
+    r"""
+    Returns the description of the machine, the profile measured on another machine is not used.
+    """
+    return f"{platform.node()} {platform.machine()} {platform.processor()} {os.cpu_count()} cores"
+
+
+def find_crossovers(timings: Dict[str, List[Tuple[int, float]]]) -> List[Tuple[int, str]]:
+    r"""
+    Returns the crossover points of the backends: the fastest backend is found for each measured N, the crossover
+    between the neighbouring measured values N1 < N2 with different fastest backends is their geometric mean.
+    """
+    fastest: Dict[int, Tuple[float, str]] = dict()
+    for name, values in timings.items():
+        for n, elapsed in values:
+            if n not in fastest or elapsed < fastest[n][0]:
+                fastest[n] = (elapsed, name)
+
+    crossovers: List[Tuple[int, str]] = list()
+    previous_n = None
+    for n in sorted(fastest):
+        name = fastest[n][1]
+        if not crossovers:
+            crossovers.append((0, name))
+        elif crossovers[-1][1] != name:
+            crossovers.append((int(math.sqrt(previous_n * n)), name))
+        previous_n = n
+    return crossovers
+
+
+def autotune(intervals_numbers: Sequence[int] = DEFAULT_AUTOTUNE_INTERVALS_NUMBERS,
+             params: Optional[BackendParams] = None,
+             repeats: int = DEFAULT_AUTOTUNE_REPEATS) -> TimingProfile:
+    r"""
+    Measures the registered backends on the meshes of the given sizes.
+    Parameters
+    ----------
+    intervals_numbers - numbers of the intervals in the mesh (N), which are measured.
+    params - parameters of the backends, see BackendParams.
+    repeats - number of the measurements of each backend, the minimal time is used.
+
+    Returns
+    -------
+    Timing profile of the current machine with the crossover points, see TimingProfile.
+    """
+    assert repeats > 0
+    params = params if params is not None else BackendParams()
+    profile = TimingProfile(machine=machine_signature())
+    for n in sorted(intervals_numbers):
+        system = assemble_blocks(intervals_number=n)
+        A, b = system.to_csr(), system.rhs_vector()
+        for backend in BACKENDS.values():
+            if not backend.supports(system.dimension):
+                continue
+
+            elapsed = math.inf
+            for _ in range(repeats):
+                start = time.perf_counter()
+                solution = backend.solve(system, params)
+                elapsed = min(elapsed, time.perf_counter() - start)
+                # backends, which do not reach the accuracy of the direct solvers, are not selected for this N
+                if backward_error(A, b, solution) > AUTOTUNE_BACKWARD_ERROR:
+                    break
+            else:
+                profile.timings.setdefault(backend.name, list()).append((n, elapsed))
+        del system, A
+
+    profile.crossovers = find_crossovers(profile.timings)
+    return profile
+
+
+def select_backend(intervals_number: int,
+                   non_zero: int,
+                   profile: Optional[TimingProfile] = None) -> Tuple[SolverBackend, bool]:
+    r"""
+    Selects the backend for the system.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    non_zero - number of the non-zero elements of the matrix.
+    profile - timing profile, it is used only if it was measured on the current machine.
+
+    Returns
+    -------
+    Tuple of the selected backend and the flag, whether the profile was used.
+    """
+    dimension = (intervals_number + 1) * SYSTEM_VAR_NUM
+    if profile is not None and profile.machine == machine_signature() and profile.crossovers:
+        backend = BACKENDS.get(profile.fastest(intervals_number))
+        if backend is not None and backend.supports(dimension):
+            return backend, True
+
+    dense = BACKENDS["dense"]
+    if dense.supports(dimension) and non_zero >= DENSE_MIN_DENSITY * dimension ** 2:
+        return dense, False
+    return BACKENDS[DEFAULT_BACKEND], False
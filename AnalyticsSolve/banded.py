@@ -0,0 +1,168 @@
+r"""
+This module contains the solver of the system, which stores the matrix in the compact banded format of LAPACK
+and solves it using zgbtrf / zgbtrs. The dense matrix is never formed: band storage is filled directly
+from the sparse matrix, thus the memory grows linearly in N for a fixed bandwidth.
+
+Bandwidth depends on the ordering of the unknowns. In the point-major ordering (see EquationSystem.ordered_variables)
+it is 8 on both sides of the diagonal. Alternatively, the unknowns can be reordered using the reverse Cuthill-McKee
+algorithm, which minimizes the bandwidth of an arbitrary sparse matrix.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.linalg import lapack
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+# Codes of the transpositions used by LAPACK gbtrs: A, A^T and A^H
+TRANSPOSE_CODES = {"N": 0, "T": 1, "H": 2}
+
+
+class VariableOrdering(Enum):
+    """
+    Ordering of the unknowns of the banded system. POINT_MAJOR keeps the order of
+    EquationSystem.ordered_variables(), REVERSE_CUTHILL_MCKEE applies the bandwidth-minimizing permutation.
+    """
+    POINT_MAJOR = 1
+    REVERSE_CUTHILL_MCKEE = 2
+
+
+@dataclass
+class BandedReport:
+    """
+    Statistics of the banded solution.
+
+    lower_bandwidth, upper_bandwidth - number of the non-zero diagonals below and above the main one.
+    non_zero - number of the non-zero elements of the matrix.
+    band_storage - number of the elements in the band storage (including the rows reserved for the fill).
+    factor_non_zero - number of the non-zero elements of the LU factors.
+    fill - number of the elements, which are zero in the matrix, but non-zero in its LU factors.
+    """
+    dimension: int
+    ordering: VariableOrdering
+    lower_bandwidth: int
+    upper_bandwidth: int
+    non_zero: int
+    band_storage: int
+    factor_non_zero: int
+    fill: int
+
+
+def prepare_permutation(A: csr_matrix, ordering: VariableOrdering) -> np.ndarray:
+    r"""
+    Returns the permutation p of the unknowns, p[k] is the original index of the unknown k.
+    """
+    if ordering == VariableOrdering.REVERSE_CUTHILL_MCKEE:
+        return reverse_cuthill_mckee(A.tocsr(), symmetric_mode=False).astype(np.int64)
+    return np.arange(A.shape[0])
+
+
+def to_band_storage(A: csr_matrix, dtype: np.dtype = np.cdouble) -> Tuple[np.ndarray, int, int]:
+    r"""
+    Converts the matrix into the band storage of LAPACK gbsv: AB[kl + ku + i - j, j] = A[i, j],
+    where the first kl rows are reserved for the fill of the LU factorization.
+    dtype - type of the elements of the band storage (np.complex64 for cgbtrf).
+
+    Returns
+    -------
+    Tuple of the band storage, the lower (kl) and the upper (ku) bandwidth.
+    """
+    coo = A.tocoo()
+    offsets = coo.row - coo.col
+    kl, ku = max(int(offsets.max(initial=0)), 0), max(int(-offsets.min(initial=0)), 0)
+
+    band = np.zeros((2 * kl + ku + 1, A.shape[1]), dtype=dtype, order="F")
+    band[kl + ku + offsets, coo.col] = coo.data
+    return band, kl, ku
+
+
+@dataclass
+class BandedFactorization:
+    r"""
+    LU decomposition of the permuted matrix in the band storage of LAPACK gbtrf.
+
+    factors, pivots - band storage of the LU factors and the pivot indices returned by gbtrf.
+    permutation - permutation of the unknowns, see prepare_permutation (None for the identity one).
+    """
+    factors: np.ndarray
+    pivots: np.ndarray
+    lower_bandwidth: int
+    upper_bandwidth: int
+    permutation: Optional[np.ndarray]
+
+    def solve(self, rhs: np.ndarray, trans: str = "N", overwrite_rhs: bool = False) -> np.ndarray:
+        r"""
+        Solves the system Ax = rhs ("N"), A^T x = rhs ("T") or A^H x = rhs ("H") using the factorization.
+        If overwrite_rhs is set, the complex contiguous rhs may be overwritten by the solution (always, when
+        the permutation is the identity one), which saves the copy of the vector in the repeated solutions.
+        """
+        assert trans in TRANSPOSE_CODES, f"Unknown transposition: {trans}"
+        rhs = np.asarray(rhs, dtype=np.cdouble)
+        permuted_solution, info = lapack.zgbtrs(self.factors, self.lower_bandwidth, self.upper_bandwidth,
+                                                rhs if self.permutation is None else rhs[self.permutation],
+                                                self.pivots, trans=TRANSPOSE_CODES[trans],
+                                                overwrite_b=overwrite_rhs)
+        assert info == 0, f"Illegal argument {-info} of zgbtrs"
+        if self.permutation is None:
+            return permuted_solution
+        solution = np.empty_like(permuted_solution)
+        solution[self.permutation] = permuted_solution
+        return solution
+
+
+def factorize_banded_system(A: csr_matrix,
+                            ordering: VariableOrdering = VariableOrdering.POINT_MAJOR) -> Tuple[BandedFactorization,
+                                                                                                BandedReport]:
+    r"""
+    Calculates the banded LU decomposition of the matrix.
+    Parameters
+    ----------
+    A - sparse matrix of coefficients of the variables.
+    ordering - ordering of the unknowns, see VariableOrdering.
+
+    Returns
+    -------
+    Tuple of the factorization and the statistics of the band storage, see BandedReport.
+    """
+    permutation = prepare_permutation(A, ordering)
+    A = A.tocsr()[permutation][:, permutation]
+    band, kl, ku = to_band_storage(A)
+
+    factors, pivots, info = lapack.zgbtrf(band, kl, ku, overwrite_ab=True)
+    if info > 0:
+        raise np.linalg.LinAlgError(f"Matrix is singular, zero pivot in the row {info}")
+
+    factor_non_zero = int(np.count_nonzero(factors))
+    return BandedFactorization(factors=factors, pivots=pivots, lower_bandwidth=kl, upper_bandwidth=ku,
+                               permutation=None if ordering == VariableOrdering.POINT_MAJOR else permutation), \
+        BandedReport(dimension=A.shape[0],
+                     ordering=ordering,
+                     lower_bandwidth=kl,
+                     upper_bandwidth=ku,
+                     non_zero=A.nnz,
+                     band_storage=band.size,
+                     factor_non_zero=factor_non_zero,
+                     fill=max(factor_non_zero - A.nnz, 0))
+
+
+def solve_banded_system(A: csr_matrix,
+                        b: np.ndarray,
+                        ordering: VariableOrdering = VariableOrdering.POINT_MAJOR) -> Tuple[np.ndarray, BandedReport]:
+    r"""
+    Solves the system Ax = b using the banded LU decomposition.
+    Parameters
+    ----------
+    A - sparse matrix of coefficients of the variables.
+    b - right-side vector.
+    ordering - ordering of the unknowns, see VariableOrdering.
+
+    Returns
+    -------
+    Tuple of the vector of complex solutions and the statistics of the solution, see BandedReport.
+    """
+    factorization, report = factorize_banded_system(A, ordering)
+    return factorization.solve(b), report
@@ -0,0 +1,119 @@
+r"""
+Module, which can be used as a standalone application, which measures the performance of the solvers.
+
+Usage: python benchmark.py [parallel | multigrid | autotune] [N1 N2 ...]
+
+parallel (default) - measures the speedup of the parallel block-tridiagonal solver (see parallel) against the serial
+one (see block_tridiagonal), by default N = 10^4, 10^5, 10^6 (the blocks, their factors and the shared copies take
+about 4 KB per point). The number of the processes is doubled from 2 up to the number of the available cores,
+the speedup is close to linear only, if the cores are not shared with the other processes.
+multigrid - compares the multigrid solver (see multigrid) with the direct ones, by default N = 2^12, 2^15, 2^18.
+The number of the cycles should not depend on N, while the time should grow linearly.
+autotune - measures the solver backends (see backends) and stores the timing profile with the crossover points,
+which is used by the AUTO method, by default N = 4, 16, ..., 4^7.
+
+@author: shvatov
+"""
+import sys
+import time
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from scipy.sparse.linalg import spsolve
+
+from assembly import assemble_blocks
+from backends import DEFAULT_AUTOTUNE_INTERVALS_NUMBERS, DEFAULT_PROFILE_PATH, autotune
+from banded import solve_banded_system
+from block_tridiagonal import solve_block_tridiagonal
+from multigrid import CycleType, MultigridParams, MultigridSolver
+from parallel import available_cores, solve_block_tridiagonal_parallel
+
+# Default sizes of the mesh
+DEFAULT_INTERVALS_NUMBERS = (10 ** 4, 10 ** 5, 10 ** 6)
+
+# Default sizes of the mesh for the multigrid benchmark, powers of 2 give the deepest hierarchy
+DEFAULT_MULTIGRID_INTERVALS_NUMBERS = (2 ** 12, 2 ** 15, 2 ** 18)
+
+
+def measure(function: Callable[[], np.ndarray]) -> Tuple[float, np.ndarray]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def prepare_processes_numbers(cores: int) -> List[int]:
+    # a single process falls back to the serial solver, which is measured separately
+    numbers = [2]
+    while numbers[-1] * 2 <= cores:
+        numbers.append(numbers[-1] * 2)
+    if numbers[-1] != cores and cores > 2:
+        numbers.append(cores)
+    return numbers
+
+
+def run_benchmark(intervals_numbers: Sequence[int]) -> None:
+    cores = available_cores()
+    print(f"Available cores: {cores}\n")
+    if cores == 1:
+        print("Single core is available, the parallel solver can only be slower than the serial one\n")
+    print(f"{'N':>10} {'processes':>10} {'time, s':>10} {'speedup':>10} {'max diff':>12}")
+
+    for n in intervals_numbers:
+        system = assemble_blocks(intervals_number=n)
+        serial_time, serial_solution = measure(lambda: solve_block_tridiagonal(system))
+        print(f"{n:>10} {'serial':>10} {serial_time:>10.3f} {1.0:>10.2f} {0.0:>12.3e}")
+
+        for processes in prepare_processes_numbers(cores):
+            parallel_time, solution = measure(lambda: solve_block_tridiagonal_parallel(system, processes=processes))
+            print(f"{n:>10} {processes:>10} {parallel_time:>10.3f} {serial_time / parallel_time:>10.2f} "
+                  f"{np.abs(solution - serial_solution).max():>12.3e}")
+        del system
+
+
+def run_multigrid_benchmark(intervals_numbers: Sequence[int]) -> None:
+    print(f"{'N':>10} {'solver':>18} {'time, s':>10} {'cycles':>8} {'max residual':>14} {'max diff':>12}")
+
+    for n in intervals_numbers:
+        system = assemble_blocks(intervals_number=n)
+        A, b = system.to_csr(), system.rhs_vector()
+        direct_time, direct_solution = measure(lambda: solve_block_tridiagonal(system))
+
+        results = [("block tridiagonal", direct_time, direct_solution, 0),
+                   ("banded", *measure(lambda: solve_banded_system(A, b)[0]), 0),
+                   ("sparse", *measure(lambda: spsolve(A.tocsc(), b)), 0)]
+        for cycle in CycleType:
+            multigrid_time, (solution, report) = measure(
+                lambda: MultigridSolver(system, MultigridParams(cycle=cycle)).solve())
+            results.append((f"multigrid {cycle.name}", multigrid_time, solution, report.iterations))
+
+        for name, elapsed, solution, cycles in results:
+            print(f"{n:>10} {name:>18} {elapsed:>10.3f} {cycles:>8} {np.abs(A @ solution - b).max():>14.3e} "
+                  f"{np.abs(solution - direct_solution).max():>12.3e}")
+        del system, A
+
+
+def run_autotune(intervals_numbers: Sequence[int], path: str = DEFAULT_PROFILE_PATH) -> None:
+    profile = autotune(intervals_numbers)
+    print(f"Machine: {profile.machine}\n")
+    print(f"{'N':>10} {'backend':>18} {'time, s':>10}")
+    for name, values in profile.timings.items():
+        for n, elapsed in values:
+            print(f"{n:>10} {name:>18} {elapsed:>10.4f}")
+
+    print("\nCrossover points:")
+    for n, name in profile.crossovers:
+        print(f"N >= {n:>10}: {name}")
+    profile.save(path)
+    print(f"\nProfile is stored in {path}")
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    if arguments and arguments[0] == "autotune":
+        run_autotune([int(float(arg)) for arg in arguments[1:]] or DEFAULT_AUTOTUNE_INTERVALS_NUMBERS)
+    elif arguments and arguments[0] == "multigrid":
+        run_multigrid_benchmark([int(float(arg)) for arg in arguments[1:]] or DEFAULT_MULTIGRID_INTERVALS_NUMBERS)
+    else:
+        arguments = arguments[1:] if arguments and arguments[0] == "parallel" else arguments
+        run_benchmark([int(float(arg)) for arg in arguments] or DEFAULT_INTERVALS_NUMBERS)
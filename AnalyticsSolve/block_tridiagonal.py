@@ -0,0 +1,178 @@
+r"""
+This module contains the direct solver of the block-tridiagonal system (see BlockTridiagonalSystem), which performs
+the block LU decomposition (block Thomas algorithm) in O(N * 8^3) time and O(N * 8^2) memory.
+
+The matrix is decomposed as A = L U, where L is block-lower-bidiagonal with the identity diagonal blocks
+and U is block-upper-bidiagonal with the blocks
+
+    S[0] = A(0, 0),
+    S[i] = A(i, i) - A(i, i - 1) S[i - 1]^(-1) A(i - 1, i), i in [1; N],
+
+on the diagonal and A(i, i + 1) above it. Since the off-diagonal blocks are diagonal, the Schur complements
+S[i] are obtained using only the element-wise products.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.linalg import lapack
+
+from assembly import SYSTEM_VAR_NUM, BlockTridiagonalSystem
+
+# Codes of the transpositions used by LAPACK getrs: A, A^T and A^H
+TRANSPOSE_CODES = {"N": 0, "T": 1, "H": 2}
+
+
+@dataclass
+class BlockTridiagonalFactorization:
+    r"""
+    Block LU decomposition of the block-tridiagonal matrix, see module documentation.
+
+    lu, pivots - LU decompositions of S[i] in the format of LAPACK getrf, arrays (N + 1, 8, 8) and (N + 1, 8).
+    coupling - array (N, 8, 8), coupling[i] = S[i]^(-1) A(i, i + 1).
+    lower, upper - arrays (N, 8), diagonals of the blocks A(i, i - 1) and A(i, i + 1), see BlockTridiagonalSystem.
+    """
+    lu: np.ndarray
+    pivots: np.ndarray
+    coupling: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    @property
+    def intervals_number(self) -> int:
+        return self.lu.shape[0] - 1
+
+    def solve(self, rhs: np.ndarray, trans: str = "N") -> np.ndarray:
+        r"""
+        Solves the system Ax = rhs.
+        Parameters
+        ----------
+        rhs - right side vector of the size 8 * (N + 1), or the matrix (8 * (N + 1), k) of k right sides.
+        trans - "N" to solve Ax = rhs, "T" to solve A^T x = rhs, "H" to solve A^H x = rhs.
+
+        Returns
+        -------
+        Solution with the same shape as rhs.
+        """
+        assert trans in TRANSPOSE_CODES, f"Unknown transposition: {trans}"
+        points = self.intervals_number + 1
+        y = np.asarray(rhs).reshape(points, SYSTEM_VAR_NUM, -1)
+        z = np.empty(y.shape, dtype=np.result_type(y, self.lu))
+        if trans != "N":
+            return self.__solve_transposed(y, z, trans).reshape(np.shape(rhs))
+
+        # forward substitution: z[i] = S[i]^(-1) (rhs[i] - A(i, i - 1) z[i - 1])
+        z[0] = lapack.zgetrs(self.lu[0], self.pivots[0], y[0])[0]
+        for i in range(1, points):
+            z[i] = lapack.zgetrs(self.lu[i], self.pivots[i], y[i] - self.lower[i - 1][:, None] * z[i - 1])[0]
+
+        # backward substitution: x[i] = z[i] - S[i]^(-1) A(i, i + 1) x[i + 1]
+        for i in range(points - 2, -1, -1):
+            z[i] -= self.coupling[i] @ z[i + 1]
+        return z.reshape(np.shape(rhs))
+
+    def __solve_transposed(self, y: np.ndarray, z: np.ndarray, trans: str) -> np.ndarray:
+        r"""
+        Solves A^T x = y (or A^H x = y) using A^T = U^T L^T, where U^T is block-lower-bidiagonal with S[i]^T
+        on the diagonal and A(i - 1, i)^T below it, L^T is block-upper-bidiagonal with the identity blocks
+        on the diagonal and S[i]^(-T) A(i + 1, i)^T above it.
+        """
+        code = TRANSPOSE_CODES[trans]
+        lower = self.lower if trans == "T" else self.lower.conj()
+        upper = self.upper if trans == "T" else self.upper.conj()
+
+        # forward substitution: w[i] = S[i]^(-T) (y[i] - A(i - 1, i)^T w[i - 1])
+        z[0] = lapack.zgetrs(self.lu[0], self.pivots[0], y[0], trans=code)[0]
+        for i in range(1, z.shape[0]):
+            z[i] = lapack.zgetrs(self.lu[i], self.pivots[i], y[i] - upper[i - 1][:, None] * z[i - 1], trans=code)[0]
+
+        # backward substitution: x[i] = w[i] - S[i]^(-T) A(i + 1, i)^T x[i + 1]
+        for i in range(z.shape[0] - 2, -1, -1):
+            z[i] -= lapack.zgetrs(self.lu[i], self.pivots[i], lower[i][:, None] * z[i + 1], trans=code)[0]
+        return z
+
+
+def factorize_block_tridiagonal(system: BlockTridiagonalSystem) -> BlockTridiagonalFactorization:
+    r"""
+    Calculates the block LU decomposition of the matrix of the system.
+    Raises np.linalg.LinAlgError, if any of the Schur complements is singular.
+    """
+    n, size = system.intervals_number, SYSTEM_VAR_NUM
+    lu = np.empty((n + 1, size, size), dtype=np.cdouble)
+    pivots = np.empty((n + 1, size), dtype=np.int32)
+    coupling = np.empty((n, size, size), dtype=np.cdouble)
+
+    schur = system.diagonal[0]
+    for i in range(0, n + 1):
+        if i > 0:
+            schur = system.diagonal[i] - system.lower[i - 1][:, None] * coupling[i - 1]
+
+        # A(N, N + 1) does not exist, thus only the decomposition is required in the last point
+        if i < n:
+            lu[i], pivots[i], coupling[i], info = lapack.zgesv(schur, np.diag(system.upper[i]))
+        else:
+            lu[i], pivots[i], info = lapack.zgetrf(schur)
+        if info != 0:
+            raise np.linalg.LinAlgError(f"Schur complement of the point {i} is singular")
+
+    return BlockTridiagonalFactorization(lu=lu, pivots=pivots, coupling=coupling,
+                                         lower=system.lower, upper=system.upper)
+
+
+def solve_block_tridiagonal(system: BlockTridiagonalSystem) -> np.ndarray:
+    r"""
+    Solves the block-tridiagonal system Ax = b using the block LU decomposition.
+    Parameters
+    ----------
+    system - blocks of the matrix A and the right side vector b, see assembly.assemble_blocks.
+
+    Returns
+    -------
+    Vector of complex solutions of the system ordered as EquationSystem.ordered_variables().
+    """
+    return factorize_block_tridiagonal(system).solve(system.rhs_vector())
+
+
+def solve_block_tridiagonal_batch(diagonal: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                                  rhs: np.ndarray) -> np.ndarray:
+    r"""
+    Solves the batch of K block-tridiagonal systems, which differ only in the diagonal blocks, using the block LU
+    decomposition vectorized over the batch: each point of the mesh requires a single stacked solution
+    of K 8x8 systems, thus the loop over the mesh is shared by all systems.
+    Parameters
+    ----------
+    diagonal - array (N + 1, K, 8, 8) of the diagonal blocks (the blocks of the point are contiguous),
+    it is overwritten by S[i]^(-1) A(i, i + 1).
+    lower, upper - arrays (N, 8), diagonals of the off-diagonal blocks shared by all systems,
+    see BlockTridiagonalSystem.
+    rhs - array (N + 1, 8) of the right side shared by all systems, or array (N + 1, K, 8).
+
+    Returns
+    -------
+    Array (N + 1, K, 8) of the solutions.
+    """
+    points, batch, size = diagonal.shape[0], diagonal.shape[1], SYSTEM_VAR_NUM
+    rhs = np.broadcast_to(rhs[:, None] if rhs.ndim == 2 else rhs, (points, batch, size))
+    z = np.empty((points, batch, size), dtype=np.result_type(diagonal, rhs))
+
+    # augmented right sides [diag(A(i, i + 1)) | rhs[i] - A(i, i - 1) z[i - 1]] of the systems with S[i]
+    augmented = np.empty((batch, size, size + 1), dtype=z.dtype)
+    for i in range(0, points):
+        schur = diagonal[i]
+        augmented[:, :, size] = rhs[i]
+        if i > 0:
+            schur -= lower[i - 1][None, :, None] * diagonal[i - 1]
+            augmented[:, :, size] -= lower[i - 1] * z[i - 1]
+
+        # A(N, N + 1) does not exist, thus only the forward substitution is required in the last point
+        if i < points - 1:
+            augmented[:, :, :size] = np.diag(upper[i])
+            solved = np.linalg.solve(schur, augmented)
+            diagonal[i], z[i] = solved[:, :, :size], solved[:, :, size]
+        else:
+            z[i] = np.linalg.solve(schur, augmented[:, :, size:])[:, :, 0]
+
+    for i in range(points - 2, -1, -1):
+        z[i] -= np.matmul(diagonal[i], z[i + 1, :, :, None])[:, :, 0]
+    return z
@@ -0,0 +1,229 @@
+r"""
+This module contains the persistent on-disk cache of the artifacts of the system: assembled matrix A and
+vector b, LU factorization of A and solutions. The cache is content-addressed: the key of the system is the hash
+of N, R and the values of all coefficients (see system_key), so that repeated runs with the same parameters reuse
+the results of the previous ones. The key includes the hash of the sources of the modules, which assemble
+and solve the system (see source_version), thus the entries become stale after any edit of them.
+
+Each artifact is stored in the directory <path>/<key>/<artifact> as a set of .npy files, which are loaded
+memory-mapped, thus loading does not depend on the size of the artifact. The modification time of the artifact
+directory is updated on each access, and the least recently used artifacts are evicted, when the total size
+of the cache exceeds the limit.
+
+@author: shvatov
+"""
+import dataclasses
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+from typing import Any, Dict, Optional, Tuple, List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from assembly import prepare_coefficients
+from banded import BandedFactorization
+
+# Default path to the cache directory
+DEFAULT_CACHE_PATH = "../cache"
+
+# Default limit of the total size of the cache in bytes
+DEFAULT_CACHE_SIZE_LIMIT = 1 << 30
+
+# Version of the layout of the cache, it is a part of the key, so that stale entries are never loaded
+CACHE_FORMAT_VERSION = 2
+
+# Names of the modules, which assemble and solve the system and define the format of the stored factors,
+# see source_version. The modules are located, but not imported, thus solve itself is included as well
+SOURCE_MODULES = ("equation", "assembly", "streaming", "discrepancy", "banded", "block_tridiagonal", "conjugate",
+                  "parallel", "krylov", "multigrid", "mixed", "scaling", "backends", "solve")
+
+SYSTEM_ARTIFACT = "system"
+FACTORIZATION_ARTIFACT = "factorization"
+SOLUTION_ARTIFACT_PREFIX = "solution-"
+
+
+def source_version() -> str:
+    r"""
+    Returns the SHA-256 hash of the sources of SOURCE_MODULES, which is a part of the key of the system.
+    """
+    digest = hashlib.sha256()
+    for name in SOURCE_MODULES:
+        with open(importlib.util.find_spec(name).origin, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def system_key(intervals_number: int, radius: float, coefficients: Optional[Dict[str, complex]] = None) -> str:
+    r"""
+    Returns the key of the system, which is the SHA-256 hash of N, R, the values of all coefficients
+    and the version of the sources (see source_version).
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    """
+    values = prepare_coefficients(coefficients)
+    description = {
+        "version": CACHE_FORMAT_VERSION,
+        "source": source_version(),
+        "n": int(intervals_number),
+        "radius": float(radius).hex(),
+        "coefficients": {name: [complex(v).real.hex(), complex(v).imag.hex()] for name, v in values.items()},
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def parameters_key(*parameters: Any) -> str:
+    r"""
+    Returns the hash of the parameters of the solver (dataclasses, enums or plain values), which is a part of the name
+    of the solution artifact, so that the solutions obtained with the different parameters are not mixed.
+    """
+    description = [dataclasses.asdict(p) if dataclasses.is_dataclass(p) else p for p in parameters]
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=repr).encode()).hexdigest()[:16]
+
+
+def csr_to_arrays(prefix: str, matrix: csr_matrix) -> Dict[str, np.ndarray]:
+    return {f"{prefix}_data": matrix.data, f"{prefix}_indices": matrix.indices, f"{prefix}_indptr": matrix.indptr,
+            f"{prefix}_shape": np.array(matrix.shape)}
+
+
+def arrays_to_csr(prefix: str, arrays: Dict[str, np.ndarray]) -> csr_matrix:
+    return csr_matrix((arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+                      shape=tuple(arrays[f"{prefix}_shape"]))
+
+
+class ArtifactCache:
+    r"""
+    On-disk cache of the artifacts of the system, see module documentation.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, size_limit: int = DEFAULT_CACHE_SIZE_LIMIT):
+        assert size_limit >= 0
+        self.path = path
+        self.size_limit = size_limit
+        os.makedirs(self.path, exist_ok=True)
+
+    def artifact_path(self, key: str, artifact: str) -> str:
+        return os.path.join(self.path, key, artifact)
+
+    def __load(self, key: str, artifact: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self.artifact_path(key, artifact)
+        if not os.path.isdir(path):
+            return None
+
+        try:
+            arrays = {name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r")
+                      for name in os.listdir(path) if name.endswith(".npy")}
+            os.utime(path)
+        except (OSError, ValueError):
+            # the artifact was evicted or is corrupted, it will be stored again
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return arrays
+
+    def __store(self, key: str, artifact: str, arrays: Dict[str, np.ndarray]) -> None:
+        path = self.artifact_path(key, artifact)
+        if os.path.isdir(path):
+            # content is determined by the key, thus the stored artifact is the same
+            os.utime(path)
+            return
+
+        # artifact is written into the temporary directory and renamed, so that it is never loaded partially
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(temporary_path, exist_ok=True)
+        for name, array in arrays.items():
+            # Fortran order of the band storage is kept, so that LAPACK does not copy the loaded factors
+            array = array if array.flags.f_contiguous else np.ascontiguousarray(array)
+            np.save(os.path.join(temporary_path, f"{name}.npy"), array)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        self.evict()
+
+    def load_system(self, key: str) -> Optional[Tuple[csr_matrix, np.ndarray]]:
+        arrays = self.__load(key, SYSTEM_ARTIFACT)
+        return None if arrays is None else (arrays_to_csr("A", arrays), arrays["b"])
+
+    def store_system(self, key: str, A: csr_matrix, b: np.ndarray) -> None:
+        self.__store(key, SYSTEM_ARTIFACT, {**csr_to_arrays("A", A.tocsr()), "b": b})
+
+    def load_factorization(self, key: str) -> Optional[BandedFactorization]:
+        r"""
+        Returns the stored banded LU factors (see banded.BandedFactorization), which are solved by LAPACK zgbtrs.
+        The sparse factors of SuperLU cannot be restored into SuperLU, and their substitution by the generic sparse
+        triangular solver is several times slower, thus the banded factors are stored instead.
+        """
+        arrays = self.__load(key, FACTORIZATION_ARTIFACT)
+        if arrays is None:
+            return None
+        bandwidths = arrays["bandwidths"]
+        # zgbtrs of scipy crashes on the read-only memory-mapped pivots, they are small and are copied
+        return BandedFactorization(factors=arrays["factors"], pivots=np.array(arrays["pivots"]),
+                                   lower_bandwidth=int(bandwidths[0]), upper_bandwidth=int(bandwidths[1]),
+                                   permutation=arrays.get("permutation"))
+
+    def store_factorization(self, key: str, factorization: BandedFactorization) -> None:
+        arrays = {"factors": factorization.factors, "pivots": factorization.pivots,
+                  "bandwidths": np.array([factorization.lower_bandwidth, factorization.upper_bandwidth])}
+        if factorization.permutation is not None:
+            arrays["permutation"] = factorization.permutation
+        self.__store(key, FACTORIZATION_ARTIFACT, arrays)
+
+    def load_solution(self, key: str, method: str) -> Optional[np.ndarray]:
+        r"""
+        Returns the stored solution of the system, method is the name of the method together with the hash
+        of its parameters (see parameters_key).
+        """
+        arrays = self.__load(key, SOLUTION_ARTIFACT_PREFIX + method)
+        return None if arrays is None else arrays["x"]
+
+    def store_solution(self, key: str, method: str, solution: np.ndarray) -> None:
+        self.__store(key, SOLUTION_ARTIFACT_PREFIX + method, {"x": np.asarray(solution)})
+
+    def artifacts(self) -> List[Tuple[float, int, str]]:
+        r"""
+        Returns the list of the tuples (time of the last access, size in bytes, path) of all stored artifacts.
+        """
+        result = list()
+        for key in os.listdir(self.path):
+            key_path = os.path.join(self.path, key)
+            if not os.path.isdir(key_path):
+                continue
+            for artifact in os.listdir(key_path):
+                path = os.path.join(key_path, artifact)
+                if artifact.endswith(".tmp") or not os.path.isdir(path):
+                    continue
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(path))
+                    result.append((os.stat(path).st_mtime, size, path))
+                except OSError:
+                    continue
+        return result
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.artifacts())
+
+    def evict(self) -> None:
+        r"""
+        Removes the least recently used artifacts until the total size of the cache does not exceed the limit.
+        """
+        artifacts = sorted(self.artifacts())
+        total_size = sum(size for _, size, _ in artifacts)
+        for _, size, path in artifacts:
+            if total_size <= self.size_limit:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+
+            key_path = os.path.dirname(path)
+            if len(os.listdir(key_path)) == 0:
+                os.rmdir(key_path)
+
+    def clear(self) -> None:
+        for key in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
@@ -24,9 +24,174 @@ def prepare_parser() -> argparse.ArgumentParser:
                         action="store",
                         default=1,
                         type=int,
-                        choices=[1, 2],
+                        choices=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],
                         dest="method",
-                        help="method, which will be used to solve the system; either 1 (SYMPY) or 2 (NUMPY);")
+                        help="method, which will be used to solve the system; "
+                             "either 1 (SYMPY), 2 (NUMPY), 3 (SPARSE), 4 (STREAMING), 5 (CONJUGATE), "
+                             "6 (BLOCK_TRIDIAGONAL), 7 (BANDED), 8 (PARALLEL), 9 (KRYLOV), 10 (MULTIGRID), "
+                             "11 (MIXED) or 12 (AUTO);")
+
+    parser.add_argument("--ordering", "-o",
+                        action="store",
+                        default=1,
+                        type=int,
+                        choices=[1, 2],
+                        dest="ordering",
+                        help="ordering of the unknowns used by the BANDED method; "
+                             "either 1 (POINT_MAJOR) or 2 (REVERSE_CUTHILL_MCKEE);")
+
+    parser.add_argument("--sparse-ordering", "-so",
+                        action="store",
+                        default=4,
+                        type=int,
+                        choices=[1, 2, 3, 4],
+                        dest="sparse_ordering",
+                        help="fill-reducing ordering of the columns used by the sparse LU decomposition; "
+                             "either 1 (NATURAL), 2 (MMD_ATA), 3 (MMD_AT_PLUS_A) or 4 (COLAMD);")
+
+    parser.add_argument("--profile-path", "-pp",
+                        action="store",
+                        default="../cache/profile.json",
+                        type=str,
+                        dest="profile_path",
+                        help="path to the timing profile used by the AUTO method, "
+                             "see python benchmark.py autotune;")
+
+    parser.add_argument("--precision", "-pn",
+                        action="store",
+                        default=50,
+                        type=int,
+                        dest="precision",
+                        help="number of the significant decimal digits used by the SYMPY method;")
+
+    parser.add_argument("--processes", "-pr",
+                        action="store",
+                        default=None,
+                        type=int,
+                        dest="processes",
+                        help="number of the processes used by the PARALLEL method, "
+                             "by default the number of the available cores;")
+
+    parser.add_argument("--krylov-method", "-km",
+                        action="store",
+                        default=1,
+                        type=int,
+                        choices=[1, 2],
+                        dest="krylov_method",
+                        help="iterative method used by the KRYLOV method; either 1 (GMRES) or 2 (BICGSTAB);")
+
+    parser.add_argument("--preconditioner", "-pc",
+                        action="store",
+                        default=None,
+                        type=int,
+                        choices=[1, 2, 3, 4],
+                        dest="preconditioner",
+                        help="preconditioner used by the KRYLOV method; "
+                             "either 1 (NONE), 2 (BLOCK_JACOBI), 3 (ILU) or 4 (MULTIGRID), by default ILU "
+                             "for the assembled matrix and BLOCK_JACOBI for the matrix-free operator;")
+
+    parser.add_argument("--matrix-free", "-mf",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="matrix_free",
+                        help="whether the KRYLOV method should apply the matrix using the discrepancy function "
+                             "instead of the assembled sparse matrix or not;")
+
+    parser.add_argument("--rtol", "-rt",
+                        action="store",
+                        default=1e-8,
+                        type=float,
+                        dest="rtol",
+                        help="relative tolerance of the residual in each refinement step of the KRYLOV method "
+                             "(the solution is accepted, when max(abs(b - Ax)) <= 10^(-10), see krylov);")
+
+    parser.add_argument("--atol", "-at",
+                        action="store",
+                        default=0.0,
+                        type=float,
+                        dest="atol",
+                        help="absolute tolerance of the residual of the KRYLOV method;")
+
+    parser.add_argument("--restart", "-rs",
+                        action="store",
+                        default=50,
+                        type=int,
+                        dest="restart",
+                        help="number of the iterations between the restarts of GMRES;")
+
+    parser.add_argument("--maxiter", "-mi",
+                        action="store",
+                        default=None,
+                        type=int,
+                        dest="maxiter",
+                        help="maximal number of the iterations of the KRYLOV method "
+                             "(of the restart cycles for GMRES);")
+
+    parser.add_argument("--cycle", "-cy",
+                        action="store",
+                        default=1,
+                        type=int,
+                        choices=[1, 2],
+                        dest="cycle",
+                        help="cycle used by the MULTIGRID method; either 1 (V) or 2 (W);")
+
+    parser.add_argument("--refinement", "-rf",
+                        action="store",
+                        default=2,
+                        type=int,
+                        choices=[1, 2],
+                        dest="refinement",
+                        help="iterative refinement used by the MIXED method; either 1 (CLASSIC) or 2 (GMRES);")
+
+    parser.add_argument("--extended-residual", "-er",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="extended_residual",
+                        help="whether the MIXED method should calculate the residuals in the extended precision "
+                             "(np.clongdouble) instead of the double one or not;")
+
+    parser.add_argument("--compare-double", "-cd",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="compare_double",
+                        help="whether the MIXED method should also measure the time of the double-precision "
+                             "factorization and solution or not;")
+
+    parser.add_argument("--scaling", "-sc",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="scaling",
+                        help="whether to solve the nondimensionalized and equilibrated system and unscale its solution "
+                             "or not (numeric methods except MULTIGRID only);")
+
+    parser.add_argument("--time-scale", "-ts",
+                        action="store",
+                        default=None,
+                        type=float,
+                        dest="time_scale",
+                        help="time scale of the nondimensionalization, by default 1 / Gamma;")
+
+    parser.add_argument("--equilibrate", "-eq",
+                        action="store",
+                        default=True,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="equilibrate",
+                        help="whether to equilibrate the rows and the columns of the nondimensionalized system "
+                             "(Ruiz) or not;")
 
     parser.add_argument("--verbose", "-vb",
                         action="store",
@@ -62,7 +227,8 @@ def prepare_parser() -> argparse.ArgumentParser:
                         nargs="?",
                         const=True,
                         dest="rcond",
-                        help="whether to calculate condition number or not;")
+                        help="whether to estimate the condition number of the solved matrix "
+                             "(1-norm, LINPACK zgeco style) reusing the factorization of the solver or not;")
 
     parser.add_argument("--check", "-c",
                         action="store",
@@ -82,6 +248,56 @@ def prepare_parser() -> argparse.ArgumentParser:
                         dest="plot",
                         help="whether to plot functions ro11, ro22, ro33, ro44 or not")
 
+    parser.add_argument("--cache", "-ca",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="cache",
+                        help="whether to store the assembled system, its factorization and solution in the "
+                             "on-disk cache and reuse them in the subsequent runs or not (numeric methods only);")
+
+    parser.add_argument("--cache-path", "-cp",
+                        action="store",
+                        default="../cache",
+                        type=str,
+                        dest="cache_path",
+                        help="path to the directory of the on-disk cache;")
+
+    parser.add_argument("--cache-size-limit", "-cs",
+                        action="store",
+                        default=1024,
+                        type=int,
+                        dest="cache_size_limit",
+                        help="limit of the total size of the on-disk cache in megabytes, "
+                             "least recently used artifacts are evicted;")
+
+    parser.add_argument("--snapshot", "-ss",
+                        action="store",
+                        default=False,
+                        type=str2bool,
+                        nargs="?",
+                        const=True,
+                        dest="snapshot",
+                        help="whether to load the symbolic system from the snapshot saved by the previous runs "
+                             "(it is created, if there is no valid one) or not (symbolic methods only);")
+
+    parser.add_argument("--snapshot-path", "-sp",
+                        action="store",
+                        default="../cache/snapshots",
+                        type=str,
+                        dest="snapshot_path",
+                        help="path to the directory with the snapshots of the symbolic system;")
+
+    parser.add_argument("--memory-budget", "-mb",
+                        action="store",
+                        default=512,
+                        type=int,
+                        dest="memory_budget",
+                        help="memory budget of the in-process cache of equation systems and expressions "
+                             "in megabytes, least recently used entries are evicted;")
+
     parser.add_argument("--intervals-number", "-n",
                         action="store",
                         default=4,
@@ -0,0 +1,124 @@
+r"""
+This module contains the estimation of the reciprocal condition number of the matrix
+
+    rcond = 1 / (||A||_1 ||A^(-1)||_1),
+
+in the style of LINPACK zgeco, which is called by the Fortran application (see Main.f90). The inverse matrix
+is never formed: ||A^(-1)||_1 is estimated by the method of Hager and Higham (the same one as in LAPACK zlacn2),
+which requires only a few solutions of the systems A x = v and A^H x = v with the LU factors already computed
+by the solver. Thus the extra cost is O(N) for the block LU and O(n * bandwidth) for the banded factors,
+instead of the dense inversion of the matrix.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import csr_matrix
+
+# Maximal number of the iterations of the estimator (LAPACK zlacn2 uses 5)
+MAX_ESTIMATION_ITERATIONS = 5
+
+# Codes of the transpositions used by scipy.linalg.lu_solve: A, A^T and A^H
+DENSE_TRANSPOSE_CODES = {"N": 0, "T": 1, "H": 2}
+
+# Function, which solves A x = v (trans = "N") or A^H x = v (trans = "H") using the factorization of A
+FactorizedSolve = Callable[[np.ndarray, str], np.ndarray]
+
+
+@dataclass
+class ConditionEstimate:
+    """
+    Estimation of the condition number of the matrix in the 1-norm.
+
+    matrix_norm - ||A||_1 (calculated exactly).
+    inverse_norm - estimation of ||A^(-1)||_1, which is never greater than the exact value.
+    solves - number of the solutions with the factorization used by the estimator.
+    """
+    matrix_norm: float
+    inverse_norm: float
+    solves: int
+
+    @property
+    def rcond(self) -> float:
+        return 1 / (self.matrix_norm * self.inverse_norm) if self.inverse_norm > 0 else 0.0
+
+    @property
+    def condition_number(self) -> float:
+        return self.matrix_norm * self.inverse_norm
+
+
+def matrix_one_norm(A: csr_matrix) -> float:
+    return float(abs(A).sum(axis=0).max())
+
+
+def complex_sign(x: np.ndarray) -> np.ndarray:
+    absolute = np.abs(x)
+    return np.where(absolute > 0, x / np.where(absolute > 0, absolute, 1), 1)
+
+
+def estimate_inverse_norm(solve: FactorizedSolve, dimension: int) -> Tuple[float, int]:
+    r"""
+    Estimates ||A^(-1)||_1 using the method of Hager and Higham (LAPACK zlacn2).
+    Parameters
+    ----------
+    solve - solution of A x = v or A^H x = v using the factorization of A, see FactorizedSolve.
+    dimension - dimension of the matrix.
+
+    Returns
+    -------
+    Tuple of the estimation and the number of the performed solutions.
+    """
+    x = solve(np.full(dimension, 1 / dimension, dtype=np.cdouble), "N")
+    estimate, solves = float(np.abs(x).sum()), 1
+    if dimension == 1:
+        return estimate, solves
+
+    # the maximal column of A^(-1) is searched using the subgradient z = A^(-H) sign(x)
+    z = solve(complex_sign(x), "H")
+    j, solves = int(np.argmax(np.abs(z))), solves + 1
+    for _ in range(1, MAX_ESTIMATION_ITERATIONS):
+        unit = np.zeros(dimension, dtype=np.cdouble)
+        unit[j] = 1
+        x = solve(unit, "N")
+        previous, estimate, solves = estimate, float(np.abs(x).sum()), solves + 1
+        if estimate <= previous:
+            estimate = previous
+            break
+
+        z = solve(complex_sign(x), "H")
+        previous_j, j, solves = j, int(np.argmax(np.abs(z))), solves + 1
+        if np.abs(z[previous_j]) == np.abs(z[j]):
+            break
+
+    # the alternative estimation protects against the matrices, for which the iterations are stuck
+    indices = np.arange(dimension)
+    alternating = np.where(indices % 2 == 0, 1.0, -1.0) * (1 + indices / (dimension - 1)) + 0j
+    alternative = 2 * float(np.abs(solve(alternating, "N")).sum()) / (3 * dimension)
+    return max(estimate, alternative), solves + 1
+
+
+def estimate_condition(solve: FactorizedSolve, A: csr_matrix) -> ConditionEstimate:
+    r"""
+    Estimates the condition number of the matrix in the 1-norm reusing its factorization.
+    Parameters
+    ----------
+    solve - solution of A x = v or A^H x = v using the factorization of A, see FactorizedSolve.
+    A - sparse matrix of the system, which is used to calculate ||A||_1.
+
+    Returns
+    -------
+    Estimation of the condition number, see ConditionEstimate.
+    """
+    inverse_norm, solves = estimate_inverse_norm(solve, A.shape[0])
+    return ConditionEstimate(matrix_norm=matrix_one_norm(A), inverse_norm=inverse_norm, solves=solves)
+
+
+def dense_factorized_solve(A: np.ndarray) -> FactorizedSolve:
+    r"""
+    Returns the factorized solve for the dense matrix using its LU decomposition scipy.linalg.lu_factor.
+    """
+    factorization = lu_factor(A)
+    return lambda v, trans: lu_solve(factorization, v, trans=DENSE_TRANSPOSE_CODES[trans])
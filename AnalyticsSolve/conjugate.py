@@ -0,0 +1,119 @@
+r"""
+This module contains the solution of the system, which exploits the conjugate-pair structure of the unknowns:
+Ro11*, Ro22*, Ro33*, Ro12* are the conjugates of Ro11, Ro22, Ro33, Ro12 and the conjugated equations are the
+conjugates of the original ones. Thus the conjugated half of the system can be dropped and the remaining equations
+
+    A_uu u + A_uv conj(u) = b_u,
+
+where u = p + iq, are rewritten as the real system of the same number of real unknowns:
+
+    [Re(A_uu + A_uv)  -Im(A_uu - A_uv)] [p]   [Re(b_u)]
+    [Im(A_uu + A_uv)   Re(A_uu - A_uv)] [q] = [Im(b_u)].
+
+@author: shvatov
+"""
+from typing import Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, bmat
+from scipy.sparse.linalg import splu
+
+from assembly import SYSTEM_VAR_NUM
+
+# Number of the functions, which are not conjugated, in a single point of the mesh
+HALF_VAR_NUM = SYSTEM_VAR_NUM // 2
+
+# Relative tolerance of the check, that the system is conjugate-symmetric
+SYMMETRY_TOLERANCE = 1e-12
+
+
+def split_indices(dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Returns the indices of the original (Ro11, ..., Ro12) and conjugated (Ro11*, ..., Ro12*) variables.
+    """
+    indices = np.arange(dimension).reshape(-1, SYSTEM_VAR_NUM)
+    return indices[:, :HALF_VAR_NUM].reshape(-1), indices[:, HALF_VAR_NUM:].reshape(-1)
+
+
+def check_conjugate_symmetry(A: csr_matrix, b: np.ndarray) -> bool:
+    r"""
+    Checks, that conjugated equations are the conjugates of the original ones with swapped variables.
+    """
+    u, v = split_indices(A.shape[0])
+    scale = abs(A).max()
+    return abs(A[v][:, v] - A[u][:, u].conj()).max() <= SYMMETRY_TOLERANCE * scale \
+        and abs(A[v][:, u] - A[u][:, v].conj()).max() <= SYMMETRY_TOLERANCE * scale \
+        and np.abs(b[v] - b[u].conj()).max(initial=0.0) <= SYMMETRY_TOLERANCE * max(np.abs(b).max(initial=0.0), 1.0)
+
+
+def reduce_conjugate_system(A: csr_matrix, b: np.ndarray) -> Tuple[csr_matrix, np.ndarray]:
+    r"""
+    Builds the equivalent real system of the half size (in complex degrees of freedom).
+    Parameters
+    ----------
+    A - sparse matrix of the conjugate-symmetric system.
+    b - right-side vector.
+
+    Returns
+    -------
+    Tuple of the real sparse matrix and the real right side vector, see module documentation.
+    """
+    u, v = split_indices(A.shape[0])
+    A_u = A.tocsr()[u]
+    A_uu, A_uv = A_u[:, u], A_u[:, v]
+
+    A_sum, A_diff = A_uu + A_uv, A_uu - A_uv
+    real_A = bmat([[A_sum.real, -A_diff.imag], [A_sum.imag, A_diff.real]], format="csr")
+    real_b = np.concatenate([b[u].real, b[u].imag])
+
+    # p and q of the same point are placed next to each other, so that the matrix stays banded
+    order = interleaving_order(real_b.shape[0])
+    return real_A[order][:, order].tocsc(), real_b[order]
+
+
+def interleaving_order(dimension: int) -> np.ndarray:
+    r"""
+    Returns the permutation, which converts [p; q] ordering of the real unknowns into the point-major one:
+    p of the point 0, q of the point 0, p of the point 1, etc.
+    """
+    half = dimension // 2
+    indices = np.arange(dimension)
+    return np.concatenate([indices[:half].reshape(-1, HALF_VAR_NUM),
+                           indices[half:].reshape(-1, HALF_VAR_NUM)], axis=1).reshape(-1)
+
+
+def restore_conjugate_solution(real_solution: np.ndarray) -> np.ndarray:
+    r"""
+    Restores the full solution vector (ordered as EquationSystem.ordered_variables())
+    from the solution of the reduced real system.
+    """
+    half = real_solution.shape[0] // 2
+    ordered_solution = np.empty_like(real_solution)
+    ordered_solution[interleaving_order(real_solution.shape[0])] = real_solution
+    u = ordered_solution[:half] + 1j * ordered_solution[half:]
+
+    solution = np.empty((half // HALF_VAR_NUM, SYSTEM_VAR_NUM), dtype=np.cdouble)
+    solution[:, :HALF_VAR_NUM] = u.reshape(-1, HALF_VAR_NUM)
+    solution[:, HALF_VAR_NUM:] = u.conj().reshape(-1, HALF_VAR_NUM)
+    return solution.reshape(-1)
+
+
+def solve_conjugate_symmetric(A: csr_matrix, b: np.ndarray, check_symmetry: bool = False) -> np.ndarray:
+    r"""
+    Solves the conjugate-symmetric system Ax = b using the reduced real formulation.
+    Parameters
+    ----------
+    A - sparse matrix of coefficients of the variables.
+    b - right-side vector.
+    check_symmetry - whether to check, that the system is conjugate-symmetric, before solving it.
+
+    Returns
+    -------
+    Vector of complex solutions of the system.
+    """
+    if check_symmetry:
+        assert check_conjugate_symmetry(A, b), "System is not conjugate-symmetric"
+    real_A, real_b = reduce_conjugate_system(A, b)
+
+    # reduced matrix is already banded in the point-major ordering, so no fill-reducing permutation is required
+    return restore_conjugate_solution(splu(real_A, permc_spec="NATURAL").solve(real_b))
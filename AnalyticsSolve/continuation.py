@@ -0,0 +1,291 @@
+r"""
+This module contains the continuation driver, which solves the system for the sequence of the values of one of the
+constant coefficients of the EquationSystem (e.g. the Rabi frequencies C1, C2 or the detunings Delta1, Delta2),
+and can be used as a standalone application.
+
+The solution depends smoothly on the coefficients, thus the solution for the previous value is a good initial
+approximation of the iterative solvers (see ContinuationSolver) for the next one. The initial approximation is
+predicted either by the previous solution (PREVIOUS) or by the linear extrapolation of the two previous ones (SECANT),
+the error of which is O(step^2). The step is adapted to the convergence: it is doubled, if the solver needed not more
+than a half of the target number of the iterations, halved, if it needed more than the target number, and the point
+is solved again with the halved step, if the solver did not converge.
+
+Optionally each point is also solved from the cold start (the default initial approximation of the solver), so that
+the time saved by the continuation is measured. The results are collected into a single table indexed by the value
+of the coefficient (see ContinuationResult), which can be printed or saved as the CSV file.
+
+Usage: python continuation.py [coefficient] [start] [stop] [step] [krylov | multigrid | nonlinear] [N]
+
+@author: shvatov
+"""
+import csv
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from assembly import assemble_blocks, backward_error, prepare_coefficients
+from equation import DEFAULT_RADIUS
+from krylov import KrylovParams, PreconditionerKind, solve_krylov
+from multigrid import MultigridParams, MultigridSolver
+from nonlinear import AttenuationModel, NonlinearParams, solve_nonlinear
+
+# Default path of the table with the results
+DEFAULT_TABLE_PATH = "../cache/continuation.csv"
+
+# Names of the columns of the table with the results
+TABLE_COLUMNS = ("value", "step", "iterations", "cold_iterations", "time", "cold_time", "backward_error", "converged")
+
+
+class ContinuationSolver(Enum):
+    """
+    Iterative solver, which uses the predicted initial approximation.
+
+    KRYLOV - preconditioned Krylov solver of the linear system (see krylov).
+    MULTIGRID - multigrid solver of the linear system (see multigrid).
+    NONLINEAR - Newton/chord solver of the system with the attenuated fields (see nonlinear).
+    """
+    KRYLOV = 1
+    MULTIGRID = 2
+    NONLINEAR = 3
+
+
+class Predictor(Enum):
+    """
+    Prediction of the initial approximation, see module documentation.
+    """
+    PREVIOUS = 1
+    SECANT = 2
+
+
+@dataclass
+class ContinuationParams:
+    """
+    Parameters of the continuation.
+
+    coefficient - name of the coefficient, which is changed (see EquationSystem.constant_coefficients()).
+    start, stop - first and last values of the coefficient.
+    step - initial step of the coefficient, the sign is chosen according to the direction from start to stop.
+    adaptive - whether to adapt the step to the convergence or not, the step is limited by min_step and max_step
+    (by default the initial step divided and multiplied by 16).
+    target_iterations - number of the iterations, which the adaptation aims at.
+    compare_cold - whether to solve each point from the cold start as well to measure the saved time.
+    keep_solutions - whether to keep the solutions in all points (only the last one is kept otherwise).
+    krylov_params - parameters of the KRYLOV solver, by default GMRES with the multigrid preconditioner, which
+    converges in a few tens of the iterations independently of N.
+    """
+    coefficient: str = "C1"
+    start: float = 1e5
+    stop: float = 5e5
+    step: float = 1e4
+    solver: ContinuationSolver = ContinuationSolver.KRYLOV
+    predictor: Predictor = Predictor.SECANT
+    adaptive: bool = True
+    min_step: Optional[float] = None
+    max_step: Optional[float] = None
+    target_iterations: int = 10
+    compare_cold: bool = True
+    keep_solutions: bool = False
+    krylov_params: KrylovParams = field(default_factory=lambda: KrylovParams(
+        preconditioner=PreconditionerKind.MULTIGRID, rtol=1e-10))
+    multigrid_params: Optional[MultigridParams] = None
+    nonlinear_params: Optional[NonlinearParams] = None
+    attenuation: Optional[AttenuationModel] = None
+
+
+@dataclass
+class ContinuationPoint:
+    """
+    Results of the solution for the single value of the coefficient.
+
+    step - step of the coefficient, which led to this value (0 for the first point).
+    iterations, time - number of the iterations of the solver and the time in seconds (including the assembly)
+    of the warm-started solution.
+    cold_iterations, cold_time - the same values of the cold-started solution (0 if it was not compared).
+    backward_error - backward error of the warm-started solution (see assembly.backward_error).
+    """
+    value: float
+    step: float
+    iterations: int
+    time: float
+    backward_error: float
+    converged: bool
+    cold_iterations: int = 0
+    cold_time: float = 0.0
+
+
+@dataclass
+class ContinuationResult:
+    """
+    Results of the continuation.
+
+    points - results for each value of the coefficient in the order of the continuation.
+    rejected_steps - number of the steps, which were halved, because the solver did not converge.
+    solutions - solutions in all points (if ContinuationParams.keep_solutions is set) or in the last one only.
+    """
+    coefficient: str
+    points: List[ContinuationPoint] = field(default_factory=list)
+    rejected_steps: int = 0
+    solutions: List[np.ndarray] = field(default_factory=list)
+
+    @property
+    def total_time(self) -> float:
+        return sum(point.time for point in self.points)
+
+    @property
+    def cold_time(self) -> float:
+        return sum(point.cold_time for point in self.points)
+
+    def rows(self) -> List[Tuple]:
+        r"""
+        Returns the rows of the table with the results, the columns are TABLE_COLUMNS.
+        """
+        return [(p.value, p.step, p.iterations, p.cold_iterations, p.time, p.cold_time, p.backward_error, p.converged)
+                for p in self.points]
+
+    def format_table(self) -> str:
+        lines = [f"{self.coefficient:>12} {'step':>10} {'iterations':>10} {'cold':>6} {'time, s':>8} "
+                 f"{'cold, s':>8} {'backward error':>15} {'converged':>9}"]
+        for value, step, iterations, cold_iterations, elapsed, cold_elapsed, error, converged in self.rows():
+            lines.append(f"{value:>12.5g} {step:>10.3g} {iterations:>10} {cold_iterations:>6} {elapsed:>8.3f} "
+                         f"{cold_elapsed:>8.3f} {error:>15.3e} {str(converged):>9}")
+        return "\n".join(lines)
+
+    def save(self, path: str = DEFAULT_TABLE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="") as table_file:
+            writer = csv.writer(table_file)
+            writer.writerow((self.coefficient,) + TABLE_COLUMNS[1:])
+            writer.writerows(self.rows())
+
+
+def solve_point(params: ContinuationParams,
+                intervals_number: int,
+                radius: float,
+                coefficients: Dict[str, complex],
+                initial: Optional[np.ndarray]) -> Tuple[np.ndarray, int, float, bool, float]:
+    r"""
+    Solves the system for the given coefficients with the given initial approximation (None for the cold start).
+    Returns the tuple of the solution, the number of the iterations, the backward error, the flag, whether
+    the solver converged, and the time in seconds.
+    """
+    start = time.perf_counter()
+    if params.solver == ContinuationSolver.NONLINEAR:
+        solution, report = solve_nonlinear(intervals_number, radius, coefficients, params.attenuation,
+                                           params.nonlinear_params, initial)
+        return solution, len(report.iterations) - 1, report.iterations[-1].residual_norm, report.converged, \
+            time.perf_counter() - start
+
+    system = assemble_blocks(intervals_number, radius, coefficients)
+    if params.solver == ContinuationSolver.MULTIGRID:
+        solution, report = MultigridSolver(system, params.multigrid_params).solve(initial=initial)
+        return solution, report.iterations, report.backward_error, report.converged, time.perf_counter() - start
+
+    solution, report = solve_krylov(intervals_number, radius, coefficients, params.krylov_params, system, initial)
+    elapsed = time.perf_counter() - start
+    return solution, report.iterations, backward_error(system.to_csr(), system.rhs_vector(), solution), \
+        report.converged, elapsed
+
+
+def predict(params: ContinuationParams, values: List[float], solutions: List[np.ndarray], value: float) -> np.ndarray:
+    r"""
+    Predicts the solution for the given value of the coefficient using the solutions in the previous points.
+    """
+    if params.predictor == Predictor.PREVIOUS or len(solutions) < 2:
+        return solutions[-1]
+    ratio = (value - values[-1]) / (values[-1] - values[-2])
+    return solutions[-1] + ratio * (solutions[-1] - solutions[-2])
+
+
+def run_continuation(intervals_number: int,
+                     radius: float = DEFAULT_RADIUS,
+                     coefficients: Optional[Dict[str, complex]] = None,
+                     params: Optional[ContinuationParams] = None) -> ContinuationResult:
+    r"""
+    Solves the system for the values of the coefficient from start to stop, see module documentation.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the other coefficients, which override the default ones.
+    params - parameters of the continuation, see ContinuationParams.
+
+    Returns
+    -------
+    Results of the continuation, see ContinuationResult.
+    """
+    params = params if params is not None else ContinuationParams()
+    assert params.coefficient in prepare_coefficients(), f"Unknown coefficient: {params.coefficient}"
+    assert params.step != 0
+    assert params.target_iterations > 0
+    direction = 1.0 if params.stop >= params.start else -1.0
+    step = abs(params.step)
+    min_step = params.min_step if params.min_step is not None else step / 16
+    max_step = params.max_step if params.max_step is not None else step * 16
+
+    result = ContinuationResult(coefficient=params.coefficient)
+    values: List[float] = list()
+    solutions: List[np.ndarray] = list()
+    value, previous_step = params.start, 0.0
+    while True:
+        point_coefficients = dict(coefficients) if coefficients is not None else dict()
+        point_coefficients[params.coefficient] = value
+        initial = predict(params, values, solutions, value) if solutions else None
+        solution, iterations, error, converged, elapsed = solve_point(params, intervals_number, radius,
+                                                                      point_coefficients, initial)
+        if not converged and solutions and params.adaptive and previous_step / 2 >= min_step:
+            result.rejected_steps += 1
+            previous_step /= 2
+            value = values[-1] + direction * previous_step
+            step = previous_step
+            continue
+
+        point = ContinuationPoint(value=value, step=previous_step, iterations=iterations, time=elapsed,
+                                  backward_error=error, converged=converged)
+        if params.compare_cold:
+            if initial is None:
+                point.cold_iterations, point.cold_time = iterations, elapsed
+            else:
+                _, point.cold_iterations, _, _, point.cold_time = solve_point(params, intervals_number, radius,
+                                                                              point_coefficients, None)
+        result.points.append(point)
+        values.append(value)
+        solutions = (solutions + [solution])[-2:] if not params.keep_solutions else solutions + [solution]
+
+        if direction * (params.stop - value) <= 0:
+            break
+        if params.adaptive and initial is not None:
+            if iterations <= params.target_iterations / 2:
+                step = min(step * 2, max_step)
+            elif iterations > params.target_iterations:
+                step = max(step / 2, min_step)
+        previous_step = min(step, direction * (params.stop - value))
+        value = value + direction * previous_step
+
+    result.solutions = solutions if params.keep_solutions else solutions[-1:]
+    return result
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    continuation_params = ContinuationParams(
+        coefficient=arguments[0] if arguments else "C1",
+        start=float(arguments[1]) if len(arguments) > 1 else 1e5,
+        stop=float(arguments[2]) if len(arguments) > 2 else 5e5,
+        step=float(arguments[3]) if len(arguments) > 3 else 1e4,
+        solver=ContinuationSolver[arguments[4].upper()] if len(arguments) > 4 else ContinuationSolver.KRYLOV)
+    n = int(float(arguments[5])) if len(arguments) > 5 else 1000
+
+    continuation = run_continuation(n, params=continuation_params)
+    print(f"Continuation over {continuation.coefficient}: {continuation_params.solver.name}, N = {n}, "
+          f"predictor: {continuation_params.predictor.name}\n")
+    print(continuation.format_table())
+    print(f"\nPoints: {len(continuation.points)}, rejected steps: {continuation.rejected_steps}")
+    print(f"Time: {continuation.total_time:.3f} s, cold starts: {continuation.cold_time:.3f} s, "
+          f"saved: {continuation.cold_time - continuation.total_time:.3f} s")
+    continuation.save()
+    print(f"Table is saved into {DEFAULT_TABLE_PATH}")
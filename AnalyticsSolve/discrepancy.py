@@ -0,0 +1,104 @@
+r"""
+This module contains the vectorized discrepancy (residual) function of the equation system,
+which is the numpy analogue of the calculateDiscrepancy subroutine from Discrepancy.f90.
+
+The function is generated only once from the expressions of the EquationSystem: the left, main and right
+equations are taken from the stencil templates derived at the generic index i (see EquationSystem.stencil_templates),
+common subexpressions (ro_13, ro_23, omega, ...) are factored out and the result is lambdified,
+so that it can be evaluated for the whole mesh in one call.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+from sympy import Symbol, lambdify
+
+from assembly import SYSTEM_VAR_NUM, MeshValues, prepare_coefficients
+from equation import EquationSystem, DEFAULT_RADIUS
+from registry import cached
+
+
+@dataclass
+class StencilKernels:
+    r"""
+    Lambdified equations of the system. Each kernel accepts the values of the functions in the point
+    and its neighbours, the values of r and the coefficients, and returns the list of 8 values of the equations.
+
+    left(ro[i], ro[i + 1], r[i], r[i + 1/2], h, *coefficients) - equations for i = 0.
+    main(ro[i - 1], ro[i], ro[i + 1], r[i], r[i + 1/2], r[i - 1/2], h, *coefficients) - equations for i in [1; N - 1].
+    right(ro[i], *coefficients) - equations for i = N.
+    coefficients - names of the coefficients in the order they are expected by the kernels.
+    """
+    left: Callable
+    main: Callable
+    right: Callable
+    coefficients: Sequence[str]
+
+
+@cached("discrepancy.prepare_stencil_kernels")
+def prepare_stencil_kernels() -> StencilKernels:
+    r"""
+    Generates the kernels from the stencil templates of the EquationSystem. The result is cached
+    in the registry, thus the symbolic work is performed only once per process (unless it is evicted).
+    """
+    templates = EquationSystem.stencil_templates()
+    prev_ro, cur_ro, next_ro = templates.previous, templates.current, templates.next
+    ri, ri_plus_half, ri_minus_half = templates.ri, templates.ri_plus_half, templates.ri_minus_half
+    h = Symbol("h")
+    coefficients = [c.symbol for c in EquationSystem.constant_coefficients()]
+
+    return StencilKernels(
+        left=lambdify([cur_ro, next_ro, ri, ri_plus_half, h, *coefficients], templates.left,
+                      modules="numpy", cse=True),
+        main=lambdify([prev_ro, cur_ro, next_ro, ri, ri_plus_half, ri_minus_half, h, *coefficients], templates.main,
+                      modules="numpy", cse=True),
+        right=lambdify([cur_ro, *coefficients], templates.right, modules="numpy", cse=True),
+        coefficients=[c.name for c in coefficients],
+    )
+
+
+def evaluate_kernel(kernel: Callable, shape: Sequence[int], *args) -> np.ndarray:
+    r"""
+    Evaluates the kernel and broadcasts each of its 8 results (some of them may be scalars) to the given shape.
+    """
+    result = np.empty((SYSTEM_VAR_NUM, *shape), dtype=np.cdouble)
+    for k, value in enumerate(kernel(*args)):
+        result[k] = value
+    return result
+
+
+def discrepancy(ro_mesh: np.ndarray,
+                radius: float = DEFAULT_RADIUS,
+                coefficients: Optional[Dict[str, complex]] = None) -> np.ndarray:
+    r"""
+    Calculates the discrepancy vector of the system for the given values of the functions in the points of the mesh.
+    Parameters
+    ----------
+    ro_mesh - matrix (8, N + 1), which contains the values of the functions Ro11, Ro22, Ro33, Ro12,
+    Ro11*, Ro22*, Ro33*, Ro12* in the points of the mesh.
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+
+    Returns
+    -------
+    Discrepancy vector of the size 8 * (N + 1), ordered as EquationSystem.ordered_equations().
+    """
+    assert ro_mesh.shape[0] == SYSTEM_VAR_NUM
+    assert ro_mesh.shape[1] > 1
+
+    kernels = prepare_stencil_kernels()
+    n = ro_mesh.shape[1] - 1
+    mesh = MeshValues.create(n, radius)
+    values = prepare_coefficients(coefficients)
+    coefficient_values = [values[name] for name in kernels.coefficients]
+
+    psi = np.empty((SYSTEM_VAR_NUM, n + 1), dtype=np.cdouble)
+    psi[:, 0] = evaluate_kernel(kernels.left, (), ro_mesh[:, 0], ro_mesh[:, 1],
+                                mesh.r[0], mesh.r_plus_half[0], mesh.h, *coefficient_values)
+    psi[:, 1:n] = evaluate_kernel(kernels.main, (n - 1,), ro_mesh[:, 0:n - 1], ro_mesh[:, 1:n], ro_mesh[:, 2:n + 1],
+                                  mesh.r[1:n], mesh.r_plus_half[1:n], mesh.r_minus_half[0:n - 1], mesh.h,
+                                  *coefficient_values)
+    psi[:, n] = evaluate_kernel(kernels.right, (), ro_mesh[:, n], *coefficient_values)
+    return psi.T.reshape(-1)
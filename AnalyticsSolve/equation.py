@@ -5,13 +5,14 @@ that are used to represent the equation system in the application.
 @author: shvatov
 """
 from dataclasses import dataclass
-from functools import lru_cache
-from typing import Dict, Callable, Any, Optional, Sequence, Collection
+from typing import Dict, Callable, Any, Optional, Sequence, Collection, Iterator
 
 from sympy import Symbol, Expr, I
 from sympy.functions.elementary.complexes import conjugate
 from sympy.functions.elementary.exponential import exp
 
+from registry import cached, REGISTRY
+
 # Default radius of the area specified in the task
 DEFAULT_RADIUS = 3.3
 
@@ -90,6 +91,45 @@ class EquationSystemExpression:
         return hash(self.__expressions)
 
 
+def replace_unevaluated(expr: Expr, replacement: Dict[Expr, Expr]) -> Expr:
+    r"""
+    Works as Expr.xreplace, but does not evaluate (flatten, collect, sort) the rebuilt sums and products.
+    Templates are already evaluated and each symbol is replaced with another symbol, thus the rebuilt expressions
+    are equal to the evaluated ones up to the order of the arguments, and the replacement is about 3 times cheaper.
+    """
+    value = replacement.get(expr)
+    if value is not None:
+        return value
+    if not expr.args:
+        return expr
+    return expr.func(*[replace_unevaluated(arg, replacement) for arg in expr.args], evaluate=False)
+
+
+@dataclass
+class StencilTemplates:
+    """
+    Defines the equations of the system derived at the generic index i. Concrete equations
+    of the point i are obtained by replacing the generic symbols with the symbols of that point.
+    """
+    # Equations for i = 0, 0 < i < N and i = N
+    left: Sequence[Expr]
+    main: Sequence[Expr]
+    right: Sequence[Expr]
+
+    # omega_1, omega_2, omega_1*, omega_2*, ro_13, ro_13*, ro_23, ro_23* in the point i
+    auxiliary: Sequence[Expr]
+
+    # Ro11, ..., Ro12* in the points i - 1, i and i + 1
+    previous: Sequence[Symbol]
+    current: Sequence[Symbol]
+    next: Sequence[Symbol]
+
+    # r[i], r[i + 1/2], r[i - 1/2]
+    ri: Symbol
+    ri_plus_half: Symbol
+    ri_minus_half: Symbol
+
+
 @dataclass(init=False, eq=False)
 class EquationSystem:
     # Number of the intervals in the scheme
@@ -101,6 +141,9 @@ class EquationSystem:
     # Size of the step in the mesh
     h: EquationSystemCoefficient
 
+    # Whether the equations are built on demand point by point or not
+    streaming: bool
+
     # r[i] variables
     ri: EquationSystemVariable
     ri_plus_half: EquationSystemVariable
@@ -197,7 +240,11 @@ class EquationSystem:
     a: EquationSystemCoefficient = EquationSystemCoefficient.create(symbol="a", value=1.4)
     q: EquationSystemCoefficient = EquationSystemCoefficient.create(symbol="q", value=4.29 / 2.9)
 
-    def __init__(self, intervals_number: int, radius: float):
+    def __init__(self, intervals_number: int, radius: float, streaming: bool = False):
+        r"""
+        Creates the equation system. If streaming is True, then the expressions of the equations are
+        not built in advance and are created point by point on demand, see stream_equations().
+        """
         assert intervals_number > 0
         assert radius > 0
 
@@ -239,321 +286,342 @@ class EquationSystem:
         self.ro_12_conjg = EquationSystemVariable.from_pattern(symbol_pattern="r12c[{}]",
                                                                elements_number=self.N + 1)
 
-        self.omega_1 = EquationSystemExpression(
-            [self.C1.symbol * exp(-(self.ri[i] / self.a.symbol) ** 2) for i in range(0, self.N + 1)]
-        )
-        self.omega_2 = EquationSystemExpression(
-            [self.C2.symbol * exp(-(self.ri[i] / self.a.symbol) ** 2) for i in range(0, self.N + 1)]
-        )
-
-        self.omega_1_conjg = EquationSystemExpression(
-            [conjugate(self.omega_1[i]) for i in range(0, self.N + 1)]
-        )
-        self.omega_2_conjg = EquationSystemExpression(
-            [conjugate(self.omega_2[i]) for i in range(0, self.N + 1)]
-        )
-
-        self.ro_13 = EquationSystemExpression(
-            [
-                (I * self.omega_2[i] * self.ro_12[i] - I * self.omega_1[i] *
-                 (self.ro_33[i] - self.ro_11[i])) / (I * self.delta_1.symbol + self.gamma.symbol)
-                for i in range(0, self.N + 1)
-            ]
-        )
-
-        self.ro_13_conjg = EquationSystemExpression(
-            [
-                (-I * self.omega_2_conjg[i] * self.ro_12_conjg[i] + I * self.omega_1_conjg[i] *
-                 (self.ro_33_conjg[i] - self.ro_11_conjg[i])) / (-I * self.delta_1.symbol + self.gamma.symbol)
-                for i in range(0, self.N + 1)
-            ]
-        )
-
-        self.ro_23 = EquationSystemExpression(
-            [
-                (I * self.omega_1[i] * self.ro_12_conjg[i] - I * self.omega_1[i] *
-                 (self.ro_33[i] - self.ro_22[i])) / (I * self.delta_2.symbol + self.gamma.symbol)
-                for i in range(0, self.N + 1)
-            ]
-        )
-
-        self.ro_23_conjg = EquationSystemExpression(
-            [
-                (-I * self.omega_1_conjg[i] * self.ro_12[i] + I * self.omega_1_conjg[i] *
-                 (self.ro_33_conjg[i] - self.ro_22_conjg[i])) / (-I * self.delta_2.symbol + self.gamma.symbol)
-                for i in range(0, self.N + 1)
-            ]
-        )
-
-        self.left_1 = EquationSystemExpression(
-            [
-                (
-                        self.d_11.symbol * (self.ri_plus_half[0] * (self.ro_11[1] - self.ro_11[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                I * self.omega_1[0] * self.ro_13_conjg[0]
-                                - I * self.omega_1_conjg[0] * self.ro_13[0]
-                                - self.gamma_31.symbol * self.ro_33[0]
-                                + self.g_parallel.symbol * (self.ro_11[0] - self.ro_22[0])
-                        )
-                )
-            ]
-        )
-
-        self.left_2 = EquationSystemExpression(
-            [
-                (
-                        self.d_22.symbol * (self.ri_plus_half[0] * (self.ro_22[1] - self.ro_22[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                I * self.omega_2[0] * self.ro_23_conjg[0]
-                                - I * self.omega_2_conjg[0] * self.ro_23[0]
-                                - self.gamma_32.symbol * self.ro_33[0]
-                                + self.g_parallel.symbol * (self.ro_22[0] - self.ro_11[0])
-                        )
-                )
-            ]
-        )
-
-        self.left_3 = EquationSystemExpression(
-            [
-                (
-                        self.d_33.symbol * (self.ri_plus_half[0] * (self.ro_33[1] - self.ro_33[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                I * self.omega_1_conjg[0] * self.ro_13[0]
-                                - I * self.omega_1[0] * self.ro_13_conjg[0]
-                                + I * self.omega_2_conjg[0] * self.ro_23[0]
-                                - I * self.omega_2[0] * self.ro_23_conjg[0]
-                                + (self.gamma_31.symbol + self.gamma_32.symbol) * self.ro_33[0]
-                        )
-                )
-            ]
-        )
-
-        self.left_4 = EquationSystemExpression(
-            [
-                (
-                        self.d_12.symbol * (self.ri_plus_half[0] * (self.ro_12[1] - self.ro_12[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                (I * (self.delta_2.symbol - self.delta_1.symbol) + (
-                                        self.g_perpendicular.symbol + self.q.symbol ** 2 * self.d_12.symbol)) *
-                                self.ro_12[0]
-                                - I * self.omega_2_conjg[0] * self.ro_13[0]
-                                + I * self.omega_1[0] * self.ro_23_conjg[0]
-                        )
-                )
-            ]
-        )
-
-        self.left_1_conjg = EquationSystemExpression(
-            [
-                (
-                        self.d_11.symbol
-                        * (self.ri_plus_half[0] * (self.ro_11_conjg[1] - self.ro_11_conjg[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                -I * self.omega_1_conjg[0] * self.ro_13[0]
-                                + I * self.omega_1[0] * self.ro_13_conjg[0]
-                                - self.gamma_31.symbol * self.ro_33_conjg[0]
-                                + self.g_parallel.symbol * (self.ro_11_conjg[0] - self.ro_22_conjg[0])
-                        )
-                )
-            ]
-        )
-
-        self.left_2_conjg = EquationSystemExpression(
-            [
-                (
-                        self.d_22.symbol *
-                        (self.ri_plus_half[0] * (self.ro_22_conjg[1] - self.ro_22_conjg[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                -I * self.omega_2_conjg[0] * self.ro_23[0]
-                                + I * self.omega_2[0] * self.ro_23_conjg[0]
-                                - self.gamma_32.symbol * self.ro_33_conjg[0]
-                                + self.g_parallel.symbol * (self.ro_22_conjg[0] - self.ro_11_conjg[0])
-                        )
-                )
-            ]
-        )
-
-        self.left_3_conjg = EquationSystemExpression(
-            [
-                (
-                        self.d_33.symbol
-                        * (self.ri_plus_half[0] * (self.ro_33_conjg[1] - self.ro_33_conjg[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                -I * self.omega_1[0] * self.ro_13_conjg[0]
-                                + I * self.omega_1_conjg[0] * self.ro_13[0]
-                                - I * self.omega_2[0] * self.ro_23_conjg[0]
-                                + I * self.omega_2_conjg[0] * self.ro_23[0]
-                                + (self.gamma_31.symbol + self.gamma_32.symbol) * self.ro_33_conjg[0]
-                        )
-                )
-            ]
-        )
-
-        self.left_4_conjg = EquationSystemExpression(
-            [
-                (
-                        self.d_12.symbol
-                        * (self.ri_plus_half[0] * (self.ro_12_conjg[1] - self.ro_12_conjg[0]) / self.h.symbol)
-                        - 1 / 4 * self.ri_plus_half[0] * self.h.symbol * (
-                                (-I * (self.delta_2.symbol - self.delta_1.symbol)
-                                 + (self.g_perpendicular.symbol + self.q.symbol ** 2 * self.d_12.symbol))
-                                * self.ro_12_conjg[0]
-                                + I * self.omega_2[0] * self.ro_13_conjg[0]
-                                - I * self.omega_1_conjg[0] * self.ro_23[0]
-                        )
-                )
-            ]
-        )
-
-        self.main_1 = EquationSystemExpression(
-            [
-                (
-                        self.d_11.symbol
-                        * (self.ri_plus_half[i] * (self.ro_11[i + 1] - self.ro_11[i]) / self.h.symbol)
-                        - self.d_11.symbol
-                        * (self.ri_minus_half[i] * (self.ro_11[i] - self.ro_11[i - 1]) / self.h.symbol)
-                        - self.ri[i] * self.h.symbol * (
-                                I * self.omega_1[i] * self.ro_13_conjg[i]
-                                - I * self.omega_1_conjg[i] * self.ro_13[i]
-                                - self.gamma_31.symbol * self.ro_33[i]
-                                + self.g_parallel.symbol * (self.ro_11[i] - self.ro_22[i])
-                        )
-                )
-                for i in range(1, self.N)
-            ]
-        )
-
-        self.main_2 = EquationSystemExpression(
-            [
-                (
-                        self.d_22.symbol
-                        * (self.ri_plus_half[i] * (self.ro_22[i + 1] - self.ro_22[i]) / self.h.symbol)
-                        - self.d_22.symbol
-                        * (self.ri_minus_half[i] * (self.ro_22[i] - self.ro_22[i - 1]) / self.h.symbol)
-                        - self.ri[i] * self.h.symbol * (
-                                I * self.omega_2[i] * self.ro_23_conjg[i]
-                                - I * self.omega_2_conjg[i] * self.ro_23[i]
-                                - self.gamma_32.symbol * self.ro_33[i]
-                                + self.g_parallel.symbol * (self.ro_22[i] - self.ro_11[i])
-                        )
-                )
-                for i in range(1, self.N)
-            ]
-        )
-
-        self.main_3 = EquationSystemExpression(
-            [
-                (
-                        self.d_33.symbol
-                        * (self.ri_plus_half[i] * (self.ro_33[i + 1] - self.ro_33[i]) / self.h.symbol)
-                        - self.d_33.symbol
-                        * (self.ri_minus_half[i] * (self.ro_33[i] - self.ro_33[i - 1]) / self.h.symbol)
-                        - self.ri[i] * self.h.symbol * (
-                                I * self.omega_1_conjg[i] * self.ro_13[i]
-                                - I * self.omega_1[i] * self.ro_13_conjg[i]
-                                + I * self.omega_2_conjg[i] * self.ro_23[i]
-                                - I * self.omega_2[i] * self.ro_23_conjg[i]
-                                + (self.gamma_31.symbol + self.gamma_32.symbol) * self.ro_33[i]
-                        )
-                )
-                for i in range(1, self.N)
-            ]
-        )
+        self.streaming = streaming
+        if self.streaming:
+            return
+
+        auxiliary = [self.instantiate_auxiliary_expressions(i) for i in range(0, self.N + 1)]
+        self.omega_1, self.omega_2, self.omega_1_conjg, self.omega_2_conjg, \
+            self.ro_13, self.ro_13_conjg, self.ro_23, self.ro_23_conjg = \
+            [EquationSystemExpression([exprs[k] for exprs in auxiliary]) for k in range(0, len(auxiliary[0]))]
+
+        left = self.instantiate_equations(0)
+        self.left_1, self.left_2, self.left_3, self.left_4, \
+            self.left_1_conjg, self.left_2_conjg, self.left_3_conjg, self.left_4_conjg = \
+            [EquationSystemExpression([eq]) for eq in left]
+
+        main = [self.instantiate_equations(i) for i in range(1, self.N)]
+        self.main_1, self.main_2, self.main_3, self.main_4, \
+            self.main_1_conjg, self.main_2_conjg, self.main_3_conjg, self.main_4_conjg = \
+            [EquationSystemExpression([eqs[k] for eqs in main]) for k in range(0, len(left))]
+
+        right = self.instantiate_equations(self.N)
+        self.right_1, self.right_2, self.right_3, self.right_4, \
+            self.right_1_conjg, self.right_2_conjg, self.right_3_conjg, self.right_4_conjg = \
+            [EquationSystemExpression([eq]) for eq in right]
+
+    @classmethod
+    def derive_auxiliary_expressions(cls, current: Sequence[Symbol], ri: Symbol) -> Sequence[Expr]:
+        r"""
+        Derives omega_1, omega_2, omega_1*, omega_2*, ro_13, ro_13*, ro_23, ro_23* in the point with the given
+        variables (in the order of point_variables()) and the given symbol of r.
+        """
+        ro_11, ro_22, ro_33, ro_12, ro_11_conjg, ro_22_conjg, ro_33_conjg, ro_12_conjg = current
+        omega_1 = cls.C1.symbol * exp(-(ri / cls.a.symbol) ** 2)
+        omega_2 = cls.C2.symbol * exp(-(ri / cls.a.symbol) ** 2)
+        omega_1_conjg, omega_2_conjg = conjugate(omega_1), conjugate(omega_2)
+        return [
+            omega_1,
+            omega_2,
+            omega_1_conjg,
+            omega_2_conjg,
+            (I * omega_2 * ro_12 - I * omega_1 * (ro_33 - ro_11)) / (I * cls.delta_1.symbol + cls.gamma.symbol),
+            (-I * omega_2_conjg * ro_12_conjg + I * omega_1_conjg * (ro_33_conjg - ro_11_conjg))
+            / (-I * cls.delta_1.symbol + cls.gamma.symbol),
+            (I * omega_1 * ro_12_conjg - I * omega_1 * (ro_33 - ro_22)) / (I * cls.delta_2.symbol + cls.gamma.symbol),
+            (-I * omega_1_conjg * ro_12 + I * omega_1_conjg * (ro_33_conjg - ro_22_conjg))
+            / (-I * cls.delta_2.symbol + cls.gamma.symbol),
+        ]
 
-        self.main_4 = EquationSystemExpression([
+    @classmethod
+    def derive_left_equations(cls,
+                              current: Sequence[Symbol],
+                              following: Sequence[Symbol],
+                              ri: Symbol,
+                              ri_plus_half: Symbol,
+                              h: Symbol) -> Sequence[Expr]:
+        r"""
+        Derives the equations of the left boundary (i = 0) in the order of ordered_equations()
+        for the given variables of the points i and i + 1 and the given symbols of r[i], r[i + 1/2] and h.
+        """
+        ro_11, ro_22, ro_33, ro_12, ro_11_conjg, ro_22_conjg, ro_33_conjg, ro_12_conjg = current
+        ro_11_next, ro_22_next, ro_33_next, ro_12_next, \
+            ro_11_conjg_next, ro_22_conjg_next, ro_33_conjg_next, ro_12_conjg_next = following
+        omega_1, omega_2, omega_1_conjg, omega_2_conjg, ro_13, ro_13_conjg, ro_23, ro_23_conjg = \
+            cls.derive_auxiliary_expressions(current, ri)
+        return [
             (
-                    self.d_12.symbol
-                    * (self.ri_plus_half[i] * (self.ro_12[i + 1] - self.ro_12[i]) / self.h.symbol)
-                    - self.d_12.symbol
-                    * (self.ri_minus_half[i] * (self.ro_12[i] - self.ro_12[i - 1]) / self.h.symbol)
-                    - self.ri[i] * self.h.symbol * (
-                            (I * (self.delta_2.symbol - self.delta_1.symbol)
-                             + (self.g_perpendicular.symbol + self.q.symbol ** 2 * self.d_12.symbol))
-                            * self.ro_12[i]
-                            - I * self.omega_2_conjg[i] * self.ro_13[i]
-                            + I * self.omega_1[i] * self.ro_23_conjg[i]
+                    cls.d_11.symbol * (ri_plus_half * (ro_11_next - ro_11) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            I * omega_1 * ro_13_conjg
+                            - I * omega_1_conjg * ro_13
+                            - cls.gamma_31.symbol * ro_33
+                            + cls.g_parallel.symbol * (ro_11 - ro_22)
                     )
-            )
-            for i in range(1, self.N)
-        ])
-
-        self.main_1_conjg = EquationSystemExpression([
+            ),
             (
-                    self.d_11.symbol
-                    * (self.ri_plus_half[i] * (self.ro_11_conjg[i + 1] - self.ro_11_conjg[i]) / self.h.symbol)
-                    - self.d_11.symbol *
-                    (self.ri_minus_half[i] * (self.ro_11_conjg[i] - self.ro_11_conjg[i - 1]) / self.h.symbol)
-                    - self.ri[i] * self.h.symbol * (
-                            -I * self.omega_1_conjg[i] * self.ro_13[i]
-                            + I * self.omega_1[i] * self.ro_13_conjg[i]
-                            - self.gamma_31.symbol * self.ro_33_conjg[i]
-                            + self.g_parallel.symbol * (self.ro_11_conjg[i] - self.ro_22_conjg[i])
+                    cls.d_22.symbol * (ri_plus_half * (ro_22_next - ro_22) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            I * omega_2 * ro_23_conjg
+                            - I * omega_2_conjg * ro_23
+                            - cls.gamma_32.symbol * ro_33
+                            + cls.g_parallel.symbol * (ro_22 - ro_11)
                     )
-            )
-            for i in range(1, self.N)
-        ])
-
-        self.main_2_conjg = EquationSystemExpression([
+            ),
             (
-                    self.d_22.symbol
-                    * (self.ri_plus_half[i] * (self.ro_22_conjg[i + 1] - self.ro_22_conjg[i]) / self.h.symbol)
-                    - self.d_22.symbol
-                    * (self.ri_minus_half[i] * (self.ro_22_conjg[i] - self.ro_22_conjg[i - 1]) / self.h.symbol)
-                    - self.ri[i] * self.h.symbol * (
-                            -I * self.omega_2_conjg[i] * self.ro_23[i]
-                            + I * self.omega_2[i] * self.ro_23_conjg[i]
-                            - self.gamma_32.symbol * self.ro_33_conjg[i]
-                            + self.g_parallel.symbol * (self.ro_22_conjg[i] - self.ro_11_conjg[i])
+                    cls.d_33.symbol * (ri_plus_half * (ro_33_next - ro_33) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            I * omega_1_conjg * ro_13
+                            - I * omega_1 * ro_13_conjg
+                            + I * omega_2_conjg * ro_23
+                            - I * omega_2 * ro_23_conjg
+                            + (cls.gamma_31.symbol + cls.gamma_32.symbol) * ro_33
                     )
-            )
-            for i in range(1, self.N)
-        ])
-
-        self.main_3_conjg = EquationSystemExpression([
+            ),
+            (
+                    cls.d_12.symbol * (ri_plus_half * (ro_12_next - ro_12) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            (I * (cls.delta_2.symbol - cls.delta_1.symbol) + (
+                                    cls.g_perpendicular.symbol + cls.q.symbol ** 2 * cls.d_12.symbol)) *
+                            ro_12
+                            - I * omega_2_conjg * ro_13
+                            + I * omega_1 * ro_23_conjg
+                    )
+            ),
+            (
+                    cls.d_11.symbol * (ri_plus_half * (ro_11_conjg_next - ro_11_conjg) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            -I * omega_1_conjg * ro_13
+                            + I * omega_1 * ro_13_conjg
+                            - cls.gamma_31.symbol * ro_33_conjg
+                            + cls.g_parallel.symbol * (ro_11_conjg - ro_22_conjg)
+                    )
+            ),
+            (
+                    cls.d_22.symbol * (ri_plus_half * (ro_22_conjg_next - ro_22_conjg) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            -I * omega_2_conjg * ro_23
+                            + I * omega_2 * ro_23_conjg
+                            - cls.gamma_32.symbol * ro_33_conjg
+                            + cls.g_parallel.symbol * (ro_22_conjg - ro_11_conjg)
+                    )
+            ),
             (
-                    self.d_33.symbol
-                    * (self.ri_plus_half[i] * (self.ro_33_conjg[i + 1] - self.ro_33_conjg[i]) / self.h.symbol)
-                    - self.d_33.symbol
-                    * (self.ri_minus_half[i] * (self.ro_33_conjg[i] - self.ro_33_conjg[i - 1]) / self.h.symbol)
-                    - self.ri[i] * self.h.symbol * (
-                            -I * self.omega_1[i] * self.ro_13_conjg[i]
-                            + I * self.omega_1_conjg[i] * self.ro_13[i]
-                            - I * self.omega_2[i] * self.ro_23_conjg[i]
-                            + I * self.omega_2_conjg[i] * self.ro_23[i]
-                            + (self.gamma_31.symbol + self.gamma_32.symbol) * self.ro_33_conjg[i]
+                    cls.d_33.symbol * (ri_plus_half * (ro_33_conjg_next - ro_33_conjg) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            -I * omega_1 * ro_13_conjg
+                            + I * omega_1_conjg * ro_13
+                            - I * omega_2 * ro_23_conjg
+                            + I * omega_2_conjg * ro_23
+                            + (cls.gamma_31.symbol + cls.gamma_32.symbol) * ro_33_conjg
                     )
-            )
-            for i in range(1, self.N)
-        ])
+            ),
+            (
+                    cls.d_12.symbol * (ri_plus_half * (ro_12_conjg_next - ro_12_conjg) / h)
+                    - 1 / 4 * ri_plus_half * h * (
+                            (-I * (cls.delta_2.symbol - cls.delta_1.symbol)
+                             + (cls.g_perpendicular.symbol + cls.q.symbol ** 2 * cls.d_12.symbol))
+                            * ro_12_conjg
+                            + I * omega_2 * ro_13_conjg
+                            - I * omega_1_conjg * ro_23
+                    )
+            ),
+        ]
 
-        self.main_4_conjg = EquationSystemExpression([
+    @classmethod
+    def derive_main_equations(cls,
+                              previous: Sequence[Symbol],
+                              current: Sequence[Symbol],
+                              following: Sequence[Symbol],
+                              ri: Symbol,
+                              ri_plus_half: Symbol,
+                              ri_minus_half: Symbol,
+                              h: Symbol) -> Sequence[Expr]:
+        r"""
+        Derives the equations of the main system (0 < i < N) in the order of ordered_equations() for the given
+        variables of the points i - 1, i and i + 1 and the given symbols of r[i], r[i + 1/2], r[i - 1/2] and h.
+        """
+        ro_11_prev, ro_22_prev, ro_33_prev, ro_12_prev, \
+            ro_11_conjg_prev, ro_22_conjg_prev, ro_33_conjg_prev, ro_12_conjg_prev = previous
+        ro_11, ro_22, ro_33, ro_12, ro_11_conjg, ro_22_conjg, ro_33_conjg, ro_12_conjg = current
+        ro_11_next, ro_22_next, ro_33_next, ro_12_next, \
+            ro_11_conjg_next, ro_22_conjg_next, ro_33_conjg_next, ro_12_conjg_next = following
+        omega_1, omega_2, omega_1_conjg, omega_2_conjg, ro_13, ro_13_conjg, ro_23, ro_23_conjg = \
+            cls.derive_auxiliary_expressions(current, ri)
+        return [
+            (
+                    cls.d_11.symbol * (ri_plus_half * (ro_11_next - ro_11) / h)
+                    - cls.d_11.symbol * (ri_minus_half * (ro_11 - ro_11_prev) / h)
+                    - ri * h * (
+                            I * omega_1 * ro_13_conjg
+                            - I * omega_1_conjg * ro_13
+                            - cls.gamma_31.symbol * ro_33
+                            + cls.g_parallel.symbol * (ro_11 - ro_22)
+                    )
+            ),
+            (
+                    cls.d_22.symbol * (ri_plus_half * (ro_22_next - ro_22) / h)
+                    - cls.d_22.symbol * (ri_minus_half * (ro_22 - ro_22_prev) / h)
+                    - ri * h * (
+                            I * omega_2 * ro_23_conjg
+                            - I * omega_2_conjg * ro_23
+                            - cls.gamma_32.symbol * ro_33
+                            + cls.g_parallel.symbol * (ro_22 - ro_11)
+                    )
+            ),
+            (
+                    cls.d_33.symbol * (ri_plus_half * (ro_33_next - ro_33) / h)
+                    - cls.d_33.symbol * (ri_minus_half * (ro_33 - ro_33_prev) / h)
+                    - ri * h * (
+                            I * omega_1_conjg * ro_13
+                            - I * omega_1 * ro_13_conjg
+                            + I * omega_2_conjg * ro_23
+                            - I * omega_2 * ro_23_conjg
+                            + (cls.gamma_31.symbol + cls.gamma_32.symbol) * ro_33
+                    )
+            ),
+            (
+                    cls.d_12.symbol * (ri_plus_half * (ro_12_next - ro_12) / h)
+                    - cls.d_12.symbol * (ri_minus_half * (ro_12 - ro_12_prev) / h)
+                    - ri * h * (
+                            (I * (cls.delta_2.symbol - cls.delta_1.symbol)
+                             + (cls.g_perpendicular.symbol + cls.q.symbol ** 2 * cls.d_12.symbol))
+                            * ro_12
+                            - I * omega_2_conjg * ro_13
+                            + I * omega_1 * ro_23_conjg
+                    )
+            ),
             (
-                    self.d_12.symbol
-                    * (self.ri_plus_half[i] * (self.ro_12_conjg[i + 1] - self.ro_12_conjg[i]) / self.h.symbol)
-                    - self.d_12.symbol
-                    * (self.ri_minus_half[i] * (self.ro_12_conjg[i] - self.ro_12_conjg[i - 1]) / self.h.symbol)
-                    - self.ri[i] * self.h.symbol * (
-                            (-I * (self.delta_2.symbol - self.delta_1.symbol)
-                             + (self.g_perpendicular.symbol + self.q.symbol ** 2 * self.d_12.symbol))
-                            * self.ro_12_conjg[i]
-                            + I * self.omega_2[i] * self.ro_13_conjg[i]
-                            - I * self.omega_1_conjg[i] * self.ro_23[i]
+                    cls.d_11.symbol * (ri_plus_half * (ro_11_conjg_next - ro_11_conjg) / h)
+                    - cls.d_11.symbol * (ri_minus_half * (ro_11_conjg - ro_11_conjg_prev) / h)
+                    - ri * h * (
+                            -I * omega_1_conjg * ro_13
+                            + I * omega_1 * ro_13_conjg
+                            - cls.gamma_31.symbol * ro_33_conjg
+                            + cls.g_parallel.symbol * (ro_11_conjg - ro_22_conjg)
                     )
-            )
-            for i in range(1, self.N)
-        ])
+            ),
+            (
+                    cls.d_22.symbol * (ri_plus_half * (ro_22_conjg_next - ro_22_conjg) / h)
+                    - cls.d_22.symbol * (ri_minus_half * (ro_22_conjg - ro_22_conjg_prev) / h)
+                    - ri * h * (
+                            -I * omega_2_conjg * ro_23
+                            + I * omega_2 * ro_23_conjg
+                            - cls.gamma_32.symbol * ro_33_conjg
+                            + cls.g_parallel.symbol * (ro_22_conjg - ro_11_conjg)
+                    )
+            ),
+            (
+                    cls.d_33.symbol * (ri_plus_half * (ro_33_conjg_next - ro_33_conjg) / h)
+                    - cls.d_33.symbol * (ri_minus_half * (ro_33_conjg - ro_33_conjg_prev) / h)
+                    - ri * h * (
+                            -I * omega_1 * ro_13_conjg
+                            + I * omega_1_conjg * ro_13
+                            - I * omega_2 * ro_23_conjg
+                            + I * omega_2_conjg * ro_23
+                            + (cls.gamma_31.symbol + cls.gamma_32.symbol) * ro_33_conjg
+                    )
+            ),
+            (
+                    cls.d_12.symbol * (ri_plus_half * (ro_12_conjg_next - ro_12_conjg) / h)
+                    - cls.d_12.symbol * (ri_minus_half * (ro_12_conjg - ro_12_conjg_prev) / h)
+                    - ri * h * (
+                            (-I * (cls.delta_2.symbol - cls.delta_1.symbol)
+                             + (cls.g_perpendicular.symbol + cls.q.symbol ** 2 * cls.d_12.symbol))
+                            * ro_12_conjg
+                            + I * omega_2 * ro_13_conjg
+                            - I * omega_1_conjg * ro_23
+                    )
+            ),
+        ]
+
+    @classmethod
+    def derive_right_equations(cls, current: Sequence[Symbol]) -> Sequence[Expr]:
+        r"""
+        Derives the equations of the right boundary (i = N) in the order of ordered_equations()
+        for the given variables of the point i.
+        """
+        ro_11, ro_22, ro_33, ro_12, ro_11_conjg, ro_22_conjg, ro_33_conjg, ro_12_conjg = current
+        return [
+            ro_11 - 0.5,
+            ro_22 - 0.5,
+            ro_33,
+            ro_12,
+            ro_11_conjg - 0.5,
+            ro_22_conjg - 0.5,
+            ro_33_conjg,
+            ro_12_conjg,
+        ]
 
-        self.right_1 = EquationSystemExpression([self.ro_11[self.N] - 0.5])
-        self.right_2 = EquationSystemExpression([self.ro_22[self.N] - 0.5])
-        self.right_3 = EquationSystemExpression([self.ro_33[self.N]])
-        self.right_4 = EquationSystemExpression([self.ro_12[self.N]])
+    def point_equations(self, i: int) -> Sequence[Expr]:
+        r"""
+        Returns the 8 equations of the point i in the order of ordered_equations(). In the streaming mode
+        the equations are built on each call, otherwise already built equations are returned.
+        """
+        assert i in range(0, self.N + 1)
+        if self.streaming:
+            return self.instantiate_equations(i)
+
+        if i == 0:
+            return [self.left_1[0], self.left_2[0], self.left_3[0], self.left_4[0],
+                    self.left_1_conjg[0], self.left_2_conjg[0], self.left_3_conjg[0], self.left_4_conjg[0]]
+        if i == self.N:
+            return [self.right_1[0], self.right_2[0], self.right_3[0], self.right_4[0],
+                    self.right_1_conjg[0], self.right_2_conjg[0], self.right_3_conjg[0], self.right_4_conjg[0]]
+        return [self.main_1[i - 1], self.main_2[i - 1], self.main_3[i - 1], self.main_4[i - 1],
+                self.main_1_conjg[i - 1], self.main_2_conjg[i - 1], self.main_3_conjg[i - 1],
+                self.main_4_conjg[i - 1]]
+
+    def instantiate_auxiliary_expressions(self, i: int) -> Sequence[Expr]:
+        r"""
+        Builds omega_1, omega_2, omega_1*, omega_2*, ro_13, ro_13*, ro_23, ro_23* in the point i
+        from the stencil templates (see stencil_templates).
+        """
+        templates = EquationSystem.stencil_templates()
+        replacement = {
+            **dict(zip(templates.current, self.point_variables(i))),
+            templates.ri: self.ri[i],
+        }
+        return [replace_unevaluated(expr, replacement) for expr in templates.auxiliary]
+
+    def instantiate_equations(self, i: int) -> Sequence[Expr]:
+        r"""
+        Builds the 8 equations of the point i by replacing the generic symbols in the stencil templates
+        (see stencil_templates) with the symbols of the point i.
+        """
+        assert i in range(0, self.N + 1)
+        templates = EquationSystem.stencil_templates()
+
+        replacement = {
+            **dict(zip(templates.current, self.point_variables(i))),
+            templates.ri: self.ri[i],
+        }
+        if i < self.N:
+            replacement.update(zip(templates.next, self.point_variables(i + 1)))
+            replacement[templates.ri_plus_half] = self.ri_plus_half[i]
+        if i > 0:
+            replacement.update(zip(templates.previous, self.point_variables(i - 1)))
+            replacement[templates.ri_minus_half] = self.ri_minus_half[i]
+
+        template = templates.left if i == 0 else templates.right if i == self.N else templates.main
+        return [replace_unevaluated(eq, replacement) for eq in template]
+
+    def stream_equations(self) -> Iterator[Sequence[Expr]]:
+        r"""
+        Yields the equations of the system point by point in the order of ordered_equations().
+        In the streaming mode only the equations of the current point are kept in memory.
+        """
+        for i in range(0, self.N + 1):
+            yield self.point_equations(i)
 
-        self.right_1_conjg = EquationSystemExpression([self.ro_11_conjg[self.N] - 0.5])
-        self.right_2_conjg = EquationSystemExpression([self.ro_22_conjg[self.N] - 0.5])
-        self.right_3_conjg = EquationSystemExpression([self.ro_33_conjg[self.N]])
-        self.right_4_conjg = EquationSystemExpression([self.ro_12_conjg[self.N]])
+    def point_variables(self, i: int) -> Sequence[Symbol]:
+        r"""
+        Returns the 8 variables of the point i in the order of ordered_variables().
+        """
+        return [self.ro_11[i], self.ro_22[i], self.ro_33[i], self.ro_12[i],
+                self.ro_11_conjg[i], self.ro_22_conjg[i], self.ro_33_conjg[i], self.ro_12_conjg[i]]
 
-    @lru_cache(maxsize=None)
+    @cached("equation.ordered_variables")
     def ordered_variables(self) -> Sequence[Symbol]:
         variables = []
         for i in range(0, self.N + 1):
@@ -567,40 +635,11 @@ class EquationSystem:
             variables.append(self.ro_12_conjg[i])
         return variables
 
-    @lru_cache(maxsize=None)
+    @cached("equation.ordered_equations")
     def ordered_equations(self) -> Sequence[Expr]:
-        temp_eqs = [
-            self.left_1[0],
-            self.left_2[0],
-            self.left_3[0],
-            self.left_4[0],
-            self.left_1_conjg[0],
-            self.left_2_conjg[0],
-            self.left_3_conjg[0],
-            self.left_4_conjg[0]
-        ]
+        return [eq for point_eqs in self.stream_equations() for eq in point_eqs]
 
-        for i in range(0, self.N - 1):
-            temp_eqs.append(self.main_1[i])
-            temp_eqs.append(self.main_2[i])
-            temp_eqs.append(self.main_3[i])
-            temp_eqs.append(self.main_4[i])
-            temp_eqs.append(self.main_1_conjg[i])
-            temp_eqs.append(self.main_2_conjg[i])
-            temp_eqs.append(self.main_3_conjg[i])
-            temp_eqs.append(self.main_4_conjg[i])
-
-        temp_eqs.append(self.right_1[0])
-        temp_eqs.append(self.right_2[0])
-        temp_eqs.append(self.right_3[0])
-        temp_eqs.append(self.right_4[0])
-        temp_eqs.append(self.right_1_conjg[0])
-        temp_eqs.append(self.right_2_conjg[0])
-        temp_eqs.append(self.right_3_conjg[0])
-        temp_eqs.append(self.right_4_conjg[0])
-        return temp_eqs
-
-    @lru_cache(maxsize=None)
+    @cached("equation.coefficients")
     def coefficients(self) -> Dict[Symbol, complex]:
         return {
             # Rabi frequencies
@@ -637,10 +676,38 @@ class EquationSystem:
             **self.ri_minus_half.values()
         }
 
-    @lru_cache(maxsize=None)
+    @staticmethod
+    def constant_coefficients() -> Sequence[EquationSystemCoefficient]:
+        r"""
+        Returns the coefficients of the system, which do not depend on the mesh,
+        i.e. everything except h and r[i]. These values are defined on the class level,
+        thus they are available without building the equation system itself.
+        """
+        return (
+            EquationSystem.C1, EquationSystem.C2,
+            EquationSystem.d_11, EquationSystem.d_22, EquationSystem.d_33, EquationSystem.d_12,
+            EquationSystem.gamma, EquationSystem.gamma_31, EquationSystem.gamma_32,
+            EquationSystem.delta_1, EquationSystem.delta_2,
+            EquationSystem.g_parallel, EquationSystem.g_perpendicular,
+            EquationSystem.a, EquationSystem.q,
+        )
+
+    @cached("equation.calculate_r")
     def calculate_r(self) -> Sequence[float]:
         return [v.real for v in self.ri.values().values()]
 
+    def invalidate_cache(self) -> int:
+        r"""
+        Removes all cached values, which were calculated for this equation system (including the system itself,
+        if it was acquired using acquire_equation_system), from the cache registry.
+        Returns the number of the removed entries.
+        """
+        def is_related(key, value) -> bool:
+            return self in key[0] or (isinstance(value, EquationSystem) and value == self)
+
+        return sum(REGISTRY.invalidate(namespace, is_related) for namespace in REGISTRY.namespaces()
+                   if namespace.startswith("equation."))
+
     def __hash__(self) -> int:
         # Each equation system is uniquely identified by N and R
         return hash(self.N) * 256 + hash(self.R) * 128
@@ -651,6 +718,34 @@ class EquationSystem:
                and self.R == other.R
 
     @staticmethod
-    @lru_cache(maxsize=None)
-    def acquire_equation_system(intervals_number: int = 4, radius: float = DEFAULT_RADIUS):
-        return EquationSystem(intervals_number=intervals_number, radius=radius)
+    @cached("equation.stencil_templates")
+    def stencil_templates() -> "StencilTemplates":
+        r"""
+        Derives the left, main and right equations once at the generic index i, i.e. for the generic symbols
+        r11[i - 1], r11[i], r11[i + 1], ..., r[i], r[i + 1/2], r[i - 1/2] (see derive_main_equations).
+        All equations of the system are instantiated from these templates (see instantiate_equations).
+        """
+        previous, current, following = [
+            [Symbol(f"{func}[{suffix}]") for func in ("r11", "r22", "r33", "r12", "r11c", "r22c", "r33c", "r12c")]
+            for suffix in ("i-1", "i", "i+1")
+        ]
+        ri, ri_plus_half, ri_minus_half, h = Symbol("r[i]"), Symbol("r[i+1/2]"), Symbol("r[i-1/2]"), Symbol("h")
+
+        return StencilTemplates(
+            left=EquationSystem.derive_left_equations(current, following, ri, ri_plus_half, h),
+            main=EquationSystem.derive_main_equations(previous, current, following, ri, ri_plus_half,
+                                                      ri_minus_half, h),
+            right=EquationSystem.derive_right_equations(current),
+            auxiliary=EquationSystem.derive_auxiliary_expressions(current, ri),
+            previous=previous,
+            current=current,
+            next=following,
+            ri=ri,
+            ri_plus_half=ri_plus_half,
+            ri_minus_half=ri_minus_half,
+        )
+
+    @staticmethod
+    @cached("equation.acquire_equation_system")
+    def acquire_equation_system(intervals_number: int = 4, radius: float = DEFAULT_RADIUS, streaming: bool = False):
+        return EquationSystem(intervals_number=intervals_number, radius=radius, streaming=streaming)
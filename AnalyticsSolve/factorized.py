@@ -0,0 +1,88 @@
+r"""
+This module contains the factorized representation of the system, which is built once and then reused
+to solve the system with different right sides (e.g. manufactured solutions, source terms),
+including the transposed and the conjugate-transposed systems.
+
+@author: shvatov
+"""
+from enum import Enum
+from typing import Dict, Optional, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import splu
+
+from assembly import BlockTridiagonalSystem, assemble_blocks, symbol_coefficients
+from block_tridiagonal import factorize_block_tridiagonal
+from equation import EquationSystem
+from snapshot import SymbolicSnapshot
+
+
+class FactorizationKind(Enum):
+    """
+    Type of the factorization. BLOCK_LU uses the block LU decomposition of the block-tridiagonal matrix
+    (see block_tridiagonal), SPARSE_LU uses the sparse LU decomposition scipy.sparse.linalg.splu.
+    """
+    BLOCK_LU = 1
+    SPARSE_LU = 2
+
+
+class FactorizedSystem:
+    r"""
+    System Ax = b with the factorized matrix A.
+    """
+
+    def __init__(self, system: BlockTridiagonalSystem, kind: FactorizationKind = FactorizationKind.BLOCK_LU):
+        self.system = system
+        self.kind = kind
+        self.__matrix: Optional[csr_matrix] = None
+        if kind == FactorizationKind.BLOCK_LU:
+            self.__factorization = factorize_block_tridiagonal(system)
+        else:
+            self.__factorization = splu(self.matrix().tocsc())
+
+    @staticmethod
+    def from_equation_system(eq_system: Union[EquationSystem, SymbolicSnapshot],
+                             coefficients: Optional[Dict[str, complex]] = None,
+                             kind: FactorizationKind = FactorizationKind.BLOCK_LU) -> "FactorizedSystem":
+        r"""
+        Factorizes the system, which has the same matrix as linear_eq_to_matrix applied to the equations
+        of the given equation system (or of its snapshot). The symbolic equations are not used: the matrix
+        is assembled numerically (see assembly.assemble_blocks) from N, R and the coefficients of the system,
+        thus the equation system can be created in the streaming mode, and the correspondence of the assembled
+        matrix to the symbolic equations has to be verified separately (see tests.check_symbolic_matrix).
+        coefficients - values of the coefficients, which override the ones of the equation system.
+        """
+        values = symbol_coefficients(eq_system.coefficients())
+        values.update(coefficients or dict())
+        return FactorizedSystem(assemble_blocks(intervals_number=eq_system.N, radius=eq_system.R,
+                                                coefficients=values), kind)
+
+    @property
+    def dimension(self) -> int:
+        return self.system.dimension
+
+    def matrix(self) -> csr_matrix:
+        if self.__matrix is None:
+            self.__matrix = self.system.to_csr()
+        return self.__matrix
+
+    def rhs(self) -> np.ndarray:
+        return self.system.rhs_vector()
+
+    def solve(self, rhs: Optional[np.ndarray] = None, trans: str = "N") -> np.ndarray:
+        r"""
+        Solves the system using the factorization.
+        Parameters
+        ----------
+        rhs - right side vector of the size 8 * (N + 1), or the matrix (8 * (N + 1), k) of k right sides.
+        If it is not provided, then the right side of the system is used.
+        trans - "N" to solve Ax = rhs, "T" to solve A^T x = rhs, "H" to solve A^H x = rhs.
+
+        Returns
+        -------
+        Solution with the same shape as rhs.
+        """
+        rhs = self.rhs() if rhs is None else np.asarray(rhs, dtype=np.cdouble)
+        assert rhs.shape[0] == self.dimension, f"Right side must have {self.dimension} rows"
+        return self.__factorization.solve(rhs, trans=trans)
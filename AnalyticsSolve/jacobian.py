@@ -0,0 +1,83 @@
+r"""
+This module contains the calculation of the sparse Jacobian of the system using finite differences
+of the discrepancy function with graph-colored perturbations.
+
+Equations in the point i depend only on the variables in the points i - 1, i and i + 1, thus two columns
+can be perturbed simultaneously, if their points differ by 3 or more. Variable k in the point i gets
+the color 8 * (i mod 3) + k, so the whole Jacobian is recovered using only 24 perturbed evaluations
+of the discrepancy function instead of 8 * (N + 1).
+
+@author: shvatov
+"""
+from typing import Callable, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, coo_matrix
+
+from assembly import SYSTEM_VAR_NUM
+
+# Number of the points, which are coupled by the stencil of the scheme
+STENCIL_WIDTH = 3
+
+# Number of the colors (perturbed evaluations) required to recover the Jacobian
+COLORS_NUMBER = STENCIL_WIDTH * SYSTEM_VAR_NUM
+
+
+def prepare_column_colors(intervals_number: int) -> np.ndarray:
+    r"""
+    Returns the colors of the columns of the Jacobian, ordered as EquationSystem.ordered_variables().
+    """
+    points = np.arange(intervals_number + 1)
+    return ((points[:, None] % STENCIL_WIDTH) * SYSTEM_VAR_NUM + np.arange(SYSTEM_VAR_NUM)).reshape(-1)
+
+
+def prepare_stencil_pattern(intervals_number: int) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Returns the structural non-zero elements of the Jacobian as a tuple of arrays (rows, columns).
+    Each equation in the point i is coupled with all variables in the points i - 1, i, i + 1.
+    """
+    size = SYSTEM_VAR_NUM
+    rows = np.arange((intervals_number + 1) * size)
+    row_points = rows // size
+
+    rows = np.repeat(rows, STENCIL_WIDTH * size)
+    column_points = np.repeat(row_points, STENCIL_WIDTH * size) \
+                    + np.tile(np.repeat(np.arange(-1, STENCIL_WIDTH - 1), size), row_points.shape[0])
+    columns = column_points * size + np.tile(np.arange(size), STENCIL_WIDTH * row_points.shape[0])
+
+    inside = (column_points >= 0) & (column_points <= intervals_number)
+    return rows[inside], columns[inside]
+
+
+def calculate_colored_jacobian(residual: Callable[[np.ndarray], np.ndarray],
+                               approximation: np.ndarray,
+                               delta: complex) -> csr_matrix:
+    r"""
+    Calculates the Jacobian of the residual function using forward differences with colored perturbations.
+    Parameters
+    ----------
+    residual - function, which accepts the vector of the variables (ordered as EquationSystem.ordered_variables())
+    and returns the discrepancy vector (ordered as EquationSystem.ordered_equations()).
+    approximation - vector of the variables, in which the Jacobian is calculated.
+    delta - value, which is added to the perturbed variables.
+
+    Returns
+    -------
+    Sparse Jacobian matrix.
+    """
+    dimension = approximation.shape[0]
+    intervals_number = dimension // SYSTEM_VAR_NUM - 1
+    colors = prepare_column_colors(intervals_number)
+    rows, columns = prepare_stencil_pattern(intervals_number)
+
+    base = residual(approximation)
+    differences = np.empty((COLORS_NUMBER, dimension), dtype=np.cdouble)
+    for color in range(COLORS_NUMBER):
+        perturbed = approximation.astype(np.cdouble)
+        perturbed[colors == color] += delta
+        differences[color] = (residual(perturbed) - base) / delta
+
+    values = differences[colors[columns], rows]
+    non_zero = values != 0
+    return coo_matrix((values[non_zero], (rows[non_zero], columns[non_zero])),
+                      shape=(dimension, dimension)).tocsr()
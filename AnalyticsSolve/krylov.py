@@ -0,0 +1,216 @@
+r"""
+This module contains the iterative solution of the system using the preconditioned Krylov methods
+(restarted GMRES or BiCGSTAB). The operator of the system is either the assembled sparse matrix, or the matrix-free
+operator, which calculates Ax = discrepancy(x) + b using the vectorized discrepancy kernel (see discrepancy).
+
+Available preconditioners are the block-Jacobi one, which inverts the 8x8 diagonal blocks of the points of the mesh,
+the incomplete LU decomposition and a single multigrid cycle (see multigrid). All of them require the assembled blocks
+of the system, ILU requires the assembled sparse matrix as well, thus it is not available in the matrix-free mode,
+where the block-Jacobi preconditioner is used by default. Note, that the sum Ro11 + Ro22 + Ro33 is governed
+by the pure diffusion, thus the block-Jacobi preconditioner does not reduce the number of the iterations on the fine
+meshes, ILU or MULTIGRID should be preferred (MULTIGRID builds the coarse operators from the assembled matrix, thus
+the matrix-free mode with it saves only the products on the finest level).
+
+The solution is accepted, when max|b - Ax| does not exceed the tolerance (10^(-10) by default, the same criterion
+as the one checked by solve). The stopping criterion of the Krylov methods is the 2-norm of the residual relative
+to the right side, thus the solution is improved by the iterative refinement: the equation A d = b - Ax is solved
+by the same Krylov method and x = x + d, until the tolerance is reached, or the refinement stagnates.
+
+@author: shvatov
+"""
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator, gmres, bicgstab, spilu
+
+from assembly import SYSTEM_VAR_NUM, BlockTridiagonalSystem, assemble_blocks, vector_to_mesh
+from discrepancy import discrepancy
+from equation import DEFAULT_RADIUS
+from multigrid import MultigridSolver
+
+
+class KrylovMethod(Enum):
+    """
+    Krylov method, which is used to solve the system.
+    """
+    GMRES = 1
+    BICGSTAB = 2
+
+
+class PreconditionerKind(Enum):
+    """
+    Preconditioner of the Krylov method. BLOCK_JACOBI inverts the 8x8 diagonal blocks of the system,
+    ILU uses the incomplete LU decomposition scipy.sparse.linalg.spilu, MULTIGRID applies a single V cycle.
+    """
+    NONE = 1
+    BLOCK_JACOBI = 2
+    ILU = 3
+    MULTIGRID = 4
+
+
+@dataclass
+class KrylovParams:
+    """
+    Parameters of the Krylov solver.
+
+    tolerance - the solution is converged, when max(abs(b - Ax)) is not greater than this value.
+    rtol, atol - the iterations stop, when norm(b - Ax) <= max(rtol * norm(b), atol), where b is the right side
+    of the system in the first refinement step and the residual of the refined equation in the next ones (see module
+    documentation). Note, that norm(b) is small compared to norm(A) norm(x), even the direct solution has
+    the relative residual about 1e-9 for N = 10^4.
+    restart - number of the iterations between the restarts of GMRES.
+    maxiter - maximal number of the iterations (of the restart cycles for GMRES) per refinement step.
+    max_refinement_steps - maximal number of the refinement steps, the refinement also stops, when max(abs(b - Ax))
+    is not reduced at least twice by a step.
+    preconditioner - by default ILU for the assembled operator and BLOCK_JACOBI for the matrix-free one.
+    ilu_drop_tolerance, ilu_fill_factor - parameters of spilu.
+    """
+    method: KrylovMethod = KrylovMethod.GMRES
+    preconditioner: Optional[PreconditionerKind] = None
+    matrix_free: bool = False
+    tolerance: float = 1e-10
+    rtol: float = 1e-8
+    atol: float = 0.0
+    restart: int = 50
+    maxiter: Optional[int] = None
+    max_refinement_steps: int = 10
+    ilu_drop_tolerance: float = 1e-8
+    ilu_fill_factor: float = 20.0
+
+
+@dataclass
+class KrylovReport:
+    """
+    Statistics of the iterative solution.
+
+    iterations - number of the performed iterations in all refinement steps.
+    residual_history - relative residual norms of the refined equation after each iteration (for GMRES these are
+    the norms of the preconditioned residual reported by scipy).
+    refinement_steps - number of the solutions of the refined equation (1, if no refinement was required).
+    converged - whether max(abs(b - Ax)) reached KrylovParams.tolerance.
+    residual_norm - max(abs(b - Ax)) of the final solution.
+    """
+    method: KrylovMethod
+    preconditioner: PreconditionerKind
+    matrix_free: bool
+    iterations: int = 0
+    residual_history: List[float] = field(default_factory=list)
+    refinement_steps: int = 0
+    converged: bool = False
+    residual_norm: float = 0.0
+
+
+def prepare_matrix_free_operator(intervals_number: int,
+                                 radius: float = DEFAULT_RADIUS,
+                                 coefficients: Optional[Dict[str, complex]] = None) -> Tuple[LinearOperator,
+                                                                                             np.ndarray]:
+    r"""
+    Returns the operator x -> Ax, which is calculated using the discrepancy kernel, and the right side vector b.
+    """
+    dimension = (intervals_number + 1) * SYSTEM_VAR_NUM
+    zero = np.zeros((SYSTEM_VAR_NUM, intervals_number + 1), dtype=np.cdouble)
+    rhs = -discrepancy(zero, radius, coefficients)
+
+    def matvec(x: np.ndarray) -> np.ndarray:
+        return discrepancy(vector_to_mesh(np.asarray(x, dtype=np.cdouble).reshape(-1)), radius, coefficients) + rhs
+
+    return LinearOperator((dimension, dimension), matvec=matvec, dtype=np.cdouble), rhs
+
+
+def prepare_block_jacobi_preconditioner(system: BlockTridiagonalSystem) -> LinearOperator:
+    inverse = np.linalg.inv(system.diagonal)
+
+    def matvec(x: np.ndarray) -> np.ndarray:
+        return np.einsum("ijk,ik->ij", inverse, np.reshape(x, (-1, SYSTEM_VAR_NUM))).reshape(-1)
+
+    return LinearOperator((system.dimension, system.dimension), matvec=matvec, dtype=np.cdouble)
+
+
+def prepare_ilu_preconditioner(A: csr_matrix, drop_tolerance: float, fill_factor: float) -> LinearOperator:
+    ilu = spilu(A.tocsc(), drop_tol=drop_tolerance, fill_factor=fill_factor)
+    return LinearOperator(A.shape, matvec=ilu.solve, dtype=np.cdouble)
+
+
+def solve_krylov(intervals_number: int,
+                 radius: float = DEFAULT_RADIUS,
+                 coefficients: Optional[Dict[str, complex]] = None,
+                 params: Optional[KrylovParams] = None,
+                 system: Optional[BlockTridiagonalSystem] = None,
+                 initial: Optional[np.ndarray] = None) -> Tuple[np.ndarray, KrylovReport]:
+    r"""
+    Solves the system Ax = b using the preconditioned Krylov method.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    params - parameters of the solver, see KrylovParams.
+    system - assembled blocks of the system, if they are already available.
+    initial - initial approximation of the solution (e.g. the solution for the close values of the coefficients),
+    by default zero.
+
+    Returns
+    -------
+    Tuple of the vector of complex solutions and the statistics of the solution, see KrylovReport. The solution
+    is returned even if it is not converged, see KrylovReport.converged.
+    """
+    params = params if params is not None else KrylovParams()
+    preconditioner_kind = params.preconditioner if params.preconditioner is not None \
+        else PreconditionerKind.BLOCK_JACOBI if params.matrix_free else PreconditionerKind.ILU
+    assert not params.matrix_free or preconditioner_kind != PreconditionerKind.ILU, \
+        "ILU preconditioner requires the assembled matrix, it is not available in the matrix-free mode"
+    if system is None and (not params.matrix_free or preconditioner_kind != PreconditionerKind.NONE):
+        system = assemble_blocks(intervals_number, radius, coefficients)
+
+    A = None
+    if params.matrix_free:
+        operator, rhs = prepare_matrix_free_operator(intervals_number, radius, coefficients)
+    else:
+        A, rhs = system.to_csr(), system.rhs_vector()
+        operator = A
+
+    preconditioner = None
+    if preconditioner_kind == PreconditionerKind.BLOCK_JACOBI:
+        preconditioner = prepare_block_jacobi_preconditioner(system)
+    elif preconditioner_kind == PreconditionerKind.ILU:
+        preconditioner = prepare_ilu_preconditioner(A, params.ilu_drop_tolerance, params.ilu_fill_factor)
+    elif preconditioner_kind == PreconditionerKind.MULTIGRID:
+        preconditioner = MultigridSolver(system).as_preconditioner()
+
+    report = KrylovReport(method=params.method, preconditioner=preconditioner_kind, matrix_free=params.matrix_free)
+
+    def solve_correction(residual: np.ndarray, threshold: float) -> np.ndarray:
+        if params.method == KrylovMethod.GMRES:
+            return gmres(operator, residual, rtol=0.0, atol=threshold, restart=params.restart, maxiter=params.maxiter,
+                         M=preconditioner, callback_type="pr_norm",
+                         callback=lambda norm: report.residual_history.append(float(norm)))[0]
+        residual_norm = np.linalg.norm(residual)
+        return bicgstab(operator, residual, rtol=0.0, atol=threshold, maxiter=params.maxiter, M=preconditioner,
+                        callback=lambda x: report.residual_history.append(
+                            float(np.linalg.norm(residual - operator @ x) / residual_norm)))[0]
+
+    solution = np.array(initial, dtype=np.cdouble) if initial is not None else np.zeros(rhs.shape, dtype=np.cdouble)
+    residual = rhs - operator @ solution
+    report.residual_norm = float(np.abs(residual).max())
+    # the first step stops relative to norm(b), so that the initial approximation reduces the number of iterations
+    reference_norm = np.linalg.norm(rhs)
+    while report.residual_norm > params.tolerance and report.refinement_steps < params.max_refinement_steps:
+        refined = solution + solve_correction(residual, max(params.rtol * reference_norm, params.atol))
+        refined_residual = rhs - operator @ refined
+        refined_norm = float(np.abs(refined_residual).max())
+        report.refinement_steps += 1
+        if refined_norm >= report.residual_norm:
+            break
+
+        stagnated = refined_norm > report.residual_norm / 2
+        solution, residual, report.residual_norm = refined, refined_residual, refined_norm
+        reference_norm = np.linalg.norm(residual)
+        if stagnated:
+            break
+
+    report.iterations = len(report.residual_history)
+    report.converged = report.residual_norm <= params.tolerance
+    return solution, report
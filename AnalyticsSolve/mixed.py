@@ -0,0 +1,255 @@
+r"""
+This module contains the mixed-precision solver of the system: the matrix is factorized in the single precision
+(complex64) using the banded LU decomposition of LAPACK (cgbtrf / cgbtrs, see banded), which halves the memory
+of the LU factors, and the solution is improved by the iterative refinement
+
+    r = b - Ax, A d = r, x = x + d,
+
+where the residual is calculated in the double (complex128) or in the extended (np.clongdouble) precision,
+until max|b - Ax| reaches the tolerance, or the refinement stagnates. In the latter case the solution is accepted,
+if its normwise backward error (see assembly.backward_error) reaches the target: like in multigrid, the residual
+of the fine meshes cannot reach the tolerance, because norm(A) grows as N.
+
+The entries of the matrix differ by many orders of magnitude (diffusion terms scaled by r / h, relaxation terms
+scaled by h * r, the identity in the Dirichlet point), thus the rows and the columns of the matrix are scaled
+by their maximal elements before the factorization. Even then the condition number exceeds the inverse of the
+single-precision epsilon on the fine meshes (N >= 10^4), and the classic refinement d = LU^(-1) r converges slowly
+or stagnates. GMRES refinement solves the equation for d using GMRES preconditioned by the single-precision LU
+decomposition, which converges as long as the preconditioned matrix is well-conditioned (GMRES-IR).
+
+LAPACK cgbtrf factorizes the band about 1.5 times faster than zgbtrf (N = 10^5: 0.34 s against 0.53 s), but the time
+of the whole solution is dominated by the scaling, the conversion into the band storage and the refinement, which
+requires many solutions with the single-precision factors on the fine meshes. N = 10^4: 0.1 s of the factorization
+and 0.3 s of GMRES refinement against 0.08 s of the double-precision banded solution, N = 10^5: 0.9 s and 23 s
+(about 90 GMRES iterations) against 0.9 s. Thus on this system the solver saves the memory of the factors,
+but not the time. The times are reported (see MixedPrecisionReport), optionally together with the time
+of the double-precision banded factorization and solution (zgbtrf / zgbtrs). If the refinement does not converge,
+RefinementError is raised instead of returning the solution.
+
+@author: shvatov
+"""
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.linalg import lapack
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.linalg import LinearOperator, gmres
+
+from assembly import BlockTridiagonalSystem
+from banded import factorize_banded_system, to_band_storage
+
+
+class RefinementMethod(Enum):
+    """
+    Method, which is used to solve the equation A d = r for the correction of the solution.
+    CLASSIC applies the single-precision LU decomposition, GMRES uses GMRES preconditioned by it.
+    """
+    CLASSIC = 1
+    GMRES = 2
+
+
+class ResidualPrecision(Enum):
+    """
+    Precision of the residual and the accumulated solution: DOUBLE (complex128) or EXTENDED (np.clongdouble,
+    80-bit on x86 platforms, the same as DOUBLE on the platforms without the extended precision).
+    """
+    DOUBLE = 1
+    EXTENDED = 2
+
+
+@dataclass
+class MixedPrecisionParams:
+    """
+    Parameters of the mixed-precision solver.
+
+    tolerance - the refinement stops, when max(abs(b - Ax)) is not greater than this value.
+    target_backward_error - the refinement also stops, when the backward error is not reduced at least twice
+    by a step, and the solution is considered converged, if the backward error is not greater than this value.
+    max_steps - maximal number of the refinement steps.
+    inner_rtol, inner_restart - relative tolerance and restart of GMRES refinement (a single restart cycle
+    is performed per step).
+    compare_double - whether to measure the time of the double-precision factorization and solution as well.
+    """
+    refinement: RefinementMethod = RefinementMethod.GMRES
+    residual_precision: ResidualPrecision = ResidualPrecision.DOUBLE
+    tolerance: float = 1e-10
+    target_backward_error: float = 1e-15
+    max_steps: int = 20
+    inner_rtol: float = 1e-4
+    inner_restart: int = 30
+    compare_double: bool = False
+
+
+@dataclass
+class MixedPrecisionReport:
+    """
+    Statistics of the mixed-precision solution.
+
+    factorization_size - size of the single-precision band storage of the LU factors in bytes (twice smaller
+    than in double precision).
+    backward_errors - backward error of the solution after each refinement step.
+    inner_iterations - number of the GMRES iterations (1 for CLASSIC) in each refinement step.
+    residual_norm - max(abs(b - Ax)) of the final solution.
+    factorization_time, refinement_time - time in seconds spent on the single-precision factorization
+    and on the refinement.
+    double_time - time in seconds of the double-precision factorization and solution (if it was compared).
+    """
+    refinement: RefinementMethod
+    residual_precision: ResidualPrecision
+    factorization_size: int = 0
+    steps: int = 0
+    backward_errors: List[float] = field(default_factory=list)
+    inner_iterations: List[int] = field(default_factory=list)
+    converged: bool = False
+    residual_norm: float = 0.0
+    factorization_time: float = 0.0
+    refinement_time: float = 0.0
+    double_time: Optional[float] = None
+
+    @property
+    def total_time(self) -> float:
+        return self.factorization_time + self.refinement_time
+
+
+class RefinementError(np.linalg.LinAlgError):
+    r"""
+    Raised, when the refinement does not converge, the statistics of the solution are available as report.
+    """
+
+    def __init__(self, report: MixedPrecisionReport):
+        super().__init__(f"{report.refinement.name} refinement did not converge in {report.steps} steps, "
+                         f"max(abs(b - Ax)) = {report.residual_norm}, "
+                         f"backward error {report.backward_errors[-1] if report.backward_errors else None}")
+        self.report = report
+
+
+class SinglePrecisionFactorization:
+    r"""
+    Banded LU decomposition of the scaled matrix diag(row_scale) A diag(column_scale) in the single precision.
+    """
+
+    def __init__(self, A: csr_matrix):
+        coo = A.tocoo()
+        magnitudes = np.abs(coo.data)
+        row_max = np.zeros(A.shape[0])
+        np.maximum.at(row_max, coo.row, magnitudes)
+        self.row_scale = 1 / row_max
+        column_max = np.zeros(A.shape[1])
+        np.maximum.at(column_max, coo.col, magnitudes * self.row_scale[coo.row])
+        self.column_scale = 1 / column_max
+        scaled = coo_matrix((coo.data * self.row_scale[coo.row] * self.column_scale[coo.col], (coo.row, coo.col)),
+                            shape=A.shape)
+        band, self.lower_bandwidth, self.upper_bandwidth = to_band_storage(scaled, dtype=np.complex64)
+        self.factors, self.pivots, info = lapack.cgbtrf(band, self.lower_bandwidth, self.upper_bandwidth,
+                                                        overwrite_ab=True)
+        if info > 0:
+            raise np.linalg.LinAlgError(f"Matrix is singular in single precision, zero pivot in the row {info}")
+
+    @property
+    def size(self) -> int:
+        return self.factors.nbytes
+
+    def solve(self, rhs: np.ndarray) -> np.ndarray:
+        r"""
+        Solves the system Ad = rhs, the right side is normalized, so that it does not underflow in single precision.
+        Returns the solution in the double precision.
+        """
+        scaled = self.row_scale * rhs
+        norm = np.abs(scaled).max()
+        if norm == 0:
+            return np.zeros(rhs.shape, dtype=np.cdouble)
+        solution, info = lapack.cgbtrs(self.factors, self.lower_bandwidth, self.upper_bandwidth,
+                                       (scaled / norm).astype(np.complex64), self.pivots)
+        assert info == 0, f"Illegal argument {-info} of cgbtrs"
+        return self.column_scale * solution.astype(np.cdouble) * norm
+
+
+class ExtendedResidual:
+    r"""
+    Calculates the residual b - Ax in the extended precision using the blocks of the system.
+    """
+
+    def __init__(self, system: BlockTridiagonalSystem):
+        self.diagonal = system.diagonal.astype(np.clongdouble)
+        self.lower = system.lower.astype(np.clongdouble)
+        self.upper = system.upper.astype(np.clongdouble)
+        self.rhs = system.rhs.astype(np.clongdouble)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        points = x.reshape(self.rhs.shape)
+        residual = self.rhs - np.matmul(self.diagonal, points[:, :, None])[:, :, 0]
+        residual[1:] -= self.lower * points[:-1]
+        residual[:-1] -= self.upper * points[1:]
+        return residual.reshape(-1)
+
+
+def solve_mixed_precision(system: BlockTridiagonalSystem,
+                          params: Optional[MixedPrecisionParams] = None) -> Tuple[np.ndarray, MixedPrecisionReport]:
+    r"""
+    Solves the system Ax = b using the single-precision factorization and the iterative refinement.
+    Parameters
+    ----------
+    system - blocks of the matrix A and the right side vector b, see assembly.assemble_blocks.
+    params - parameters of the solver, see MixedPrecisionParams.
+
+    Returns
+    -------
+    Tuple of the vector of complex solutions and the statistics of the solution, see MixedPrecisionReport.
+    RefinementError is raised, if the refinement does not converge.
+    """
+    params = params if params is not None else MixedPrecisionParams()
+    A, b = system.to_csr(), system.rhs_vector()
+    matrix_norm = float(abs(A).sum(axis=1).max())
+    start = time.perf_counter()
+    factorization = SinglePrecisionFactorization(A)
+    report = MixedPrecisionReport(refinement=params.refinement, residual_precision=params.residual_precision,
+                                  factorization_size=factorization.size,
+                                  factorization_time=time.perf_counter() - start)
+    start = time.perf_counter()
+
+    if params.residual_precision == ResidualPrecision.EXTENDED:
+        calculate_residual, x = ExtendedResidual(system), np.zeros(b.shape, dtype=np.clongdouble)
+    else:
+        calculate_residual, x = (lambda v: b - A @ v), np.zeros(b.shape, dtype=np.cdouble)
+    preconditioner = LinearOperator(A.shape, matvec=factorization.solve, dtype=np.cdouble)
+
+    residual = calculate_residual(x)
+    while report.steps < params.max_steps:
+        if params.refinement == RefinementMethod.CLASSIC:
+            correction, iterations = factorization.solve(residual.astype(np.cdouble)), 1
+        else:
+            history = list()
+            correction, _ = gmres(A, residual.astype(np.cdouble), rtol=params.inner_rtol, atol=0.0,
+                                  restart=params.inner_restart, maxiter=1, M=preconditioner,
+                                  callback=history.append, callback_type="pr_norm")
+            iterations = len(history)
+
+        x = x + correction
+        residual = calculate_residual(x)
+        report.steps += 1
+        report.inner_iterations.append(iterations)
+        residual_norm = float(np.abs(residual).max())
+        report.backward_errors.append(float(residual_norm / (matrix_norm * np.abs(x).max() + np.abs(b).max())))
+
+        report.converged = residual_norm <= params.tolerance
+        if report.converged:
+            break
+        if report.steps > 1 and report.backward_errors[-1] > report.backward_errors[-2] / 2:
+            report.converged = report.backward_errors[-1] <= params.target_backward_error
+            break
+
+    solution = x.astype(np.cdouble)
+    report.refinement_time = time.perf_counter() - start
+    report.residual_norm = float(np.abs(b - A @ solution).max())
+
+    if params.compare_double:
+        start = time.perf_counter()
+        factorize_banded_system(A)[0].solve(b)
+        report.double_time = time.perf_counter() - start
+
+    if not report.converged:
+        raise RefinementError(report)
+    return solution, report
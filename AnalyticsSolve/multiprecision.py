@@ -0,0 +1,112 @@
+r"""
+This module contains the arbitrary-precision solution of the system, which is used as the reference one.
+
+The matrix is built from the stencil templates (see EquationSystem.stencil_templates), which are lambdified
+with mpmath, so that the symbolic work does not depend on N. The values of h, r[i], r[i +- 1/2] and of the constant
+coefficients are the same double values as in the equation system, they are converted into mpmath numbers exactly,
+thus the evaluated matrix is the exact matrix of the discrete system up to the working precision.
+
+The system is solved by the Gaussian elimination with the partial pivoting, which is restricted to the band
+of the matrix: the rows are stored as the dictionaries of their non-zero elements, so that each elimination step
+touches only the rows and the columns of the band (8 + 8 below and at most 8 + 8 + 8 above the diagonal, including
+the fill-in produced by the row interchanges). The number of the operations is O(N), unlike sympy.solve, which
+does not take into account the structure of the system.
+
+@author: shvatov
+"""
+from typing import Dict, List, Optional, Tuple
+
+import mpmath
+
+from assembly import SYSTEM_VAR_NUM, MeshValues, prepare_coefficients
+from equation import EquationSystem, DEFAULT_RADIUS
+from streaming import prepare_template_blocks
+
+# Default number of the significant decimal digits of the arbitrary-precision solution
+DEFAULT_PRECISION = 50
+
+
+def assemble_multiprecision_system(intervals_number: int,
+                                   radius: float = DEFAULT_RADIUS,
+                                   coefficients: Optional[Dict[str, complex]] = None) \
+        -> Tuple[List[Dict[int, mpmath.mpc]], List[mpmath.mpc]]:
+    r"""
+    Evaluates the matrix A and the right side vector b in the current mpmath precision.
+    Returns the list of the rows of A (dictionaries column -> non-zero value) and the vector b.
+    """
+    blocks = prepare_template_blocks(modules="mpmath")
+    mesh = MeshValues.create(intervals_number, radius)
+    values = prepare_coefficients(coefficients)
+    coefficients = [mpmath.mpmathify(values[c.symbol.name]) for c in EquationSystem.constant_coefficients()]
+
+    rows, rhs = list(), list()
+    for i in range(0, intervals_number + 1):
+        kernel = blocks.left if i == 0 else blocks.right if i == intervals_number else blocks.main
+        A, b = kernel(mpmath.mpf(float(mesh.r[i])),
+                      mpmath.mpf(float(mesh.r_plus_half[i])) if i < intervals_number else mpmath.mpf(0),
+                      mpmath.mpf(float(mesh.r_minus_half[i - 1])) if i > 0 else mpmath.mpf(0),
+                      mpmath.mpf(mesh.h),
+                      *coefficients)
+        # right boundary equations depend only on the variables of the point itself
+        first_point = i if i == 0 or i == intervals_number else i - 1
+        for k in range(0, SYSTEM_VAR_NUM):
+            rows.append({first_point * SYSTEM_VAR_NUM + j: mpmath.mpc(A[k, j]) for j in range(0, A.cols)
+                         if A[k, j] != 0})
+            rhs.append(mpmath.mpc(b[k]))
+    return rows, rhs
+
+
+def solve_banded_multiprecision(rows: List[Dict[int, mpmath.mpc]], rhs: List[mpmath.mpc]) -> List[mpmath.mpc]:
+    r"""
+    Solves the system Ax = b using the banded Gaussian elimination with the partial pivoting
+    in the current mpmath precision. The rows of A and the vector b are modified.
+    """
+    dimension = len(rows)
+    lower_bandwidth = max(i - min(row) for i, row in enumerate(rows))
+
+    for k in range(0, dimension):
+        candidates = range(k, min(k + lower_bandwidth + 1, dimension))
+        pivot = max(candidates, key=lambda i: abs(rows[i].get(k, 0)))
+        if rows[pivot].get(k, 0) == 0:
+            raise ZeroDivisionError(f"Matrix is singular, no pivot in the column {k}")
+        rows[k], rows[pivot] = rows[pivot], rows[k]
+        rhs[k], rhs[pivot] = rhs[pivot], rhs[k]
+
+        pivot_row = rows[k]
+        for i in candidates[1:]:
+            if k not in rows[i]:
+                continue
+            factor = rows[i].pop(k) / pivot_row[k]
+            for j, value in pivot_row.items():
+                if j != k:
+                    rows[i][j] = rows[i].get(j, 0) - factor * value
+            rhs[i] -= factor * rhs[k]
+
+    solution = [mpmath.mpc(0)] * dimension
+    for k in range(dimension - 1, -1, -1):
+        row = rows[k]
+        solution[k] = (rhs[k] - mpmath.fsum(value * solution[j] for j, value in row.items() if j > k)) / row[k]
+    return solution
+
+
+def solve_multiprecision(intervals_number: int,
+                         radius: float = DEFAULT_RADIUS,
+                         precision: int = DEFAULT_PRECISION,
+                         coefficients: Optional[Dict[str, complex]] = None) -> List[mpmath.mpc]:
+    r"""
+    Solves the system Ax = b in the arbitrary precision, see module documentation.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    precision - number of the significant decimal digits used in the calculations.
+    coefficients - values of the coefficients, which override the default ones.
+
+    Returns
+    -------
+    List of the complex solutions (mpmath.mpc) in the order of EquationSystem.ordered_variables().
+    """
+    assert precision > 0
+    with mpmath.workdps(precision):
+        rows, rhs = assemble_multiprecision_system(intervals_number, radius, coefficients)
+        return solve_banded_multiprecision(rows, rhs)
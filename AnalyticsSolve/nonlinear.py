@@ -0,0 +1,262 @@
+r"""
+This module contains the solution of the nonlinear (self-consistent) variants of the system, in which the Rabi
+frequencies depend on the solution, which can be used as a standalone application.
+
+The implemented variant is the attenuation of the fields along the beam, which passes through the cell of the length L
+along the axis of the cylinder. The absorption of the field j is defined by the susceptibility
+chi_j = Gamma Ro_j3 / omega_j (Ro13, Ro23 are the adiabatically eliminated optical coherences,
+see assembly.calculate_optical_coherences, which are linear in the fields, so that chi_j depends only on the functions
+and on the ratio of the incident fields). Its imaginary part equals 1/2 in the resonant weak field without pumping
+and vanishes in the dark state, thus the intensity decays as exp(-2 d_j Im(chi_j) z / L), where d_j is the optical
+depth of the cell, and the equations are solved with the fields in the middle of the cell
+
+    omega_j = omega_j_incident * exp(-d_j Im(chi_j) / 2).
+
+Im(chi_j) is calculated as (chi_j - chi_j*) / 2i using the conjugated functions Ro11*, ..., Ro12*, which are
+the independent variables of the system, so that the residual F(x) = A(x) x - b is analytic and its Jacobian
+is calculated by the colored finite differences (see jacobian). The fields in the point depend only on the functions
+in the same point, thus the Jacobian has the same block-tridiagonal structure as A.
+
+The system F(x) = 0 is solved by
+- NEWTON: the Jacobian is calculated and factorized at each iteration (quadratic convergence);
+- CHORD: the factorization of the Jacobian is reused by the next iterations (linear convergence, but each iteration
+  costs a single residual and a single banded substitution), it is refactorized only when the convergence stalls,
+  i.e. the residual decreases by less than NonlinearParams.stall_ratio.
+The initial approximation is the solution of the linear system with the incident fields.
+
+Usage: python nonlinear.py [newton | chord] [N] [optical depth 1] [optical depth 2]
+
+@author: shvatov
+"""
+import sys
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from assembly import BlockTridiagonalSystem, MeshValues, assemble_blocks, backward_error, calculate_omega, \
+    calculate_optical_coherences, prepare_coefficients, vector_to_mesh
+from banded import BandedFactorization, factorize_banded_system
+from block_tridiagonal import solve_block_tridiagonal
+from equation import DEFAULT_RADIUS
+from jacobian import calculate_colored_jacobian
+
+# Value added to the perturbed variables by the finite-difference Jacobian (the functions are of the order of 1)
+DEFAULT_JACOBIAN_DELTA = 1e-7
+
+
+class NonlinearMethod(Enum):
+    """
+    Iterations of the nonlinear solver, see module documentation.
+    """
+    NEWTON = 1
+    CHORD = 2
+
+
+@dataclass
+class AttenuationModel:
+    """
+    Attenuation of the fields in the cell.
+
+    optical_depth_1, optical_depth_2 - optical depths d1, d2 of the cell for the weak resonant fields
+    without pumping (0 gives the linear system).
+    """
+    optical_depth_1: float = 1.0
+    optical_depth_2: float = 1.0
+
+
+@dataclass
+class NonlinearParams:
+    """
+    Parameters of the nonlinear solver.
+
+    tolerance - iterations stop, when the backward error (see assembly.backward_error) of the linear system
+    with the current fields is not greater than this value.
+    stall_ratio - CHORD refactorizes the Jacobian, if the backward error decreased by less than this factor
+    during the last iteration.
+    jacobian_delta - value added to the perturbed variables by the finite-difference Jacobian.
+    """
+    method: NonlinearMethod = NonlinearMethod.CHORD
+    tolerance: float = 1e-12
+    max_iterations: int = 50
+    stall_ratio: float = 0.5
+    jacobian_delta: complex = DEFAULT_JACOBIAN_DELTA
+
+
+@dataclass
+class NonlinearIteration:
+    """
+    Statistics of the single iteration (the iteration 0 is the initial approximation).
+
+    residual_norm - backward error after the iteration.
+    step_norm - max(abs(dx)) of the step.
+    refactorized - whether the Jacobian was calculated and factorized at this iteration.
+    elapsed - time in seconds spent on the iteration.
+    """
+    iteration: int
+    residual_norm: float
+    step_norm: float
+    refactorized: bool
+    elapsed: float
+
+
+@dataclass
+class NonlinearReport:
+    """
+    Statistics of the nonlinear solver.
+
+    factorizations - number of the calculated and factorized Jacobians.
+    jacobian_time - time in seconds spent on the Jacobians and their factorizations.
+    iterations - statistics of each iteration, see NonlinearIteration.
+    """
+    method: NonlinearMethod
+    converged: bool = False
+    factorizations: int = 0
+    jacobian_time: float = 0.0
+    iterations: List[NonlinearIteration] = field(default_factory=list)
+
+
+def calculate_attenuated_fields(ro_mesh: np.ndarray,
+                                mesh: MeshValues,
+                                coefficients: Dict[str, complex],
+                                model: AttenuationModel) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    r"""
+    Calculates the fields in the middle of the cell, see module documentation.
+    Parameters
+    ----------
+    ro_mesh - matrix (8, N + 1) of the values of the functions in the points of the mesh.
+    mesh - values of r in the points of the mesh.
+    coefficients - values of all coefficients, see assembly.prepare_coefficients.
+    model - optical depths of the cell, see AttenuationModel.
+
+    Returns
+    -------
+    Tuple of the arrays omega_1, omega_2 and of the values, which replace their complex conjugates
+    (see assembly.calculate_relaxation_terms).
+    """
+    incident_1 = calculate_omega(mesh.r, coefficients["C1"], coefficients["a"])
+    incident_2 = calculate_omega(mesh.r, coefficients["C2"], coefficients["a"])
+    ro_13, ro_13c, ro_23, ro_23c = calculate_optical_coherences(ro_mesh, incident_1, incident_2, coefficients)
+
+    def absorption(coherence: np.ndarray, coherence_c: np.ndarray, incident: np.ndarray) -> np.ndarray:
+        # the field does not interact with the medium, where it is zero
+        nonzero = incident != 0
+        safe = np.where(nonzero, incident, 1)
+        chi = np.where(nonzero, coefficients["Gamma"] * coherence / safe, 0)
+        chi_c = np.where(nonzero, np.conj(coefficients["Gamma"]) * coherence_c / np.conj(safe), 0)
+        return (chi - chi_c) / 2j
+
+    factor_1 = np.exp(-model.optical_depth_1 * absorption(ro_13, ro_13c, incident_1) / 2)
+    factor_2 = np.exp(-model.optical_depth_2 * absorption(ro_23, ro_23c, incident_2) / 2)
+    return incident_1 * factor_1, incident_2 * factor_2, np.conj(incident_1) * factor_1, np.conj(incident_2) * factor_2
+
+
+def assemble_attenuated_system(x: np.ndarray,
+                               intervals_number: int,
+                               radius: float = DEFAULT_RADIUS,
+                               coefficients: Optional[Dict[str, complex]] = None,
+                               model: Optional[AttenuationModel] = None) -> BlockTridiagonalSystem:
+    r"""
+    Assembles the linear system A(x) y = b with the fields defined by the functions x (ordered as
+    EquationSystem.ordered_variables()), so that the residual of the nonlinear system is F(x) = A(x) x - b.
+    """
+    model = model if model is not None else AttenuationModel()
+    all_coefficients = prepare_coefficients(coefficients)
+    omega_1, omega_2, omega_1c, omega_2c = calculate_attenuated_fields(vector_to_mesh(x),
+                                                                       MeshValues.create(intervals_number, radius),
+                                                                       all_coefficients, model)
+    return assemble_blocks(intervals_number, radius, coefficients, omega_1, omega_2, omega_1c, omega_2c)
+
+
+def solve_nonlinear(intervals_number: int,
+                    radius: float = DEFAULT_RADIUS,
+                    coefficients: Optional[Dict[str, complex]] = None,
+                    model: Optional[AttenuationModel] = None,
+                    params: Optional[NonlinearParams] = None,
+                    initial: Optional[np.ndarray] = None) -> Tuple[np.ndarray, NonlinearReport]:
+    r"""
+    Solves the system with the attenuated fields, see module documentation.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    model - optical depths of the cell, see AttenuationModel.
+    params - parameters of the solver, see NonlinearParams.
+    initial - initial approximation ordered as EquationSystem.ordered_variables(), by default the solution
+    of the linear system with the incident fields.
+
+    Returns
+    -------
+    Tuple of the solution and the statistics of the iterations, see NonlinearReport.
+    """
+    params = params if params is not None else NonlinearParams()
+    assert params.tolerance > 0
+    assert params.max_iterations > 0
+    assert 0 < params.stall_ratio < 1
+
+    def residual(vector: np.ndarray) -> np.ndarray:
+        system = assemble_attenuated_system(vector, intervals_number, radius, coefficients, model)
+        return system.to_csr() @ vector - system.rhs_vector()
+
+    def residual_norm(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        system = assemble_attenuated_system(vector, intervals_number, radius, coefficients, model)
+        A, b = system.to_csr(), system.rhs_vector()
+        return A @ vector - b, backward_error(A, b, vector)
+
+    start = time.perf_counter()
+    x = solve_block_tridiagonal(assemble_blocks(intervals_number, radius, coefficients)) if initial is None \
+        else np.array(initial, dtype=np.cdouble).reshape(-1)
+    F, norm = residual_norm(x)
+    report = NonlinearReport(method=params.method)
+    report.iterations.append(NonlinearIteration(iteration=0, residual_norm=norm, step_norm=0.0, refactorized=False,
+                                                elapsed=time.perf_counter() - start))
+
+    factorization: Optional[BandedFactorization] = None
+    previous_norm = None
+    for iteration in range(1, params.max_iterations + 1):
+        if norm <= params.tolerance:
+            break
+
+        start = time.perf_counter()
+        refactorize = factorization is None or params.method == NonlinearMethod.NEWTON \
+            or norm > params.stall_ratio * previous_norm
+        if refactorize:
+            jacobian_start = time.perf_counter()
+            factorization, _ = factorize_banded_system(calculate_colored_jacobian(residual, x, params.jacobian_delta))
+            report.factorizations += 1
+            report.jacobian_time += time.perf_counter() - jacobian_start
+
+        step = -factorization.solve(F)
+        x = x + step
+        previous_norm = norm
+        F, norm = residual_norm(x)
+        report.iterations.append(NonlinearIteration(iteration=iteration, residual_norm=norm,
+                                                    step_norm=float(np.abs(step).max()), refactorized=refactorize,
+                                                    elapsed=time.perf_counter() - start))
+
+    report.converged = norm <= params.tolerance
+    return x, report
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    nonlinear_params = NonlinearParams(method=NonlinearMethod[arguments[0].upper()] if arguments
+                                       else NonlinearMethod.CHORD)
+    n = int(float(arguments[1])) if len(arguments) > 1 else 1000
+    attenuation = AttenuationModel(optical_depth_1=float(arguments[2]) if len(arguments) > 2 else 1.0,
+                                   optical_depth_2=float(arguments[3]) if len(arguments) > 3 else 1.0)
+
+    solution, nonlinear_report = solve_nonlinear(n, model=attenuation, params=nonlinear_params)
+    print(f"Nonlinear solver: {nonlinear_report.method.name}, N = {n}, "
+          f"d1 = {attenuation.optical_depth_1}, d2 = {attenuation.optical_depth_2}")
+    print(f"{'Iteration':>9} {'Backward error':>15} {'max|dx|':>10} {'Jacobian':>8} {'Time, s':>8}")
+    for item in nonlinear_report.iterations:
+        print(f"{item.iteration:>9} {item.residual_norm:>15.3e} {item.step_norm:>10.3e} "
+              f"{'yes' if item.refactorized else '':>8} {item.elapsed:>8.3f}")
+    print(f"Converged: {nonlinear_report.converged}, Jacobians: {nonlinear_report.factorizations} "
+          f"in {nonlinear_report.jacobian_time:.3f} s")
+    linear = solve_block_tridiagonal(assemble_blocks(n))
+    print(f"Max difference from the solution with the incident fields = {np.abs(solution - linear).max()}")
@@ -0,0 +1,222 @@
+r"""
+This module contains the in-process cache registry, which replaces unbounded functools.lru_cache decorators.
+All cached values are stored in one registry, which estimates their size in bytes and evicts the least recently
+used ones, when the total size exceeds the memory budget. Entries can be invalidated explicitly, the registry
+counts hits, misses and evictions of each namespace.
+
+Functions and methods are cached using the decorator:
+
+    @cached("equation.ordered_equations")
+    def ordered_equations(self) -> Sequence[Expr]:
+        ...
+
+@author: shvatov
+"""
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import spmatrix
+from sympy import Basic
+
+# Default memory budget of the registry in bytes
+DEFAULT_MEMORY_BUDGET = 512 << 20
+
+# Size of a single node of the Sympy expression tree (object, args tuple and assumptions), in bytes
+SYMPY_NODE_SIZE = 200
+
+
+def estimate_size(value: Any) -> int:
+    r"""
+    Returns the estimated size of the value in bytes. Containers, dataclasses and Sympy expressions
+    are traversed recursively, each object is counted only once, so that shared subexpressions
+    and symbols are not counted multiple times.
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, np.ndarray):
+            size += obj.nbytes
+        elif isinstance(obj, spmatrix):
+            size += sum(getattr(obj, name).nbytes for name in ("data", "indices", "indptr", "row", "col")
+                        if isinstance(getattr(obj, name, None), np.ndarray))
+        elif isinstance(obj, Basic):
+            size += SYMPY_NODE_SIZE
+            stack.extend(obj.args)
+        elif isinstance(obj, dict):
+            size += sys.getsizeof(obj)
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            size += sys.getsizeof(obj)
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not callable(obj):
+            size += sys.getsizeof(obj)
+            stack.extend(vars(obj).values())
+        else:
+            size += sys.getsizeof(obj)
+    return size
+
+
+@dataclass
+class CacheStatistics:
+    r"""
+    Counters of the registry (or of its single namespace).
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+
+
+class CacheRegistry:
+    r"""
+    Registry of the cached values, see module documentation. Keys of the entries are the tuples (namespace, key).
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        assert memory_budget >= 0
+        self.memory_budget = memory_budget
+        self.size = 0
+        self.__entries: "OrderedDict[Tuple[str, Hashable], CacheEntry]" = OrderedDict()
+        self.__statistics: Dict[str, CacheStatistics] = dict()
+        self.__lock = threading.RLock()
+
+    def __namespace_statistics(self, namespace: str) -> CacheStatistics:
+        if namespace not in self.__statistics:
+            self.__statistics[namespace] = CacheStatistics()
+        return self.__statistics[namespace]
+
+    def get(self,
+            namespace: str,
+            key: Hashable,
+            factory: Callable[[], Any],
+            size_estimator: Callable[[Any], int] = estimate_size) -> Any:
+        r"""
+        Returns the cached value, or calculates it using the factory and stores it in the registry.
+        Values, which are larger than the whole memory budget, are returned, but not stored.
+        """
+        with self.__lock:
+            entry = self.__entries.get((namespace, key))
+            statistics = self.__namespace_statistics(namespace)
+            if entry is not None:
+                self.__entries.move_to_end((namespace, key))
+                statistics.hits += 1
+                return entry.value
+            statistics.misses += 1
+
+        # the lock is not held, while the value is calculated, since the factory can use the registry itself
+        value = factory()
+        size = size_estimator(value)
+        with self.__lock:
+            if size > self.memory_budget:
+                return value
+            if (namespace, key) in self.__entries:
+                self.__remove((namespace, key))
+            self.__entries[(namespace, key)] = CacheEntry(value=value, size=size)
+            self.size += size
+            statistics.entries += 1
+            statistics.size += size
+            self.__evict()
+        return value
+
+    def __remove(self, entry_key: Tuple[str, Hashable]) -> None:
+        entry = self.__entries.pop(entry_key)
+        statistics = self.__namespace_statistics(entry_key[0])
+        statistics.entries -= 1
+        statistics.size -= entry.size
+        self.size -= entry.size
+
+    def __evict(self) -> None:
+        while self.size > self.memory_budget:
+            entry_key = next(iter(self.__entries))
+            self.__remove(entry_key)
+            self.__namespace_statistics(entry_key[0]).evictions += 1
+
+    def set_memory_budget(self, memory_budget: int) -> None:
+        assert memory_budget >= 0
+        with self.__lock:
+            self.memory_budget = memory_budget
+            self.__evict()
+
+    def invalidate(self,
+                   namespace: Optional[str] = None,
+                   predicate: Optional[Callable[[Hashable, Any], bool]] = None) -> int:
+        r"""
+        Removes the entries of the namespace (or all namespaces, if it is None), which satisfy the predicate
+        (or all of them, if it is None). Predicate accepts the key and the value of the entry.
+        Returns the number of the removed entries.
+        """
+        with self.__lock:
+            removed = [entry_key for entry_key, entry in self.__entries.items()
+                       if (namespace is None or entry_key[0] == namespace)
+                       and (predicate is None or predicate(entry_key[1], entry.value))]
+            for entry_key in removed:
+                self.__remove(entry_key)
+            return len(removed)
+
+    def statistics(self, namespace: Optional[str] = None) -> CacheStatistics:
+        r"""
+        Returns the copy of the counters of the namespace, or the total ones, if namespace is None.
+        """
+        with self.__lock:
+            if namespace is not None:
+                return CacheStatistics(**vars(self.__namespace_statistics(namespace)))
+
+            total = CacheStatistics()
+            for statistics in self.__statistics.values():
+                total.hits += statistics.hits
+                total.misses += statistics.misses
+                total.evictions += statistics.evictions
+                total.entries += statistics.entries
+                total.size += statistics.size
+            return total
+
+    def namespaces(self) -> Tuple[str, ...]:
+        with self.__lock:
+            return tuple(self.__statistics.keys())
+
+
+# Registry, which is used by the cached decorator by default
+REGISTRY = CacheRegistry()
+
+
+def cached(namespace: str,
+           registry: Optional[CacheRegistry] = None,
+           size_estimator: Callable[[Any], int] = estimate_size) -> Callable:
+    r"""
+    Decorator, which caches the results of the function in the registry (REGISTRY by default). The key of the entry
+    consists of the positional and keyword arguments of the call, so they must be hashable. Decorated function gets
+    the attribute invalidate(predicate=None), which removes its entries from the registry.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        def target_registry() -> CacheRegistry:
+            return registry if registry is not None else REGISTRY
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return target_registry().get(namespace, key, lambda: function(*args, **kwargs), size_estimator)
+
+        wrapper.invalidate = lambda predicate=None: target_registry().invalidate(namespace, predicate)
+        return wrapper
+
+    return decorator
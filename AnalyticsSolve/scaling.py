@@ -0,0 +1,179 @@
+r"""
+This module contains the scaling of the assembled system, which is applied between the assembly and the solution:
+
+    (Dr A Dc) y = Dr b, x = Dc y,
+
+where Dr and Dc are the positive diagonal matrices. The coefficients of the system differ by many orders
+of magnitude (Gamma ~ 10^7, C1, C2 ~ 10^5, D11 ~ 10), thus the matrix is badly conditioned, which slows
+down the iterative and the low-precision solvers.
+
+The scaling consists of two stages:
+1. Nondimensionalization: the equations of the internal points are the balances of the rates, they are multiplied
+   by the time scale (by default 1 / Gamma), the equations of the Dirichlet point are not changed.
+2. Equilibration (Ruiz): the rows and the columns are divided by the square roots of their maximal elements
+   repeatedly, until the maximal elements of all rows and columns are close to 1.
+
+Since Dr and Dc are diagonal, the scaled matrix has the same block-tridiagonal structure, and any solver
+can be applied to it.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import LinearOperator, onenormest, splu
+
+from assembly import SYSTEM_VAR_NUM, BlockTridiagonalSystem, prepare_coefficients
+
+
+@dataclass
+class ScalingParams:
+    """
+    Parameters of the scaling.
+
+    time_scale - time scale of the nondimensionalization, by default 1 / Gamma.
+    equilibrate - whether to apply the Ruiz equilibration or not.
+    max_iterations - maximal number of the iterations of the equilibration.
+    tolerance - the equilibration stops, when the maximal elements of all rows and columns differ from 1
+    by less than this value.
+    estimate_condition - whether to estimate the condition numbers of the matrix before and after the scaling
+    (requires two sparse LU decompositions).
+    """
+    time_scale: Optional[float] = None
+    equilibrate: bool = True
+    max_iterations: int = 20
+    tolerance: float = 1e-2
+    estimate_condition: bool = True
+
+
+@dataclass
+class ScalingReport:
+    """
+    Statistics of the scaling.
+
+    condition_before, condition_after - estimations of the 1-norm condition numbers (0 if not estimated).
+    row_scale_range, column_scale_range - minimal and maximal elements of Dr and Dc.
+    """
+    time_scale: float
+    iterations: int
+    condition_before: float
+    condition_after: float
+    row_scale_range: Tuple[float, float]
+    column_scale_range: Tuple[float, float]
+
+
+@dataclass
+class ScaledSystem:
+    """
+    Scaled system (Dr A Dc) y = Dr b.
+
+    original - the system before the scaling.
+    row_scale, column_scale - arrays (N + 1, 8) of the diagonals of Dr and Dc.
+    """
+    original: BlockTridiagonalSystem
+    system: BlockTridiagonalSystem
+    row_scale: np.ndarray
+    column_scale: np.ndarray
+
+    def scale_sparse(self, A: csr_matrix, b: np.ndarray) -> Tuple[csr_matrix, np.ndarray]:
+        r"""
+        Applies the same scaling to the sparse representation of the original system.
+        """
+        row_scale, column_scale = self.row_scale.reshape(-1), self.column_scale.reshape(-1)
+        return (diags(row_scale) @ A @ diags(column_scale)).tocsr(), row_scale * b
+
+    def unscale(self, solution: np.ndarray) -> np.ndarray:
+        r"""
+        Converts the solution y of the scaled system into the solution x = Dc y of the original one.
+        """
+        return self.column_scale.reshape(-1) * np.asarray(solution)
+
+    def residual_norm(self, solution: np.ndarray) -> float:
+        r"""
+        Returns max|b - Ax| of the original system for the unscaled solution.
+        """
+        return float(np.abs(self.original.rhs_vector() - self.original.to_csr() @ solution).max())
+
+
+def default_time_scale(coefficients: Optional[Dict[str, complex]] = None) -> float:
+    return 1 / abs(prepare_coefficients(coefficients)["Gamma"])
+
+
+def estimate_condition_number(A: csr_matrix) -> float:
+    r"""
+    Estimates the 1-norm condition number ||A|| ||A^(-1)|| using the sparse LU decomposition
+    and the block 1-norm estimator of Higham and Tisseur.
+    """
+    lu = splu(A.tocsc())
+    inverse = LinearOperator(A.shape, matvec=lu.solve, rmatvec=lambda x: lu.solve(x, trans="H"), dtype=A.dtype)
+    return float(abs(A).sum(axis=0).max() * onenormest(inverse))
+
+
+def equilibrate(A: csr_matrix, max_iterations: int, tolerance: float) -> Tuple[np.ndarray, np.ndarray, int]:
+    r"""
+    Ruiz equilibration of the matrix. Returns the diagonals of Dr, Dc and the number of the performed iterations.
+    """
+    row_scale, column_scale = np.ones(A.shape[0]), np.ones(A.shape[1])
+    magnitude = abs(A).tocsr()
+    for iteration in range(max_iterations):
+        scaled = diags(row_scale) @ magnitude @ diags(column_scale)
+        row_max = scaled.max(axis=1).toarray().ravel()
+        column_max = scaled.max(axis=0).toarray().ravel()
+        if max(np.abs(1 - row_max).max(), np.abs(1 - column_max).max()) < tolerance:
+            return row_scale, column_scale, iteration
+        row_scale /= np.sqrt(row_max)
+        column_scale /= np.sqrt(column_max)
+    return row_scale, column_scale, max_iterations
+
+
+def scale_system(system: BlockTridiagonalSystem,
+                 params: Optional[ScalingParams] = None,
+                 coefficients: Optional[Dict[str, complex]] = None) -> Tuple[ScaledSystem, ScalingReport]:
+    r"""
+    Scales the system, see module documentation.
+    Parameters
+    ----------
+    system - blocks of the matrix A and the right side vector b, see assembly.assemble_blocks.
+    params - parameters of the scaling, see ScalingParams.
+    coefficients - values of the coefficients used in the assembly, which define the default time scale.
+
+    Returns
+    -------
+    Tuple of the scaled system and the statistics of the scaling, see ScalingReport.
+    """
+    params = params if params is not None else ScalingParams()
+    time_scale = params.time_scale if params.time_scale is not None else default_time_scale(coefficients)
+    points = system.intervals_number + 1
+
+    row_scale = np.full((points, SYSTEM_VAR_NUM), time_scale)
+    row_scale[-1] = 1.0
+    column_scale = np.ones((points, SYSTEM_VAR_NUM))
+
+    A = system.to_csr()
+    nondimensional = diags(row_scale.reshape(-1)) @ A
+    iterations = 0
+    if params.equilibrate:
+        equilibrated_rows, equilibrated_columns, iterations = equilibrate(nondimensional, params.max_iterations,
+                                                                          params.tolerance)
+        row_scale *= equilibrated_rows.reshape(points, SYSTEM_VAR_NUM)
+        column_scale *= equilibrated_columns.reshape(points, SYSTEM_VAR_NUM)
+
+    scaled = BlockTridiagonalSystem(diagonal=row_scale[:, :, None] * system.diagonal * column_scale[:, None, :],
+                                    lower=row_scale[1:] * system.lower * column_scale[:-1],
+                                    upper=row_scale[:-1] * system.upper * column_scale[1:],
+                                    rhs=row_scale * system.rhs)
+
+    condition_before, condition_after = 0.0, 0.0
+    if params.estimate_condition:
+        condition_before = estimate_condition_number(A)
+        condition_after = estimate_condition_number(scaled.to_csr())
+
+    return ScaledSystem(original=system, system=scaled, row_scale=row_scale, column_scale=column_scale), \
+        ScalingReport(time_scale=time_scale,
+                      iterations=iterations,
+                      condition_before=condition_before,
+                      condition_after=condition_after,
+                      row_scale_range=(float(row_scale.min()), float(row_scale.max())),
+                      column_scale_range=(float(column_scale.min()), float(column_scale.max())))
@@ -0,0 +1,324 @@
+r"""
+This module contains the adjoint sensitivity analysis: the derivatives of the observables of the solution with respect
+to all constant coefficients of the system (see EquationSystem.constant_coefficients()), which can be used
+as a standalone application.
+
+The solution x(p) satisfies F(x, p) = A(p) x - b(p) = 0, thus dx/dp = -A^(-1) dF/dp. The observables are linear
+functionals J = g^T x (e.g. the averages over the cross-section, see cross_section_observables), so that
+
+    dJ/dp = -g^T A^(-1) dF/dp = -lambda^T dF/dp, where A^T lambda = g.
+
+The adjoint vector lambda is calculated by a single transposed solution for each observable, which reuses
+the factorization of the forward solution (see factorized.FactorizedSystem), and dF/dp = (dA/dp) x - db/dp
+is calculated for all coefficients at once by the kernels, which are generated from the analytic derivatives
+of the stencil templates (see EquationSystem.stencil_templates). Thus the gradient with respect to all coefficients
+costs about two solutions instead of one solution per coefficient required by the finite differences.
+
+The coefficients are considered real (the conjugated Rabi frequencies are differentiated as the conjugates
+of the derivatives). The conjugated functions Ro11*, ..., Ro12* are the independent variables of the system, thus
+the observables use them explicitly: e.g. <Ro33> is the average of (Ro33 + Ro33*) / 2, so that it is real.
+
+Usage: python sensitivity.py [N] [check] - check compares the gradients with the central finite differences.
+
+@author: shvatov
+"""
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sympy import Symbol, diff, lambdify
+
+from assembly import SYSTEM_VAR_NUM, FUNCTION_NAMES, MeshValues, assemble_blocks, cross_section_weights, \
+    prepare_coefficients, vector_to_mesh
+from block_tridiagonal import solve_block_tridiagonal
+from equation import EquationSystem, DEFAULT_RADIUS
+from factorized import FactorizationKind, FactorizedSystem
+from registry import cached
+
+# Relative steps of the finite differences used to check the gradients, see calculate_finite_differences
+CHECK_RELATIVE_STEPS = tuple(10.0 ** -k for k in range(1, 10))
+
+# Dimensionless sensitivities scale * dJ/dp below this value are compared absolutely, see compare_gradients
+CHECK_ABSOLUTE_FLOOR = 1e-9
+
+
+@dataclass
+class DerivativeKernels:
+    r"""
+    Lambdified derivatives of the equations of the system with respect to the coefficients. Each kernel accepts
+    the same arguments as the kernels of discrepancy.StencilKernels and returns the list (coefficients, 8)
+    of the derivatives of the equations.
+
+    coefficients - names of the coefficients in the order of the derivatives and of the arguments of the kernels.
+    """
+    left: Callable
+    main: Callable
+    right: Callable
+    coefficients: Sequence[str]
+
+
+@dataclass
+class Observable:
+    r"""
+    Linear functional J = weights^T x of the solution x ordered as EquationSystem.ordered_variables().
+    """
+    name: str
+    weights: np.ndarray
+
+
+@dataclass
+class Sensitivities:
+    """
+    Values of the observables and their derivatives with respect to the coefficients.
+
+    values - array (observables) of the values.
+    gradients - array (observables, coefficients) of the derivatives.
+    forward_time, adjoint_time, derivatives_time - time in seconds spent on the factorization and the forward
+    solution, on the transposed solutions and on the evaluation of dF/dp.
+    """
+    observables: List[str]
+    coefficients: List[str]
+    values: np.ndarray
+    gradients: np.ndarray
+    solution: np.ndarray
+    forward_time: float
+    adjoint_time: float
+    derivatives_time: float
+
+    def gradient(self, observable: str, coefficient: str) -> complex:
+        return self.gradients[self.observables.index(observable), self.coefficients.index(coefficient)]
+
+
+@cached("sensitivity.prepare_derivative_kernels")
+def prepare_derivative_kernels() -> DerivativeKernels:
+    r"""
+    Differentiates the stencil templates with respect to the coefficients and generates the kernels. The coefficients
+    and the values of r are replaced with the real symbols, so that the conjugates of the Rabi frequencies
+    are differentiated. The result is cached in the registry.
+    """
+    templates = EquationSystem.stencil_templates()
+    prev_ro, cur_ro, next_ro = templates.previous, templates.current, templates.next
+    coefficients = [c.symbol for c in EquationSystem.constant_coefficients()]
+    real = {s: Symbol(s.name, real=True)
+            for s in (*coefficients, templates.ri, templates.ri_plus_half, templates.ri_minus_half)}
+    ri, ri_plus_half, ri_minus_half = real[templates.ri], real[templates.ri_plus_half], real[templates.ri_minus_half]
+    real_coefficients = [real[c] for c in coefficients]
+    h = Symbol("h")
+
+    def derivatives(equations: Sequence) -> List[List]:
+        equations = [eq.xreplace(real) for eq in equations]
+        return [[diff(eq, c) for eq in equations] for c in real_coefficients]
+
+    return DerivativeKernels(
+        left=lambdify([cur_ro, next_ro, ri, ri_plus_half, h, *real_coefficients], derivatives(templates.left),
+                      modules="numpy", cse=True),
+        main=lambdify([prev_ro, cur_ro, next_ro, ri, ri_plus_half, ri_minus_half, h, *real_coefficients],
+                      derivatives(templates.main), modules="numpy", cse=True),
+        right=lambdify([cur_ro, *real_coefficients], derivatives(templates.right), modules="numpy", cse=True),
+        coefficients=[c.name for c in coefficients],
+    )
+
+
+def evaluate_derivative_kernel(kernel: Callable, count: int, shape: Sequence[int], *args) -> np.ndarray:
+    r"""
+    Evaluates the kernel and broadcasts each of its results (some of them may be scalars) to the given shape.
+    Returns the array (count, 8, *shape).
+    """
+    result = np.empty((count, SYSTEM_VAR_NUM, *shape), dtype=np.cdouble)
+    for c, values in enumerate(kernel(*args)):
+        for k, value in enumerate(values):
+            result[c, k] = value
+    return result
+
+
+def calculate_coefficient_derivatives(ro_mesh: np.ndarray,
+                                      radius: float = DEFAULT_RADIUS,
+                                      coefficients: Optional[Dict[str, complex]] = None) -> np.ndarray:
+    r"""
+    Calculates the derivatives dF/dp = (dA/dp) x - db/dp of the discrepancy with respect to all coefficients.
+    Parameters
+    ----------
+    ro_mesh - matrix (8, N + 1) of the values of the functions in the points of the mesh.
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+
+    Returns
+    -------
+    Array (coefficients, 8 * (N + 1)), the coefficients are ordered as DerivativeKernels.coefficients,
+    the equations - as EquationSystem.ordered_equations().
+    """
+    kernels = prepare_derivative_kernels()
+    n, count = ro_mesh.shape[1] - 1, len(kernels.coefficients)
+    mesh = MeshValues.create(n, radius)
+    values = prepare_coefficients(coefficients)
+    coefficient_values = [values[name] for name in kernels.coefficients]
+
+    derivatives = np.empty((count, SYSTEM_VAR_NUM, n + 1), dtype=np.cdouble)
+    derivatives[:, :, 0] = evaluate_derivative_kernel(kernels.left, count, (), ro_mesh[:, 0], ro_mesh[:, 1],
+                                                      mesh.r[0], mesh.r_plus_half[0], mesh.h, *coefficient_values)
+    derivatives[:, :, 1:n] = evaluate_derivative_kernel(kernels.main, count, (n - 1,), ro_mesh[:, 0:n - 1],
+                                                        ro_mesh[:, 1:n], ro_mesh[:, 2:n + 1], mesh.r[1:n],
+                                                        mesh.r_plus_half[1:n], mesh.r_minus_half[0:n - 1], mesh.h,
+                                                        *coefficient_values)
+    derivatives[:, :, n] = evaluate_derivative_kernel(kernels.right, count, (), ro_mesh[:, n], *coefficient_values)
+    return derivatives.transpose((0, 2, 1)).reshape(count, -1)
+
+
+def cross_section_observables(intervals_number: int, radius: float = DEFAULT_RADIUS) -> List[Observable]:
+    r"""
+    Returns the averages over the cross-section of the cell (see assembly.cross_section_weights) of the populations
+    <Ro11>, <Ro22>, <Ro33> and of the real and imaginary parts of the ground-state coherence <Ro12>.
+    """
+    weights = cross_section_weights(MeshValues.create(intervals_number, radius))
+
+    def observable(name: str, function_weights: Dict[str, complex]) -> Observable:
+        point_weights = np.zeros(SYSTEM_VAR_NUM, dtype=np.cdouble)
+        for function, weight in function_weights.items():
+            point_weights[FUNCTION_NAMES.index(function)] = weight
+        return Observable(name=name, weights=(weights[:, None] * point_weights).reshape(-1))
+
+    return [observable("<Ro11>", {"r11": 0.5, "r11c": 0.5}),
+            observable("<Ro22>", {"r22": 0.5, "r22c": 0.5}),
+            observable("<Ro33>", {"r33": 0.5, "r33c": 0.5}),
+            observable("Re<Ro12>", {"r12": 0.5, "r12c": 0.5}),
+            observable("Im<Ro12>", {"r12": -0.5j, "r12c": 0.5j})]
+
+
+def calculate_sensitivities(intervals_number: int,
+                            radius: float = DEFAULT_RADIUS,
+                            coefficients: Optional[Dict[str, complex]] = None,
+                            observables: Optional[Sequence[Observable]] = None,
+                            kind: FactorizationKind = FactorizationKind.BLOCK_LU) -> Sensitivities:
+    r"""
+    Calculates the derivatives of the observables with respect to all coefficients, see module documentation.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    observables - linear functionals of the solution, by default see cross_section_observables.
+    kind - type of the factorization, which is used by the forward and the transposed solutions.
+
+    Returns
+    -------
+    Values of the observables and their gradients, see Sensitivities.
+    """
+    observables = observables if observables is not None else cross_section_observables(intervals_number, radius)
+
+    start = time.perf_counter()
+    factorized = FactorizedSystem(assemble_blocks(intervals_number, radius, coefficients), kind)
+    solution = factorized.solve()
+    forward_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    weights = np.stack([observable.weights for observable in observables], axis=1)
+    adjoint = factorized.solve(weights, trans="T")
+    adjoint_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    derivatives = calculate_coefficient_derivatives(vector_to_mesh(solution), radius, coefficients)
+    derivatives_time = time.perf_counter() - start
+
+    return Sensitivities(observables=[observable.name for observable in observables],
+                         coefficients=list(prepare_derivative_kernels().coefficients),
+                         values=weights.T @ solution,
+                         gradients=-adjoint.T @ derivatives.T,
+                         solution=solution,
+                         forward_time=forward_time,
+                         adjoint_time=adjoint_time,
+                         derivatives_time=derivatives_time)
+
+
+def coefficient_scale(name: str, values: Dict[str, complex]) -> float:
+    r"""
+    Returns the scale of the coefficient: its absolute value, the zero coefficients (the detunings) are measured
+    relative to the natural linewidth Gamma.
+    """
+    return abs(values[name]) if values[name] != 0 else abs(values["Gamma"])
+
+
+def calculate_finite_differences(intervals_number: int,
+                                 observables: Sequence[Observable],
+                                 radius: float = DEFAULT_RADIUS,
+                                 coefficients: Optional[Dict[str, complex]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Calculates the gradients by the central finite differences, which are used to check the adjoint ones.
+    The truncation error decreases with the step, while the cancellation error grows as the inverse of the step,
+    thus the differences are calculated with the steps scale * CHECK_RELATIVE_STEPS (see coefficient_scale),
+    and for each derivative the pair of the successive steps with the closest estimates is chosen.
+
+    Returns
+    -------
+    Tuple of the arrays (observables, coefficients) of the gradients and of the chosen steps.
+    """
+    values = prepare_coefficients(coefficients)
+    weights = np.stack([observable.weights for observable in observables], axis=1)
+    names = prepare_derivative_kernels().coefficients
+    gradients = np.empty((len(observables), len(names)), dtype=np.cdouble)
+    steps = np.empty((len(observables), len(names)))
+    relative_steps = np.array(CHECK_RELATIVE_STEPS)
+
+    def observe(name: str, value: complex) -> np.ndarray:
+        return weights.T @ solve_block_tridiagonal(assemble_blocks(intervals_number, radius,
+                                                                   dict(values, **{name: value})))
+
+    for c, name in enumerate(names):
+        scale = coefficient_scale(name, values)
+        # estimates[k, o] - derivative of the observable o calculated with the step k
+        estimates = np.array([(observe(name, values[name] + step) - observe(name, values[name] - step)) / (2 * step)
+                              for step in relative_steps * scale])
+        best = np.argmin(np.abs(np.diff(estimates, axis=0)), axis=0) + 1
+        gradients[:, c] = estimates[best, np.arange(len(observables))]
+        steps[:, c] = relative_steps[best] * scale
+    return gradients, steps
+
+
+def compare_gradients(gradients: np.ndarray, differences: np.ndarray, scales: np.ndarray) -> Tuple[np.ndarray,
+                                                                                                    np.ndarray]:
+    r"""
+    Compares the adjoint gradients with the finite differences entry by entry. The entries are compared
+    as the dimensionless sensitivities scale * dJ/dp (see coefficient_scale): relatively, if the adjoint one
+    is greater than CHECK_ABSOLUTE_FLOOR, and absolutely otherwise (e.g. the derivatives, which are zero).
+
+    Returns
+    -------
+    Tuple of the arrays (coefficients) of the maximal relative and the maximal absolute differences
+    (0, if there are no such entries).
+    """
+    adjoint = np.abs(gradients) * scales[None, :]
+    difference = np.abs(differences - gradients) * scales[None, :]
+    significant = adjoint > CHECK_ABSOLUTE_FLOOR
+    relative = np.where(significant, difference / np.where(significant, adjoint, 1), 0).max(axis=0)
+    absolute = np.where(significant, 0, difference).max(axis=0)
+    return relative, absolute
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    n = int(float(arguments[0])) if arguments else 1000
+    check = len(arguments) > 1 and arguments[1] == "check"
+
+    prepare_derivative_kernels()
+    sensitivities = calculate_sensitivities(n)
+    print(f"Adjoint sensitivities: N = {n}, forward solution: {sensitivities.forward_time:.3f} s, "
+          f"transposed solutions: {sensitivities.adjoint_time:.3f} s, dF/dp: {sensitivities.derivatives_time:.3f} s\n")
+    print(f"{'':>16}" + "".join(f"{name:>13}" for name in sensitivities.observables))
+    print(f"{'value':>16}" + "".join(f"{value.real:>13.5e}" for value in sensitivities.values))
+    for c, coefficient in enumerate(sensitivities.coefficients):
+        print(f"{'d/d' + coefficient:>16}" + "".join(f"{value.real:>13.5e}" for value in sensitivities.gradients[:, c]))
+
+    if check:
+        start = time.perf_counter()
+        differences, check_steps = calculate_finite_differences(n, cross_section_observables(n))
+        coefficient_values = prepare_coefficients()
+        check_scales = np.array([coefficient_scale(name, coefficient_values) for name in sensitivities.coefficients])
+        relative_differences, absolute_differences = compare_gradients(sensitivities.gradients, differences,
+                                                                       check_scales)
+        print(f"\nFinite differences: {time.perf_counter() - start:.3f} s, dimensionless sensitivities "
+              f"above {CHECK_ABSOLUTE_FLOOR} are compared relatively, the others - absolutely\n")
+        print(f"{'coefficient':>16} {'min step':>12} {'max step':>12} {'relative':>12} {'absolute':>12}")
+        for c, coefficient in enumerate(sensitivities.coefficients):
+            print(f"{coefficient:>16} {check_steps[:, c].min():>12.3e} {check_steps[:, c].max():>12.3e} "
+                  f"{relative_differences[c]:>12.3e} {absolute_differences[c]:>12.3e}")
@@ -0,0 +1,263 @@
+r"""
+This module contains the snapshots of the symbolic equation system: ordered equations, ordered variables,
+coefficients, the symbolic matrix A and vector b and their evaluated values are saved to disk, so that
+the subsequent runs with the same N and R load them instead of deriving them again.
+
+Each snapshot is the directory with the index file (index.json) and one file per section. Expressions are stored
+as the pickled list of the unique nodes of the expression graph, each node refers to its arguments by index.
+Nodes are rebuilt without evaluation (the stored expressions are already evaluated), which is an order of magnitude
+faster than unpickling the expressions directly. Sections are loaded lazily, when they are requested for the first
+time, and the matrix sections are created only when they are requested. Index contains the version stamp,
+which depends on the source of equation.py, so that the snapshots are rebuilt, when the equations change.
+Missing or corrupted sections of the system are treated as the missing snapshot: it is rebuilt from EquationSystem
+(see SnapshotSectionError), missing or corrupted matrix sections are calculated again.
+
+@author: shvatov
+"""
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import sympy
+from sympy import Expr, Symbol, Matrix, linear_eq_to_matrix, zeros
+
+import equation
+from equation import EquationSystem, DEFAULT_RADIUS
+
+# Default path to the directory with the snapshots
+DEFAULT_SNAPSHOT_PATH = "../cache/snapshots"
+
+# Version of the format of the snapshots, it is a part of the version stamp
+SNAPSHOT_FORMAT_VERSION = 1
+
+INDEX_FILE = "index.json"
+EQUATIONS_SECTION = "equations"
+VARIABLES_SECTION = "variables"
+COEFFICIENTS_SECTION = "coefficients"
+MATRIX_SECTION = "matrix"
+EVALUATED_MATRIX_SECTION = "evaluated_matrix"
+
+
+def equation_version() -> str:
+    r"""
+    Returns the version stamp of the snapshots: hash of the source of equation.py,
+    the version of Sympy and the version of the format.
+    """
+    digest = hashlib.sha256()
+    with open(equation.__file__, "rb") as source:
+        digest.update(source.read())
+    digest.update(f"{sympy.__version__}:{SNAPSHOT_FORMAT_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def encode_expressions(expressions: Sequence[Expr]) -> Tuple[List[Tuple[Any, Any]], List[int]]:
+    r"""
+    Converts the expressions into the list of the unique nodes and the list of indices of the roots.
+    Node is either (None, atom), or (func, indices of the arguments), arguments always precede the node.
+    """
+    index: Dict[Expr, int] = dict()
+    nodes: List[Tuple[Any, Any]] = list()
+
+    def visit(expr: Expr) -> int:
+        position = index.get(expr)
+        if position is not None:
+            return position
+
+        # expression trees are shallow, so that the recursion is safe
+        if not expr.args:
+            nodes.append((None, expr))
+        else:
+            nodes.append((expr.func, tuple(visit(arg) for arg in expr.args)))
+        index[expr] = len(nodes) - 1
+        return len(nodes) - 1
+
+    return nodes, [visit(expr) for expr in expressions]
+
+
+def decode_expressions(nodes: Sequence[Tuple[Any, Any]], roots: Sequence[int]) -> List[Expr]:
+    r"""
+    Rebuilds the expressions encoded using encode_expressions without evaluation.
+    """
+    built: List[Expr] = list()
+    for func, args in nodes:
+        if func is None:
+            built.append(args)
+        else:
+            built.append(func(*[built[i] for i in args], evaluate=False))
+    return [built[i] for i in roots]
+
+
+class SnapshotSectionError(LookupError):
+    r"""
+    Raised, when the section of the snapshot is missing or cannot be read.
+    """
+
+    def __init__(self, path: str, section: str):
+        super().__init__(f"Section {section} of the snapshot {path} is missing or corrupted")
+        self.section = section
+
+
+class SymbolicSnapshot:
+    r"""
+    Snapshot of the symbolic equation system, see module documentation. Provides the same methods as EquationSystem:
+    ordered_equations(), ordered_variables() and coefficients(), thus it can be used instead of the system.
+    """
+
+    def __init__(self, path: str, intervals_number: int, radius: float):
+        self.path = path
+        self.N, self.R = intervals_number, radius
+        self.__sections: Dict[str, Any] = dict()
+
+    @staticmethod
+    def snapshot_path(intervals_number: int, radius: float, path: str = DEFAULT_SNAPSHOT_PATH) -> str:
+        return os.path.join(path, f"N{intervals_number}-R{float(radius).hex()}")
+
+    @staticmethod
+    def open(intervals_number: int,
+             radius: float = DEFAULT_RADIUS,
+             path: str = DEFAULT_SNAPSHOT_PATH) -> Optional["SymbolicSnapshot"]:
+        r"""
+        Opens the snapshot of the system, only the index is read. Returns None, if there is no snapshot
+        for the given N and R, if it was created for a different version of equation.py, or if any section
+        of the system is missing.
+        """
+        snapshot_path = SymbolicSnapshot.snapshot_path(intervals_number, radius, path)
+        try:
+            with open(os.path.join(snapshot_path, INDEX_FILE), "r") as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+        if index.get("version") != equation_version():
+            return None
+        if not all(os.path.isfile(os.path.join(snapshot_path, f"{section}.pickle"))
+                   for section in (EQUATIONS_SECTION, VARIABLES_SECTION, COEFFICIENTS_SECTION)):
+            return None
+        return SymbolicSnapshot(snapshot_path, intervals_number, radius)
+
+    @staticmethod
+    def create(eq_system: EquationSystem, path: str = DEFAULT_SNAPSHOT_PATH) -> "SymbolicSnapshot":
+        r"""
+        Saves the equations, variables and coefficients of the system. The matrix sections are created on demand.
+        """
+        snapshot = SymbolicSnapshot(SymbolicSnapshot.snapshot_path(eq_system.N, eq_system.R, path),
+                                    eq_system.N, eq_system.R)
+        os.makedirs(snapshot.path, exist_ok=True)
+
+        # stale sections are removed before the new index is written
+        for name in os.listdir(snapshot.path):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(snapshot.path, name))
+
+        snapshot.__save(EQUATIONS_SECTION, encode_expressions(eq_system.ordered_equations()))
+        snapshot.__save(VARIABLES_SECTION, list(eq_system.ordered_variables()))
+        snapshot.__save(COEFFICIENTS_SECTION, dict(eq_system.coefficients()))
+        snapshot.__write_file(INDEX_FILE, json.dumps({
+            "version": equation_version(),
+            "n": eq_system.N,
+            "radius": eq_system.R,
+        }).encode())
+        return snapshot
+
+    def __write_file(self, name: str, content: bytes) -> None:
+        # file is written under the temporary name and renamed, so that it is never read partially
+        temporary_path = os.path.join(self.path, f"{name}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(content)
+        os.replace(temporary_path, os.path.join(self.path, name))
+
+    def __save(self, section: str, value: Any) -> None:
+        self.__write_file(f"{section}.pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def __load(self, section: str) -> Any:
+        try:
+            with open(os.path.join(self.path, f"{section}.pickle"), "rb") as file:
+                return pickle.load(file)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as error:
+            raise SnapshotSectionError(self.path, section) from error
+
+    def __load_system_section(self, section: str) -> Any:
+        r"""
+        Loads the section of the system. If it is missing or corrupted, then the snapshot is rebuilt
+        from EquationSystem, the same way as the missing snapshot (see acquire_snapshot).
+        """
+        try:
+            return self.__load(section)
+        except SnapshotSectionError:
+            SymbolicSnapshot.create(EquationSystem.acquire_equation_system(intervals_number=self.N, radius=self.R),
+                                    os.path.dirname(self.path))
+            return self.__load(section)
+
+    def ordered_equations(self) -> Sequence[Expr]:
+        if EQUATIONS_SECTION not in self.__sections:
+            self.__sections[EQUATIONS_SECTION] = decode_expressions(*self.__load_system_section(EQUATIONS_SECTION))
+        return self.__sections[EQUATIONS_SECTION]
+
+    def ordered_variables(self) -> Sequence[Symbol]:
+        if VARIABLES_SECTION not in self.__sections:
+            self.__sections[VARIABLES_SECTION] = self.__load_system_section(VARIABLES_SECTION)
+        return self.__sections[VARIABLES_SECTION]
+
+    def coefficients(self) -> Dict[Symbol, complex]:
+        if COEFFICIENTS_SECTION not in self.__sections:
+            self.__sections[COEFFICIENTS_SECTION] = self.__load_system_section(COEFFICIENTS_SECTION)
+        return self.__sections[COEFFICIENTS_SECTION]
+
+    def __save_matrix(self, section: str, A: Matrix, b: Matrix) -> None:
+        positions = list(A.todok().keys())
+        self.__save(section, (A.shape, positions, *encode_expressions([A[p] for p in positions] + list(b))))
+
+    def __load_matrix(self, section: str) -> Optional[Tuple[Matrix, Matrix]]:
+        try:
+            stored = self.__load(section)
+        except SnapshotSectionError:
+            return None
+
+        shape, positions, nodes, roots = stored
+        values = decode_expressions(nodes, roots)
+        A = zeros(*shape)
+        for (i, j), value in zip(positions, values[:len(positions)]):
+            A[i, j] = value
+        return A, Matrix(values[len(positions):])
+
+    def matrix(self) -> Tuple[Matrix, Matrix]:
+        r"""
+        Returns the symbolic matrix A and vector b of the system (see sympy.linear_eq_to_matrix).
+        If the matrix section does not exist yet, it is calculated and saved.
+        """
+        if MATRIX_SECTION not in self.__sections:
+            matrix = self.__load_matrix(MATRIX_SECTION)
+            if matrix is None:
+                matrix = linear_eq_to_matrix(self.ordered_equations(), *self.ordered_variables())
+                self.__save_matrix(MATRIX_SECTION, *matrix)
+            self.__sections[MATRIX_SECTION] = matrix
+        return self.__sections[MATRIX_SECTION]
+
+    def evaluated_matrix(self) -> Tuple[Matrix, Matrix]:
+        r"""
+        Returns the matrix A and vector b of the system with the coefficients substituted.
+        If the evaluated matrix section does not exist yet, it is calculated and saved.
+        """
+        if EVALUATED_MATRIX_SECTION not in self.__sections:
+            matrix = self.__load_matrix(EVALUATED_MATRIX_SECTION)
+            if matrix is None:
+                A, b = self.matrix()
+                matrix = A.subs(self.coefficients()), b.subs(self.coefficients())
+                self.__save_matrix(EVALUATED_MATRIX_SECTION, *matrix)
+            self.__sections[EVALUATED_MATRIX_SECTION] = matrix
+        return self.__sections[EVALUATED_MATRIX_SECTION]
+
+
+def acquire_snapshot(intervals_number: int,
+                     radius: float = DEFAULT_RADIUS,
+                     path: str = DEFAULT_SNAPSHOT_PATH) -> SymbolicSnapshot:
+    r"""
+    Opens the snapshot of the system, or builds the system and creates the snapshot, if there is no valid one.
+    """
+    snapshot = SymbolicSnapshot.open(intervals_number, radius, path)
+    if snapshot is None:
+        snapshot = SymbolicSnapshot.create(EquationSystem.acquire_equation_system(intervals_number=intervals_number,
+                                                                                  radius=radius), path)
+    return snapshot
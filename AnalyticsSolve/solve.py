@@ -5,32 +5,84 @@ the original system using either Sympy, or Numpy library.
 @author: shvatov
 """
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import List, Dict, Sequence
+from typing import List, Dict, Sequence, Optional, Tuple
 
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import spsolve, splu
 from sympy import linear_eq_to_matrix, init_printing, Expr, Symbol, Matrix
 from sympy.printing import pprint
-from sympy.solvers import solve
 
 from analysis import analyse_matrix, MatrixAnalysisParams
+from assembly import BlockTridiagonalSystem, assemble_sparse_system, assemble_blocks, ordered_variable_names, \
+    symbol_coefficients
+from backends import DEFAULT_PROFILE_PATH, BackendParams, SparseOrdering, TimingProfile, select_backend
+from banded import BandedFactorization, VariableOrdering, factorize_banded_system
+from block_tridiagonal import factorize_block_tridiagonal
+from cache import ArtifactCache, parameters_key, system_key
 from cli import prepare_parser
-from equation import EquationSystem
+from condition import ConditionEstimate, FactorizedSolve, dense_factorized_solve, estimate_condition
+from conjugate import solve_conjugate_symmetric
+from equation import EquationSystem, DEFAULT_RADIUS
+from krylov import KrylovMethod, KrylovParams, PreconditionerKind, solve_krylov
+from mixed import MixedPrecisionParams, RefinementMethod, ResidualPrecision, solve_mixed_precision
+from multigrid import CycleType, MultigridParams, MultigridSolver
+from multiprecision import DEFAULT_PRECISION, solve_multiprecision
+from parallel import solve_block_tridiagonal_parallel
 from plot import plot_solution
+from registry import REGISTRY
+from scaling import ScaledSystem, ScalingParams, scale_system
+from snapshot import SymbolicSnapshot, acquire_snapshot
+from streaming import assemble_streamed_system
 
 DELTA = 1e-10
+# options of the command line, which define the Krylov parameters
+KRYLOV_OPTIONS = ("krylov_method", "preconditioner", "matrix_free", "rtol", "atol", "restart", "maxiter")
 
 
 class SolutionMethod(Enum):
     """
     Enum class, which defines what type of the approach will
-    be used in order to solve the system. Either use sympy.solvers.solve with
-    the analytics equation system, or calculate the Jacobian and solve system
-    Ax = b using np.linalg.solve.
+    be used in order to solve the system. Either solve the analytics equation system
+    in the arbitrary precision using the banded Gaussian elimination (see multiprecision),
+    or calculate the Jacobian and solve system Ax = b using np.linalg.solve.
+    SPARSE method assembles the sparse matrix A numerically, without building the symbolic equation system,
+    and solves it using scipy.sparse.linalg.spsolve.
+    STREAMING method builds the symbolic equations point by point, converts them into the sparse
+    matrix immediately and solves it the same way as SPARSE. CONJUGATE method assembles the system
+    the same way as SPARSE, but solves the equivalent real system of the half size, which is obtained
+    using Ro(i, j)* = conj(Ro(i, j)). BLOCK_TRIDIAGONAL method assembles the 8x8 blocks of the system
+    numerically and solves it using the block LU decomposition (block Thomas algorithm) in O(N) time and memory.
+    BANDED method assembles the system the same way as SPARSE, converts it into the compact band storage
+    (optionally reordering the unknowns, see banded.VariableOrdering) and solves it using LAPACK zgbsv.
+    PARALLEL method assembles the blocks the same way as BLOCK_TRIDIAGONAL and solves the system using
+    the partitioned Schur complement method in the pool of processes (see parallel).
+    KRYLOV method solves the system iteratively using the preconditioned GMRES or BiCGSTAB with either
+    the assembled sparse matrix, or the matrix-free operator based on the discrepancy function (see krylov).
+    MULTIGRID method assembles the blocks the same way as BLOCK_TRIDIAGONAL and solves the system using
+    the geometric multigrid V or W cycles with the block-Jacobi smoother (see multigrid).
+    MIXED method factorizes the matrix in the single precision and improves the solution using the iterative
+    refinement with the residuals calculated in the double or the extended precision (see mixed).
+    AUTO method assembles the blocks the same way as BLOCK_TRIDIAGONAL and solves the system using the backend
+    selected by N, the number of the non-zero elements and the timing profile of the machine (see backends).
     """
     SYMPY = 1
     NUMPY = 2
+    SPARSE = 3
+    STREAMING = 4
+    CONJUGATE = 5
+    BLOCK_TRIDIAGONAL = 6
+    BANDED = 7
+    PARALLEL = 8
+    KRYLOV = 9
+    MULTIGRID = 10
+    MIXED = 11
+    AUTO = 12
+
+    def is_symbolic(self) -> bool:
+        return self in (SolutionMethod.SYMPY, SolutionMethod.NUMPY)
 
 
 @dataclass
@@ -43,31 +95,50 @@ class EquationSystemSolutionParams:
     verbose_output: bool = False
     check_basic_conditions: bool = False
     n: int = 4
+    radius: float = DEFAULT_RADIUS
     plot_real_part: bool = False
     analysis_params: MatrixAnalysisParams = None
-
-
-def solve_sympy(equations: Sequence[Expr],
-                variables: Sequence[Symbol],
-                coefficients: Dict[Symbol, complex]) -> Dict[str, complex]:
+    cache: Optional[ArtifactCache] = None
+    snapshot: Optional[SymbolicSnapshot] = None
+    ordering: VariableOrdering = VariableOrdering.POINT_MAJOR
+    processes: Optional[int] = None
+    krylov_params: KrylovParams = None
+    multigrid_params: MultigridParams = None
+    mixed_precision_params: MixedPrecisionParams = None
+    scaling: Optional[ScalingParams] = None
+    precision: int = DEFAULT_PRECISION
+    estimate_rcond: bool = False
+    backend_params: BackendParams = None
+    profile_path: str = DEFAULT_PROFILE_PATH
+
+
+def solve_sympy(variables: Optional[Sequence[Symbol]],
+                intervals_number: int,
+                radius: float = DEFAULT_RADIUS,
+                precision: int = DEFAULT_PRECISION,
+                coefficients: Optional[Dict[str, complex]] = None) -> Dict[str, complex]:
     """
-    Solves the given system with given variables using sympy.solve.
+    Solves the system in the arbitrary precision, see multiprecision.solve_multiprecision.
     Parameters
     ----------
-    equations - list of expressions, that represent the equations system.
-    variables - list of variables, used in the equations system.
-    coefficients - list of the provided coefficients
+    variables - list of variables, used in the equations system, in the order of EquationSystem.ordered_variables(),
+    by default the names of the variables are generated (see assembly.ordered_variable_names).
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    precision - number of the significant decimal digits used in the calculations.
+    coefficients - values of the coefficients, which override the default ones.
 
     Returns
     -------
-    Dictionary, where key is the name of the variable and value is its solution.
+    Dictionary, where key is the name of the variable and value is its solution, in the order of the variables.
     """
-    sub_equations = [eq.subs(coefficients) for eq in equations]
-    sol = solve(sub_equations, *variables)
+    solution = solve_multiprecision(intervals_number, radius, precision, coefficients)
+    names = [str(v) for v in variables] if variables is not None else ordered_variable_names(intervals_number)
+    assert len(solution) == len(names), "Variables do not correspond to the mesh"
 
     result = dict()
-    for k, v in sol.items():
-        result[str(k)] = complex(*v.as_real_imag())
+    for k, v in zip(names, solution):
+        result[k] = complex(v)
     return result
 
 
@@ -88,10 +159,113 @@ def solve_numpy(A: Matrix, b: Matrix) -> List[np.cdouble]:
     return np.linalg.solve(_A, _b)
 
 
-def solve_system(equations: Sequence[Expr],
-                 variables: Sequence[Symbol],
-                 coefficients: Dict[Symbol, complex],
-                 params: EquationSystemSolutionParams = None) -> List[complex]:
+def solve_sparse(A: csr_matrix, b: np.ndarray, ordering: SparseOrdering = SparseOrdering.COLAMD) -> np.ndarray:
+    """
+    Solves the given equation system represented as Ax = b using sparse LU decomposition.
+    Parameters
+    ----------
+    A - sparse matrix of coefficients of the variables.
+    b - right-side vector.
+    ordering - fill-reducing ordering of the columns, see backends.SparseOrdering.
+
+    Returns
+    -------
+    Vector of complex solutions of the system.
+    """
+    return spsolve(A.tocsc(), b, permc_spec=ordering.name)
+
+
+def factorize_sparse_cached(A: csr_matrix, cache: ArtifactCache, key: str) -> BandedFactorization:
+    """
+    Returns the banded LU factorization of A stored in the cache (if any), otherwise calculates and stores
+    the new one (see cache.ArtifactCache.load_factorization).
+    """
+    factorization = cache.load_factorization(key)
+    if factorization is not None:
+        return factorization
+
+    factorization, _ = factorize_banded_system(A)
+    cache.store_factorization(key, factorization)
+    return factorization
+
+
+def solve_sparse_cached(A: csr_matrix, b: np.ndarray, cache: ArtifactCache, key: str) -> np.ndarray:
+    """
+    Solves the given equation system using the banded LU factorization of A stored in the cache (if any)
+    and stores the new one otherwise.
+    """
+    return factorize_sparse_cached(A, cache, key).solve(b)
+
+
+def solution_artifact(params: EquationSystemSolutionParams) -> str:
+    """
+    Returns the name of the cached solution of the numeric method: the name of the method and the hash
+    of the parameters, which affect its solution (see cache.parameters_key).
+    """
+    method_parameters = {
+        SolutionMethod.SPARSE: (params.backend_params,),
+        SolutionMethod.STREAMING: (params.backend_params,),
+        SolutionMethod.BANDED: (params.ordering,),
+        SolutionMethod.KRYLOV: (params.krylov_params,),
+        SolutionMethod.MULTIGRID: (params.multigrid_params,),
+        SolutionMethod.MIXED: (params.mixed_precision_params,),
+        SolutionMethod.AUTO: (params.backend_params, params.krylov_params),
+    }
+    return f"{params.method.name.lower()}-{parameters_key(params.scaling, *method_parameters.get(params.method, ()))}"
+
+
+def estimate_system_condition(params: EquationSystemSolutionParams,
+                              factorized_solve: Optional[FactorizedSolve],
+                              matrix: Optional[csr_matrix],
+                              block_system: Optional[BlockTridiagonalSystem]) -> ConditionEstimate:
+    """
+    Estimates the condition number of the solved matrix reusing the factorization of the solver (if any).
+    The methods, which do not factorize the matrix in double precision, require the extra block LU decomposition
+    (or the sparse one, if only the sparse matrix is available), which is still O(N).
+    """
+    reused = factorized_solve is not None
+    if not reused and matrix is not None:
+        factorized_solve = splu(matrix.tocsc()).solve
+    elif not reused:
+        if block_system is None:
+            block_system = assemble_blocks(intervals_number=params.n, radius=params.radius)
+        factorized_solve = factorize_block_tridiagonal(block_system).solve
+    if matrix is None:
+        matrix = block_system.to_csr()
+
+    condition = estimate_condition(factorized_solve, matrix)
+    print(f"Condition number (1-norm estimation, {'reused' if reused else 'extra'} factorization, "
+          f"{condition.solves} solves): {condition.condition_number}, rcond = {condition.rcond}")
+    return condition
+
+
+def prepare_scaled_system(params: EquationSystemSolutionParams,
+                          block_system: Optional[BlockTridiagonalSystem]) -> ScaledSystem:
+    """
+    Scales the system assembled for the given numeric method, see scaling.
+    """
+    assert not params.method.is_symbolic(), "Scaling is available for the numeric methods only"
+    assert params.method != SolutionMethod.MULTIGRID, \
+        "Multigrid requires the smooth unknowns, which are destroyed by the equilibration"
+    assert params.method != SolutionMethod.KRYLOV or params.krylov_params is None \
+           or not params.krylov_params.matrix_free, "Matrix-free operator cannot be scaled"
+
+    if block_system is None:
+        block_system = assemble_blocks(intervals_number=params.n, radius=params.radius)
+    scaled_system, report = scale_system(block_system, params.scaling)
+    print(f"Scaling: time scale {report.time_scale}, {report.iterations} equilibration iterations, "
+          f"row scales [{report.row_scale_range[0]}; {report.row_scale_range[1]}], "
+          f"column scales [{report.column_scale_range[0]}; {report.column_scale_range[1]}]")
+    if params.scaling.estimate_condition:
+        print(f"Condition number (1-norm estimation): {report.condition_before} before scaling, "
+              f"{report.condition_after} after scaling")
+    return scaled_system
+
+
+def solve_system(equations: Optional[Sequence[Expr]],
+                 variables: Optional[Sequence[Symbol]],
+                 coefficients: Optional[Dict[Symbol, complex]],
+                 params: EquationSystemSolutionParams = None) -> Tuple[List[complex], Optional[ConditionEstimate]]:
     """
     Solves the given system.
     Parameters
@@ -101,15 +275,21 @@ def solve_system(equations: Sequence[Expr],
     coefficients - dictionary, were key is the symbol, which represents the coefficient,
     and value is its value.
     params - function call parameters, see EquationSystemSolutionParams for more info.
+    If the method is not symbolic (see SolutionMethod.is_symbolic), then equations, variables and coefficients
+    are not used and can be omitted: the system is assembled numerically using params.n and params.radius.
+    SYMPY assembles the system from the stencil templates (see multiprecision) using params.n, params.radius
+    and the given coefficients (the default ones, if omitted), the equations are used only by NUMPY, by the verbose
+    output and by the analysis of the matrix (see MatrixAnalysisParams.is_required).
 
     Returns
     -------
-    The solution vector.
+    Tuple of the solution vector and the estimation of the condition number of the solved matrix,
+    if params.estimate_rcond is set (see condition), otherwise None.
     """
     if params is None:
-        return list()
+        return list(), None
 
-    if params.verbose_output:
+    if params.verbose_output and params.method.is_symbolic():
         init_printing(use_unicode=False, wrap_line=False)
 
         print("Constant coefficients / variables:")
@@ -123,11 +303,15 @@ def solve_system(equations: Sequence[Expr],
         print("\nVariables:")
         pprint(variables)
 
+    analysis_required = params.analysis_params is not None and params.analysis_params.is_required()
     A, b = None, None
-    if params.verbose_output \
-            or params.analysis_params is not None \
-            or params.method == SolutionMethod.NUMPY:
-        A, b = linear_eq_to_matrix(equations, *variables)
+    if params.method.is_symbolic() and (params.verbose_output
+                                        or analysis_required
+                                        or params.method == SolutionMethod.NUMPY):
+        if params.snapshot is not None:
+            A, b = params.snapshot.matrix()
+        else:
+            A, b = linear_eq_to_matrix(equations, *variables)
         if params.verbose_output:
             print("\nMatrix A:")
             pprint(A)
@@ -136,7 +320,10 @@ def solve_system(equations: Sequence[Expr],
             pprint(b)
 
     if A is not None and b is not None:
-        A, b = A.subs(coefficients), b.subs(coefficients)
+        if params.snapshot is not None:
+            A, b = params.snapshot.evaluated_matrix()
+        else:
+            A, b = A.subs(coefficients), b.subs(coefficients)
         if params.verbose_output:
             print("\nEvaluated matrix A:")
             pprint(A)
@@ -144,29 +331,206 @@ def solve_system(equations: Sequence[Expr],
             print("\nEvaluated vector b:")
             pprint(b)
 
-    if params.analysis_params is not None:
+    # artifacts of the numeric methods are stored in the cache (if any), symbolic methods are not cached
+    cache_key, solution = None, None
+    if params.cache is not None and not params.method.is_symbolic():
+        cache_key = system_key(intervals_number=params.n, radius=params.radius)
+        solution = params.cache.load_solution(cache_key, solution_artifact(params))
+
+    sparse_A, sparse_b = None, None
+    if params.method in (SolutionMethod.SPARSE, SolutionMethod.STREAMING, SolutionMethod.CONJUGATE,
+                         SolutionMethod.BANDED) \
+            and (solution is None or analysis_required):
+        if cache_key is not None:
+            sparse_A, sparse_b = params.cache.load_system(cache_key) or (None, None)
+        if sparse_A is None and params.method != SolutionMethod.STREAMING:
+            sparse_A, sparse_b = assemble_sparse_system(intervals_number=params.n, radius=params.radius)
+        elif sparse_A is None:
+            sparse_A, sparse_b = assemble_streamed_system(intervals_number=params.n, radius=params.radius)
+        if cache_key is not None:
+            params.cache.store_system(cache_key, sparse_A, sparse_b)
+        if analysis_required:
+            A = Matrix(sparse_A.toarray())
+
+    block_system = None
+    if params.method in (SolutionMethod.BLOCK_TRIDIAGONAL, SolutionMethod.PARALLEL, SolutionMethod.MULTIGRID,
+                         SolutionMethod.MIXED, SolutionMethod.AUTO) \
+            and (solution is None or analysis_required):
+        block_system = assemble_blocks(intervals_number=params.n, radius=params.radius)
+        if analysis_required:
+            A = Matrix(block_system.to_csr().toarray())
+
+    if params.analysis_params is not None and A is not None:
         analyse_matrix(A, params.analysis_params)
 
-    solution = None
-    if params.method == SolutionMethod.SYMPY:
-        solution = solve_sympy(equations, variables, coefficients)
+    # the scaled system is solved instead of the original one, the analysis is applied to the original matrix
+    scaled_system = None
+    if params.scaling is not None and solution is None:
+        scaled_system = prepare_scaled_system(params, block_system)
+        if block_system is not None:
+            block_system = scaled_system.system
+        if sparse_A is not None:
+            sparse_A, sparse_b = scaled_system.scale_sparse(sparse_A, sparse_b)
+
+    backend_params = params.backend_params if params.backend_params is not None else BackendParams()
+    # factorization of the solved matrix, which is reused by the estimation of the condition number
+    factorized_solve, condition_matrix = None, sparse_A
+    # the iterative solutions are cached only, if they are converged and max(abs(b - Ax)) <= DELTA,
+    # the residual of the scaled system is replaced with the residual of the original one
+    converged, residual_norm = True, None
+    if solution is not None:
         if params.verbose_output:
-            print("Sympy solution:")
+            print("Cached solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.SYMPY:
+        solution = solve_sympy(variables, params.n, params.radius, params.precision,
+                               symbol_coefficients(coefficients) if coefficients is not None else None)
+        if params.verbose_output:
+            print(f"Arbitrary-precision solution ({params.precision} digits):")
             for k, v in solution.items():
                 print(f"{k} = {v}")
-        solution = solution.values()
+        solution = list(solution.values())
     elif params.method == SolutionMethod.NUMPY:
-        solution = solve_numpy(A, b)
+        if params.estimate_rcond:
+            dense_A = np.array(A).astype(np.cdouble)
+            factorized_solve, condition_matrix = dense_factorized_solve(dense_A), csr_matrix(dense_A)
+            solution = factorized_solve(np.array(b).astype(np.cdouble), "N")
+        else:
+            solution = solve_numpy(A, b)
         if params.verbose_output:
             print("Numpy solution:")
             for i, v in enumerate(solution):
                 print(f"V{i} = {v}")
+    elif params.method in (SolutionMethod.SPARSE, SolutionMethod.STREAMING):
+        if cache_key is not None and scaled_system is None:
+            factorized_solve = factorize_sparse_cached(sparse_A, params.cache, cache_key).solve
+            solution = factorized_solve(sparse_b)
+        elif params.estimate_rcond:
+            factorized_solve = splu(sparse_A.tocsc(), permc_spec=backend_params.sparse_ordering.name).solve
+            solution = factorized_solve(sparse_b)
+        else:
+            solution = solve_sparse(sparse_A, sparse_b, backend_params.sparse_ordering)
+        if params.verbose_output:
+            print("Sparse solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.CONJUGATE:
+        solution = solve_conjugate_symmetric(sparse_A, sparse_b, check_symmetry=params.check_basic_conditions)
+        if params.verbose_output:
+            print("Conjugate-symmetric solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.BLOCK_TRIDIAGONAL:
+        factorized_solve = factorize_block_tridiagonal(block_system).solve
+        solution = factorized_solve(block_system.rhs_vector())
+        if params.verbose_output:
+            print("Block-tridiagonal solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.PARALLEL:
+        solution = solve_block_tridiagonal_parallel(block_system, processes=params.processes)
+        if params.verbose_output:
+            print("Parallel block-tridiagonal solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.KRYLOV:
+        krylov_params = params.krylov_params
+        if scaled_system is not None:
+            # max|b - Ax| <= DELTA is guaranteed, when max|Dr (b - Ax)| <= DELTA min(Dr)
+            krylov_params = replace(krylov_params or KrylovParams(), tolerance=DELTA * scaled_system.row_scale.min())
+        solution, report = solve_krylov(intervals_number=params.n, radius=params.radius, params=krylov_params,
+                                        system=scaled_system.system if scaled_system is not None else None)
+        converged, residual_norm = report.converged, report.residual_norm
+        if params.verbose_output:
+            print(f"Krylov solver: {report.method.name}, preconditioner {report.preconditioner.name}, "
+                  f"{'matrix-free' if report.matrix_free else 'assembled'} operator, "
+                  f"{report.iterations} iterations, converged - {report.converged}")
+            if report.residual_history:
+                print(f"Residual history: first {report.residual_history[0]}, "
+                      f"min {min(report.residual_history)}, last {report.residual_history[-1]}")
+            for i, norm in enumerate(report.residual_history):
+                print(f"Iteration {i + 1}: residual {norm}")
+            print("Krylov solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.MULTIGRID:
+        solution, report = MultigridSolver(block_system, params=params.multigrid_params).solve()
+        converged, residual_norm = report.converged, report.residual_norm
+        if params.verbose_output:
+            print(f"Multigrid solver: {report.cycle.name} cycles, {len(report.levels)} levels "
+                  f"(N = {', '.join(str(n) for n in report.levels)}), {report.iterations} cycles, "
+                  f"convergence factor {report.convergence_factor}, converged - {report.converged}, "
+                  f"backward error {report.backward_error}")
+            for i, norm in enumerate(report.residual_history):
+                print(f"Cycle {i + 1}: residual {norm}")
+            print("Multigrid solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.MIXED:
+        mixed_precision_params = params.mixed_precision_params
+        if scaled_system is not None:
+            # max|b - Ax| <= DELTA is guaranteed, when max|Dr (b - Ax)| <= DELTA min(Dr)
+            mixed_precision_params = replace(mixed_precision_params or MixedPrecisionParams(),
+                                             tolerance=DELTA * scaled_system.row_scale.min())
+        solution, report = solve_mixed_precision(block_system, params=mixed_precision_params)
+        converged, residual_norm = report.converged, report.residual_norm
+        if params.verbose_output:
+            print(f"Mixed-precision solver: {report.refinement.name} refinement, "
+                  f"{report.residual_precision.name} residuals, {report.factorization_size} bytes of the LU factors, "
+                  f"{report.steps} steps, converged - {report.converged}")
+            print(f"Time: factorization {report.factorization_time:.3f} s, refinement {report.refinement_time:.3f} s"
+                  + (f", double-precision solution {report.double_time:.3f} s" if report.double_time is not None
+                     else ""))
+            for i, (error, iterations) in enumerate(zip(report.backward_errors, report.inner_iterations)):
+                print(f"Step {i + 1}: backward error {error}, {iterations} inner iterations")
+            print("Mixed-precision solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+    elif params.method == SolutionMethod.BANDED:
+        factorization, report = factorize_banded_system(sparse_A, ordering=params.ordering)
+        factorized_solve, solution = factorization.solve, factorization.solve(sparse_b)
+        if params.verbose_output:
+            print(f"Banded solver: ordering {report.ordering.name}, "
+                  f"bandwidth {report.lower_bandwidth} (lower) / {report.upper_bandwidth} (upper), "
+                  f"{report.non_zero} non-zero elements, {report.band_storage} elements in the band storage, "
+                  f"fill {report.fill}")
+            print("Banded solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+
+    elif params.method == SolutionMethod.AUTO:
+        profile = TimingProfile.load(params.profile_path)
+        backend, profiled = select_backend(block_system.intervals_number, block_system.to_csr().nnz, profile)
+        print(f"Selected backend: {backend.name} - {backend.description} "
+              f"({'timing profile' if profiled else 'no timing profile of the machine, default selection'})")
+        solution = backend.solve(block_system, backend_params if params.krylov_params is None
+                                 else replace(backend_params, krylov_params=params.krylov_params))
+        if params.verbose_output:
+            print("Auto-selected backend solution:")
+            for i, v in enumerate(solution):
+                print(f"V{i} = {v}")
+
+    condition = None
+    if params.estimate_rcond:
+        condition = estimate_system_condition(params, factorized_solve, condition_matrix,
+                                              scaled_system.system if scaled_system is not None else block_system)
+
+    if scaled_system is not None:
+        solution = scaled_system.unscale(solution)
+        residual_norm = scaled_system.residual_norm(solution)
+    if residual_norm is not None:
+        print(f"Max(abs(b - Ax)) = {residual_norm}, less than 10^(-10) - {residual_norm < DELTA}")
+
+    if cache_key is not None and converged and (residual_norm is None or residual_norm <= DELTA):
+        params.cache.store_solution(cache_key, solution_artifact(params), solution)
 
     if params.check_basic_conditions:
         N = params.n
+        variable_names = [str(v) for v in variables] if variables is not None else ordered_variable_names(N)
         value_by_variable = dict()
         for i, v in enumerate(solution):
-            value_by_variable[str(variables[i])] = v
+            value_by_variable[variable_names[i]] = v
 
         values_by_function = dict()
         for var, v in value_by_variable.items():
@@ -213,7 +577,7 @@ def solve_system(equations: Sequence[Expr],
         print(f"Max(Ro(i, j)[k] - *Ro(i, j)c[k]) = {max_diff}, "
               f"less than 10^(-10) - {abs(max_diff) < DELTA}")
 
-    return solution
+    return solution, condition
 
 
 if __name__ == '__main__':
@@ -225,19 +589,64 @@ if __name__ == '__main__':
                                           check_basic_conditions=args.check,
                                           n=args.n,
                                           plot_real_part=args.plot,
+                                          ordering=VariableOrdering(args.ordering),
+                                          processes=args.processes,
+                                          precision=args.precision,
+                                          estimate_rcond=args.rcond,
+                                          backend_params=BackendParams(
+                                              sparse_ordering=SparseOrdering(args.sparse_ordering)),
+                                          profile_path=args.profile_path,
+                                          # AUTO gets the Krylov parameters only when they are set explicitly,
+                                          # otherwise the iterative backend uses its own defaults, see backends
+                                          krylov_params=KrylovParams(
+                                              method=KrylovMethod(args.krylov_method),
+                                              preconditioner=PreconditionerKind(args.preconditioner)
+                                              if args.preconditioner is not None else None,
+                                              matrix_free=args.matrix_free,
+                                              rtol=args.rtol,
+                                              atol=args.atol,
+                                              restart=args.restart,
+                                              maxiter=args.maxiter,
+                                          ) if SolutionMethod(args.method) != SolutionMethod.AUTO
+                                          or any(getattr(args, option) != parser.get_default(option)
+                                                 for option in KRYLOV_OPTIONS) else None,
+                                          multigrid_params=MultigridParams(cycle=CycleType(args.cycle)),
+                                          scaling=ScalingParams(time_scale=args.time_scale,
+                                                                equilibrate=args.equilibrate)
+                                          if args.scaling else None,
+                                          mixed_precision_params=MixedPrecisionParams(
+                                              refinement=RefinementMethod(args.refinement),
+                                              residual_precision=ResidualPrecision.EXTENDED
+                                              if args.extended_residual else ResidualPrecision.DOUBLE,
+                                              compare_double=args.compare_double,
+                                          ),
                                           analysis_params=MatrixAnalysisParams(
                                               print_matrix=args.verbose,
                                               compare_with_fortran=args.fortran,
                                               compare_with_discrepancy=args.discrepancy,
-                                              calc_cond_number=args.rcond,
-                                          ))
+                                          ),
+                                          cache=ArtifactCache(path=args.cache_path,
+                                                              size_limit=args.cache_size_limit * (1 << 20))
+                                          if args.cache else None)
     print(f"Params: \n{params}\n")
-    equation_system = EquationSystem.acquire_equation_system(intervals_number=params.n)
-    equation_system.ordered_equations()
-    solution = solve_system(equations=equation_system.ordered_equations(),
-                            variables=equation_system.ordered_variables(),
-                            coefficients=equation_system.coefficients(),
-                            params=params)
+    REGISTRY.set_memory_budget(args.memory_budget * (1 << 20))
+    # SYMPY does not use the symbolic equations, unless they are printed or analysed
+    if params.method == SolutionMethod.NUMPY or params.method.is_symbolic() and (params.verbose_output
+                                                                              or params.analysis_params.is_required()):
+        if args.snapshot:
+            params.snapshot = acquire_snapshot(intervals_number=params.n, radius=params.radius,
+                                               path=args.snapshot_path)
+        equation_system = params.snapshot if params.snapshot is not None \
+            else EquationSystem.acquire_equation_system(intervals_number=params.n)
+        solution, _ = solve_system(equations=equation_system.ordered_equations(),
+                                   variables=equation_system.ordered_variables(),
+                                   coefficients=equation_system.coefficients(),
+                                   params=params)
+    else:
+        solution, _ = solve_system(equations=None, variables=None, coefficients=None, params=params)
+
+    if params.verbose_output:
+        print(f"\nIn-process cache: {REGISTRY.statistics()}")
 
     if params.plot_real_part:
         plot_solution(solution)
@@ -0,0 +1,244 @@
+r"""
+This module contains the calculation of the coherent population trapping (CPT) resonance spectrum: the solutions
+of the system for many pairs of the detunings (Delta1, Delta2) and the observables integrated over the cross-section
+of the cell, as the functions of the two-photon detuning Delta2 - Delta1. It can be used as a standalone application.
+
+The detunings enter only the relaxation terms (the denominators of Ro13, Ro23 and the decay of Ro12), thus
+the systems of all pairs share the mesh, the diffusion blocks and the right side, and differ only in the diagonal
+blocks of the internal points. Moreover, the diagonal blocks are affine in five functions of the detunings
+(see calculate_detuning_functions). Thus the system is assembled once (see assembly.assemble_blocks) together
+with the changes of its diagonal blocks per unit change of each function, the diagonal blocks of the whole batch
+of the pairs are their linear combinations calculated at once, and the batch is solved by the block LU decomposition
+vectorized over the pairs (see block_tridiagonal.solve_block_tridiagonal_batch). The pairs are processed
+in the batches, which fit into the memory limit.
+
+The observables are averaged over the cross-section of the cell with the weight r (trapezoidal rule):
+- populations <Ro11>, <Ro22>, <Ro33> (the excited population Ro33 defines the fluorescence, which has the dark
+  resonance at Delta2 - Delta1 = 0);
+- ground-state coherence <Ro12>;
+- absorption of the fields <Im(conj(omega_j) Ro_j3)>, which is proportional to the absorbed power.
+
+Usage: python spectrum.py [N] [number of the detunings] [max two-photon detuning]
+
+@author: shvatov
+"""
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from assembly import SYSTEM_VAR_NUM, BlockTridiagonalSystem, MeshValues, assemble_blocks, calculate_omega, \
+    calculate_optical_coherences, calculate_relaxation_terms, cell_weights, cross_section_weights, \
+    prepare_coefficients
+from block_tridiagonal import solve_block_tridiagonal, solve_block_tridiagonal_batch
+from equation import DEFAULT_RADIUS
+
+# Default limit of the memory in bytes used by the diagonal blocks of a single batch
+DEFAULT_BATCH_MEMORY = 256 * 2 ** 20
+
+# Changes of the detunings (Delta1, Delta2) in the units of Gamma, which identify the detuning dependent terms
+# of the diagonal blocks (see prepare_detuning_basis)
+DETUNING_PROBES = ((0.5, 0.0), (-1.0, 0.0), (0.0, 0.5), (0.0, -1.0), (1.0, -1.0))
+
+
+@dataclass
+class Spectrum:
+    """
+    Solutions and observables for each pair of the detunings.
+
+    delta_1, delta_2 - arrays (K) of the detunings.
+    profiles - array (K, 8, N + 1) of the values of the functions Ro11, ..., Ro12* in the points of the mesh
+    (None if the profiles are not kept).
+    populations - array (K, 3) of <Ro11>, <Ro22>, <Ro33>.
+    coherence - array (K) of <Ro12>.
+    absorption - array (K, 2) of the absorption of the fields 1 and 2.
+    """
+    delta_1: np.ndarray
+    delta_2: np.ndarray
+    profiles: Optional[np.ndarray]
+    populations: np.ndarray
+    coherence: np.ndarray
+    absorption: np.ndarray
+
+    @property
+    def two_photon_detuning(self) -> np.ndarray:
+        return self.delta_2 - self.delta_1
+
+
+def calculate_detuning_functions(coefficients: Dict[str, complex],
+                                 delta_1: np.ndarray,
+                                 delta_2: np.ndarray) -> np.ndarray:
+    r"""
+    Returns the array (K, 5) of the functions of the detunings, which enter the relaxation terms linearly:
+    Gamma / (i Delta1 + Gamma), Gamma / (-i Delta1 + Gamma) (denominators of Ro13, Ro13*), the same functions
+    of Delta2 (denominators of Ro23, Ro23*) and (Delta2 - Delta1) / Gamma (decay of Ro12).
+    """
+    gamma = coefficients["Gamma"]
+    delta_1, delta_2 = np.asarray(delta_1), np.asarray(delta_2)
+    return np.stack([gamma / (1j * delta_1 + gamma), gamma / (-1j * delta_1 + gamma),
+                     gamma / (1j * delta_2 + gamma), gamma / (-1j * delta_2 + gamma),
+                     (delta_2 - delta_1) / gamma + 0j], axis=-1)
+
+
+def prepare_detuning_basis(mesh: MeshValues, coefficients: Dict[str, complex]) -> np.ndarray:
+    r"""
+    Returns the array (N + 1, 5, 8, 8) of the changes of the diagonal blocks per unit change of each function
+    of the detunings (see calculate_detuning_functions). The diagonal blocks are affine in these functions, thus
+    the changes are identified exactly (up to the rounding) by the relaxation terms evaluated for DETUNING_PROBES.
+    """
+    omega_1 = calculate_omega(mesh.r, coefficients["C1"], coefficients["a"])
+    omega_2 = calculate_omega(mesh.r, coefficients["C2"], coefficients["a"])
+    unit = np.eye(SYSTEM_VAR_NUM, dtype=np.cdouble)[:, :, None]
+    reference = calculate_relaxation_terms(unit, omega_1, omega_2, coefficients)
+
+    scale, changes, probes = abs(coefficients["Gamma"]), list(), list()
+    for change_1, change_2 in DETUNING_PROBES:
+        probe = dict(coefficients, Delta1=coefficients["Delta1"] + change_1 * scale,
+                     Delta2=coefficients["Delta2"] + change_2 * scale)
+        changes.append((calculate_relaxation_terms(unit, omega_1, omega_2, probe) - reference).reshape(-1))
+        probes.append((probe["Delta1"], probe["Delta2"]))
+
+    functions = calculate_detuning_functions(coefficients, *np.array(probes).T) \
+        - calculate_detuning_functions(coefficients, coefficients["Delta1"], coefficients["Delta2"])
+    # relaxation[c, m, j, i] - change of the coefficient of the function j in A(m) in the point i
+    relaxation = np.linalg.solve(functions, np.stack(changes)).reshape(len(DETUNING_PROBES), SYSTEM_VAR_NUM,
+                                                                       SYSTEM_VAR_NUM, -1)
+    return np.ascontiguousarray(-cell_weights(mesh)[:, None, None, None] * relaxation.transpose((3, 0, 1, 2)))
+
+
+def assemble_batch_diagonal(system: BlockTridiagonalSystem,
+                            basis: np.ndarray,
+                            coefficients: Dict[str, complex],
+                            delta_1: np.ndarray,
+                            delta_2: np.ndarray) -> np.ndarray:
+    r"""
+    Returns the array (N + 1, K, 8, 8) of the diagonal blocks of the systems with the given detunings.
+    Parameters
+    ----------
+    system - system assembled with the detunings from the coefficients.
+    basis - changes of the diagonal blocks, see prepare_detuning_basis.
+    coefficients - values of all coefficients, see assembly.prepare_coefficients.
+    delta_1, delta_2 - arrays (K) of the detunings.
+    """
+    functions = calculate_detuning_functions(coefficients, delta_1, delta_2) \
+        - calculate_detuning_functions(coefficients, coefficients["Delta1"], coefficients["Delta2"])
+    points, size = basis.shape[0], SYSTEM_VAR_NUM
+    diagonal = np.matmul(functions[None], basis.reshape(points, -1, size * size)).reshape(points, -1, size, size)
+    diagonal += system.diagonal[:, None]
+    return diagonal
+
+
+def calculate_observables(profiles: np.ndarray,
+                          mesh: MeshValues,
+                          coefficients: Dict[str, complex],
+                          delta_1: np.ndarray,
+                          delta_2: np.ndarray) -> Dict[str, np.ndarray]:
+    r"""
+    Averages the observables over the cross-section of the cell, see module documentation.
+    Parameters
+    ----------
+    profiles - array (K, 8, N + 1) of the values of the functions in the points of the mesh.
+    mesh - values of r in the points of the mesh.
+    coefficients - values of all coefficients, see assembly.prepare_coefficients.
+    delta_1, delta_2 - arrays (K) of the detunings.
+
+    Returns
+    -------
+    Dictionary with the arrays "populations" (K, 3), "coherence" (K) and "absorption" (K, 2).
+    """
+    omega_1 = calculate_omega(mesh.r, coefficients["C1"], coefficients["a"])
+    omega_2 = calculate_omega(mesh.r, coefficients["C2"], coefficients["a"])
+    batch_coefficients = dict(coefficients, Delta1=delta_1[:, None], Delta2=delta_2[:, None])
+    ro_13, _, ro_23, _ = calculate_optical_coherences(profiles.transpose((1, 0, 2)), omega_1, omega_2,
+                                                      batch_coefficients)
+
+    weights = cross_section_weights(mesh)
+
+    def average(values: np.ndarray) -> np.ndarray:
+        return values @ weights
+
+    return {"populations": average(profiles[:, 0:3].real),
+            "coherence": average(profiles[:, 3]),
+            "absorption": np.stack([average(np.imag(np.conj(omega_1) * ro_13)),
+                                    average(np.imag(np.conj(omega_2) * ro_23))], axis=1)}
+
+
+def calculate_spectrum(delta_1: np.ndarray,
+                       delta_2: np.ndarray,
+                       intervals_number: int,
+                       radius: float = DEFAULT_RADIUS,
+                       coefficients: Optional[Dict[str, complex]] = None,
+                       keep_profiles: bool = True,
+                       batch_memory: int = DEFAULT_BATCH_MEMORY) -> Spectrum:
+    r"""
+    Solves the system for each pair of the detunings, see module documentation.
+    Parameters
+    ----------
+    delta_1, delta_2 - arrays (K) of the detunings.
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the other coefficients, which override the default ones.
+    keep_profiles - whether to keep the profiles of the functions (16 * 8 * (N + 1) bytes per pair) or only
+    the observables.
+    batch_memory - limit of the memory in bytes used by the diagonal blocks of a single batch.
+
+    Returns
+    -------
+    Profiles and observables for each pair, see Spectrum.
+    """
+    delta_1, delta_2 = np.asarray(delta_1, dtype=float).reshape(-1), np.asarray(delta_2, dtype=float).reshape(-1)
+    assert delta_1.shape == delta_2.shape, "Arrays of the detunings must have the same size"
+
+    all_coefficients = prepare_coefficients(coefficients)
+    mesh = MeshValues.create(intervals_number, radius)
+    system = assemble_blocks(intervals_number, radius, coefficients)
+    basis = prepare_detuning_basis(mesh, all_coefficients)
+    batch_size = max(1, batch_memory // system.diagonal.nbytes)
+
+    count = delta_1.shape[0]
+    profiles = np.empty((count, SYSTEM_VAR_NUM, intervals_number + 1), dtype=np.cdouble) if keep_profiles else None
+    observables: Dict[str, np.ndarray] = dict()
+    for start in range(0, count, batch_size):
+        batch = slice(start, min(start + batch_size, count))
+        diagonal = assemble_batch_diagonal(system, basis, all_coefficients, delta_1[batch], delta_2[batch])
+        batch_profiles = solve_block_tridiagonal_batch(diagonal, system.lower, system.upper,
+                                                       system.rhs).transpose((1, 2, 0))
+        del diagonal
+        if profiles is not None:
+            profiles[batch] = batch_profiles
+        for name, values in calculate_observables(batch_profiles, mesh, all_coefficients, delta_1[batch],
+                                                  delta_2[batch]).items():
+            observables.setdefault(name, np.empty((count,) + values.shape[1:], dtype=values.dtype))[batch] = values
+
+    return Spectrum(delta_1=delta_1, delta_2=delta_2, profiles=profiles, **observables)
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    n = int(float(arguments[0])) if len(arguments) > 0 else 1000
+    detunings_number = int(float(arguments[1])) if len(arguments) > 1 else 1000
+    max_detuning = float(arguments[2]) if len(arguments) > 2 else 2e4
+
+    detuning = np.linspace(-max_detuning, max_detuning, detunings_number)
+    started = time.perf_counter()
+    spectrum = calculate_spectrum(np.zeros_like(detuning), detuning, n, keep_profiles=False)
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    serial_number = min(detunings_number, 10)
+    for k in range(0, serial_number):
+        solve_block_tridiagonal(assemble_blocks(n, coefficients={"Delta2": detuning[k]}))
+    serial_elapsed = (time.perf_counter() - started) / serial_number
+
+    print(f"CPT spectrum: N = {n}, {detunings_number} detunings in {elapsed:.3f} s "
+          f"({elapsed / detunings_number * 1e3:.3f} ms per detuning, separate solution of each detuning "
+          f"takes {serial_elapsed * 1e3:.3f} ms)\n")
+    print(f"{'Delta2 - Delta1':>15} {'<Ro11>':>10} {'<Ro22>':>10} {'<Ro33>':>12} {'|<Ro12>|':>10} "
+          f"{'absorption 1':>13} {'absorption 2':>13}")
+    for k in np.linspace(0, detunings_number - 1, min(detunings_number, 21)).astype(int):
+        print(f"{spectrum.two_photon_detuning[k]:>15.5g} {spectrum.populations[k, 0]:>10.6f} "
+              f"{spectrum.populations[k, 1]:>10.6f} {spectrum.populations[k, 2]:>12.5e} "
+              f"{abs(spectrum.coherence[k]):>10.6f} {spectrum.absorption[k, 0]:>13.5e} "
+              f"{spectrum.absorption[k, 1]:>13.5e}")
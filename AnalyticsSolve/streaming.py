@@ -0,0 +1,180 @@
+r"""
+This module contains the streaming assembly of the symbolic equation system. Equations are
+emitted by EquationSystem point by point (see EquationSystem.stream_equations), each block of
+8 equations is converted into the matrix elements, appended to the incremental sparse builder and
+discarded, so that only the expressions of a single point of the mesh are kept in memory.
+Alternatively, the matrices of the stencil templates can be evaluated directly in each point,
+so that no equations are instantiated at all.
+
+@author: shvatov
+"""
+from dataclasses import dataclass
+from typing import Tuple, Dict, Sequence, Callable
+
+import numpy as np
+from scipy.sparse import csr_matrix, coo_matrix
+from sympy import linear_eq_to_matrix, Symbol, Expr, sympify, lambdify
+
+from assembly import SYSTEM_VAR_NUM, MeshValues
+from equation import EquationSystem, DEFAULT_RADIUS
+from registry import cached
+
+# Initial capacity of the builder (number of the non-zero elements)
+DEFAULT_BUILDER_CAPACITY = 1024
+
+
+class IncrementalCooBuilder:
+    r"""
+    Builder of the sparse matrix in the COO format, which accepts the elements in chunks.
+    The storage grows geometrically, so that appending is performed in amortized O(1) per element.
+    """
+
+    def __init__(self, shape: Tuple[int, int], capacity: int = DEFAULT_BUILDER_CAPACITY):
+        assert capacity > 0
+        self.shape = shape
+        self.size = 0
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.columns = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.cdouble)
+
+    def __reserve(self, required: int) -> None:
+        capacity = self.rows.shape[0]
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+        self.rows = np.resize(self.rows, capacity)
+        self.columns = np.resize(self.columns, capacity)
+        self.values = np.resize(self.values, capacity)
+
+    def append(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        count = values.shape[0]
+        self.__reserve(self.size + count)
+        self.rows[self.size:self.size + count] = rows
+        self.columns[self.size:self.size + count] = columns
+        self.values[self.size:self.size + count] = values
+        self.size += count
+
+    def build(self) -> csr_matrix:
+        return coo_matrix((self.values[:self.size], (self.rows[:self.size], self.columns[:self.size])),
+                          shape=self.shape).tocsr()
+
+
+def prepare_point_values(eq_system: EquationSystem, i: int) -> Dict[Symbol, Expr]:
+    r"""
+    Returns the values of the symbols, which are used in the equations of the point i:
+    constant coefficients, h and r[i], r[i +- 1/2].
+    """
+    values = {c.symbol: c.value for c in EquationSystem.constant_coefficients()}
+    values[eq_system.h.symbol] = eq_system.h.value
+    values[eq_system.ri[i]] = eq_system.ri.values()[eq_system.ri[i]]
+    if i < eq_system.N:
+        values[eq_system.ri_plus_half[i]] = eq_system.ri_plus_half.values()[eq_system.ri_plus_half[i]]
+    if i > 0:
+        values[eq_system.ri_minus_half[i]] = eq_system.ri_minus_half.values()[eq_system.ri_minus_half[i]]
+    return {k: sympify(v) for k, v in values.items()}
+
+
+def neighbour_points(eq_system: EquationSystem, i: int) -> Sequence[int]:
+    return [p for p in (i - 1, i, i + 1) if 0 <= p <= eq_system.N]
+
+
+@dataclass
+class TemplateBlocks:
+    r"""
+    Lambdified matrices of the stencil templates (see EquationSystem.stencil_templates). Each function accepts
+    r[i], r[i + 1/2], r[i - 1/2], h and the constant coefficients and returns the tuple (A, b), where A contains
+    the coefficients of the variables of the points i - 1 (if present), i and i + 1 (if present).
+    """
+    left: Callable
+    main: Callable
+    right: Callable
+
+
+@cached("streaming.prepare_template_blocks")
+def prepare_template_blocks(modules: str = "numpy") -> TemplateBlocks:
+    r"""
+    Converts the stencil templates into the matrices only once, the result is cached.
+    modules - module used by the lambdified functions ("numpy" or "mpmath" for the arbitrary-precision values).
+    """
+    templates = EquationSystem.stencil_templates()
+    arguments = [templates.ri, templates.ri_plus_half, templates.ri_minus_half, Symbol("h"),
+                 *[c.symbol for c in EquationSystem.constant_coefficients()]]
+
+    def prepare_block(equations: Sequence[Expr], variables: Sequence[Symbol]) -> Callable:
+        A, b = linear_eq_to_matrix(equations, *variables)
+        return lambdify(arguments, [A, b], modules=modules, cse=True)
+
+    return TemplateBlocks(
+        left=prepare_block(templates.left, [*templates.current, *templates.next]),
+        main=prepare_block(templates.main, [*templates.previous, *templates.current, *templates.next]),
+        right=prepare_block(templates.right, templates.current),
+    )
+
+
+def append_point_block(builder: IncrementalCooBuilder,
+                       rhs: np.ndarray,
+                       i: int,
+                       points: Sequence[int],
+                       A: np.ndarray,
+                       b: np.ndarray) -> None:
+    r"""
+    Appends the matrix block (8, 8 * len(points)) of the equations of the point i to the builder.
+    """
+    rows, columns = np.nonzero(A)
+    columns = np.array([p * SYSTEM_VAR_NUM + k for p in points for k in range(SYSTEM_VAR_NUM)])[columns]
+    builder.append(rows + i * SYSTEM_VAR_NUM, columns, A[A != 0])
+    rhs[i * SYSTEM_VAR_NUM:(i + 1) * SYSTEM_VAR_NUM] = b
+
+
+def assemble_streamed_system(intervals_number: int,
+                             radius: float = DEFAULT_RADIUS,
+                             use_templates: bool = True) -> Tuple[csr_matrix, np.ndarray]:
+    r"""
+    Assembles the system Ax = b from the symbolic equations point by point.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    use_templates - if True, then the equations are not instantiated at all: matrices of the stencil templates
+    are evaluated in each point, so that the symbolic work does not depend on N. Otherwise, the equations
+    are emitted by EquationSystem.stream_equations() and converted into the matrix point by point.
+
+    Returns
+    -------
+    Tuple of the sparse matrix A and the vector b.
+    """
+    eq_system = EquationSystem(intervals_number=intervals_number, radius=radius, streaming=True)
+    dimension = (intervals_number + 1) * SYSTEM_VAR_NUM
+
+    builder = IncrementalCooBuilder(shape=(dimension, dimension))
+    rhs = np.zeros(dimension, dtype=np.cdouble)
+    if use_templates:
+        blocks = prepare_template_blocks()
+        mesh = MeshValues.create(intervals_number, radius)
+        coefficients = [c.value for c in EquationSystem.constant_coefficients()]
+        for i in range(0, intervals_number + 1):
+            kernel = blocks.left if i == 0 else blocks.right if i == intervals_number else blocks.main
+            A, b = kernel(mesh.r[i],
+                          mesh.r_plus_half[i] if i < intervals_number else 0.0,
+                          mesh.r_minus_half[i - 1] if i > 0 else 0.0,
+                          mesh.h,
+                          *coefficients)
+            # right boundary equations depend only on the variables of the point itself
+            points = [i] if i == intervals_number else neighbour_points(eq_system, i)
+            append_point_block(builder, rhs, i, points,
+                               np.asarray(A, dtype=np.cdouble), np.asarray(b, dtype=np.cdouble).reshape(-1))
+        return builder.build(), rhs
+
+    for i, point_eqs in enumerate(eq_system.stream_equations()):
+        points = neighbour_points(eq_system, i)
+        local_variables = [v for p in points for v in eq_system.point_variables(p)]
+
+        A, b = linear_eq_to_matrix(point_eqs, *local_variables)
+        values = prepare_point_values(eq_system, i)
+        append_point_block(builder, rhs, i, points,
+                           np.array(A.xreplace(values)).astype(np.cdouble),
+                           np.array(b.xreplace(values)).astype(np.cdouble).reshape(-1))
+
+    return builder.build(), rhs
@@ -1,21 +1,27 @@
 r"""
 Module, which can be used as a standalone application, which performs
-testing of the solutions on different test functions.
+testing of the solutions on different test functions. The matrix of the system is assembled numerically,
+thus it is also compared with the matrix of the symbolic equations (see check_symbolic_matrix), which is stored
+in the snapshot (see snapshot), so that only the first run derives it.
 
 @author: shvatov
 """
 from math import sin, cos
 from typing import Callable, Dict, List, Tuple, Sequence
 
-from sympy import Expr, Symbol
+import numpy as np
+from sympy import Symbol
 
-from equation import EquationSystem
-from solve import solve_system, EquationSystemSolutionParams, SolutionMethod
+from factorized import FactorizedSystem
+from snapshot import SymbolicSnapshot, acquire_snapshot
 
 # System parameters
 N = 40
 R = 3.14
 
+# Maximal relative difference between the assembled and the symbolic matrices
+MATRIX_DELTA = 1e-12
+
 
 def ri_v(i: int) -> float:
     return R / N * i
@@ -45,18 +51,10 @@ TEST_FUNCTIONS_3: Dict[str, Callable[[int], complex]] = {
 }
 
 
-def approximate_test_solution(equations: Sequence[Expr],
-                              variables: Sequence[Symbol],
-                              coefficients: Dict[Symbol, complex],
-                              test_functions: Dict[str, Callable[[int], complex]]) -> Dict[str, complex]:
-    # 1. replace constants in the equation system
-    print("Step 1. replace constants in the equation system...")
-    const_sub_equations = [eq.subs(coefficients) for eq in equations]
-
-    # 2. prepare test function values
-    print("Step 2. prepare test function values...")
-    test_ro_values = dict()
-    for v in variables:
+def prepare_test_values(variables: Sequence[Symbol],
+                        test_functions: Dict[str, Callable[[int], complex]]) -> np.ndarray:
+    test_ro_values = np.empty(len(variables), dtype=np.cdouble)
+    for i, v in enumerate(variables):
         func = v.name[0:v.name.index('[')]
         t_point = int(v.name[v.name.index('[') + 1:v.name.index(']')])
 
@@ -70,35 +68,57 @@ def approximate_test_solution(equations: Sequence[Expr],
         else:
             value = test_functions[func](t_point)
 
-        test_ro_values[v] = value
+        test_ro_values[i] = value
+    return test_ro_values
+
+
+def check_symbolic_matrix(factorized: FactorizedSystem, snapshot: SymbolicSnapshot) -> float:
+    r"""
+    Compares the assembled matrix and right side of the system with linear_eq_to_matrix of the ordered equations
+    with the coefficients substituted (see SymbolicSnapshot.evaluated_matrix).
+    Returns the maximal difference relative to the maximal absolute value of the symbolic matrix (or vector).
+    """
+    A, b = snapshot.evaluated_matrix()
+    A, b = np.array(A, dtype=np.cdouble), np.array(b, dtype=np.cdouble).reshape(-1)
+    matrix_diff = np.abs(factorized.matrix().toarray() - A).max() / np.abs(A).max()
+    rhs_diff = np.abs(factorized.rhs() - b).max() / max(np.abs(b).max(), 1.0)
+    print(f"Max relative diff between the assembled and the symbolic matrices: {matrix_diff}, "
+          f"right sides: {rhs_diff}, bigger than 10^-12: {max(matrix_diff, rhs_diff) > MATRIX_DELTA}")
+    return max(matrix_diff, rhs_diff)
+
+
+def approximate_test_solutions(factorized: FactorizedSystem,
+                               variables: Sequence[Symbol],
+                               test_functions: Sequence[Dict[str, Callable[[int], complex]]]) \
+        -> List[Dict[str, complex]]:
+    # 1. prepare test function values
+    print("Step 1. prepare test function values...")
+    test_ro_values = np.stack([prepare_test_values(variables, functions) for functions in test_functions], axis=1)
 
-    # 3. prepare test variables with S(r) source addition
-    print("Step 3. prepare test variables with S(r) source addition...")
-    s_eq_sources = [eq.subs(test_ro_values) for eq in const_sub_equations]
-    test_equations = [eq - s for eq, s in zip(const_sub_equations, s_eq_sources)]
+    # 2. prepare right sides with S(r) source addition: the equations A x - b - (A x_test - b) = 0
+    print("Step 2. prepare right sides with S(r) source addition...")
+    rhs = factorized.matrix() @ test_ro_values
 
-    # 4. solve the system
-    print("Step 4. solve the system...")
-    params = EquationSystemSolutionParams(method=SolutionMethod.SYMPY)
-    solution = solve_system(test_equations, variables, coefficients, params)
+    # 3. solve all systems at once, the matrix is factorized only once
+    print("Step 3. solve the systems...")
+    solutions = factorized.solve(rhs)
 
-    result = dict()
-    for i, v in enumerate(solution):
-        result[variables[i].name] = v
-    return result
+    return [{v.name: complex(solutions[i, k]) for i, v in enumerate(variables)} for k in range(len(test_functions))]
 
 
 if __name__ == '__main__':
     test_functions = [TEST_FUNCTIONS_1, TEST_FUNCTIONS_2, TEST_FUNCTIONS_3]
-    for i, test_functions_dict in enumerate(test_functions):
+    equation_system = acquire_snapshot(intervals_number=N, radius=R)
+    factorized_system = FactorizedSystem.from_equation_system(equation_system)
+    check_symbolic_matrix(factorized_system, equation_system)
+    solutions = approximate_test_solutions(factorized=factorized_system,
+                                           variables=equation_system.ordered_variables(),
+                                           test_functions=test_functions)
+
+    for i, (test_functions_dict, solution) in enumerate(zip(test_functions, solutions)):
         print(f"\nPerforming tests on {i + 1} test case")
 
         max_diff = 0.0
-        equation_system = EquationSystem.acquire_equation_system(intervals_number=N, radius=R)
-        solution = approximate_test_solution(equations=equation_system.ordered_equations(),
-                                             variables=equation_system.ordered_variables(),
-                                             coefficients=equation_system.coefficients(),
-                                             test_functions=test_functions_dict)
 
         print("Solution:")
         for func_name, sol_value in solution.items():
@@ -0,0 +1,269 @@
+r"""
+This module contains the time-dependent form of the system, which can be used as a standalone application.
+
+The equations of the system are the balances of the diffusion fluxes and the relaxation rates, integrated over
+the cells of the mesh (see assembly.assemble_blocks). Adding the time derivative gives the system of ODE
+
+    M dx/dt = A x - b,
+
+where M = diag(w) and w are the weights of the relaxation terms (h * r[i], see assembly.cell_weights), thus
+the stationary state is the solution of Ax = b. The equations of the Dirichlet point N have zero weight, they are
+algebraic and are always solved implicitly. The system is integrated with the fixed time step dt using
+
+- IMPLICIT_EULER: (M / dt - A) x[n + 1] = M / dt x[n] - b (first order, L-stable);
+- CRANK_NICOLSON: (M / dt - A / 2) x[n + 1] = (M / dt + A / 2) x[n] - b (second order, A-stable, but the stiff
+  relaxation modes (Gamma * dt >> 1) decay slowly and change sign at each step);
+- BDF2: (3 M / (2 dt) - A) x[n + 1] = M / dt (2 x[n] - x[n - 1] / 2) - b (second order, L-stable), the first step
+  is performed by IMPLICIT_EULER.
+
+The matrix of the step is block-tridiagonal as well, it is factorized once (see banded) and reused by all steps,
+so that each step costs a single banded substitution (and a matrix-vector product for CRANK_NICOLSON), the right
+sides are formed in place in the preallocated vectors. The substitution is the bottleneck: at N = 10^4 it takes
+about 9.5 ms (zgbtrs), thus 2000 steps take about 19 s (IMPLICIT_EULER), 23 s (CRANK_NICOLSON) and 20 s (BDF2)
+instead of a few seconds. The block LU factors (see block_tridiagonal) are not used, because their substitution
+loops over the points in Python and takes about 130 ms per step at N = 10^4. The solutions are written
+at the chosen steps into the memory-mapped .npy file, so that the snapshots are not kept in memory.
+Pulses and switchings are modelled by the sequence of runs with different coefficients (e.g. C1, C2 = 0 before
+the switch-on), where the initial state of each run is the final state of the previous one.
+
+Usage: python transient.py [implicit_euler | crank_nicolson | bdf2] [N] [steps] [dt] [snapshot interval]
+
+@author: shvatov
+"""
+import os
+import sys
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import diags
+
+from assembly import SYSTEM_VAR_NUM, RIGHT_BOUNDARY_VALUES, BlockTridiagonalSystem, MeshValues, assemble_blocks, \
+    cell_weights
+from banded import BandedFactorization, factorize_banded_system
+from block_tridiagonal import solve_block_tridiagonal
+from equation import DEFAULT_RADIUS
+
+# Default path of the directory with the snapshots
+DEFAULT_SNAPSHOT_PATH = "../cache/transient"
+
+# Names of the files with the snapshots and their times
+SOLUTIONS_FILE = "solutions.npy"
+TIMES_FILE = "times.npy"
+
+
+class TimeScheme(Enum):
+    """
+    Implicit scheme of the time integration, see module documentation.
+    """
+    IMPLICIT_EULER = 1
+    CRANK_NICOLSON = 2
+    BDF2 = 3
+
+
+@dataclass
+class TransientParams:
+    """
+    Parameters of the time integration.
+
+    time_step - fixed time step dt.
+    steps - number of the steps.
+    snapshot_interval - the solution is written after each snapshot_interval steps (and at the initial moment),
+    0 disables the snapshots.
+    snapshot_path - directory, where the snapshots are written.
+    """
+    scheme: TimeScheme = TimeScheme.BDF2
+    time_step: float = 1e-3
+    steps: int = 1000
+    snapshot_interval: int = 100
+    snapshot_path: str = DEFAULT_SNAPSHOT_PATH
+
+
+@dataclass
+class TransientReport:
+    """
+    Statistics of the time integration.
+
+    factorizations - number of the factorized step matrices (2 for BDF2 because of the first step).
+    factorization_time, stepping_time - time in seconds spent on the factorizations and on the steps.
+    snapshots - number of the written snapshots.
+    stationary_residual - max(abs(b - Ax)) of the final state, which shows how far it is from the stationary one.
+    """
+    scheme: TimeScheme
+    steps: int
+    final_time: float
+    factorizations: int = 0
+    factorization_time: float = 0.0
+    stepping_time: float = 0.0
+    snapshots: int = 0
+    stationary_residual: float = 0.0
+
+
+class SnapshotWriter:
+    r"""
+    Writes the solutions into the memory-mapped array (count, dimension) stored in the .npy file.
+    """
+
+    def __init__(self, path: str, count: int, dimension: int):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.size = 0
+        self.times = np.empty(count)
+        self.solutions = np.lib.format.open_memmap(os.path.join(path, SOLUTIONS_FILE), mode="w+",
+                                                   dtype=np.cdouble, shape=(count, dimension))
+
+    def write(self, moment: float, solution: np.ndarray) -> None:
+        self.solutions[self.size] = solution
+        self.times[self.size] = moment
+        self.size += 1
+
+    def close(self) -> None:
+        self.solutions.flush()
+        del self.solutions
+        np.save(os.path.join(self.path, TIMES_FILE), self.times[:self.size])
+
+
+def load_snapshots(path: str = DEFAULT_SNAPSHOT_PATH) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Returns the times of the snapshots and the read-only memory-mapped array of the solutions (count, dimension).
+    """
+    times = np.load(os.path.join(path, TIMES_FILE))
+    return times, np.load(os.path.join(path, SOLUTIONS_FILE), mmap_mode="r")[:times.shape[0]]
+
+
+def prepare_mass_diagonal(intervals_number: int, radius: float = DEFAULT_RADIUS) -> np.ndarray:
+    r"""
+    Returns the array (N + 1, 8) of the diagonal of M.
+    """
+    weight = cell_weights(MeshValues.create(intervals_number, radius))
+    return np.repeat(weight[:, None], SYSTEM_VAR_NUM, axis=1)
+
+
+def prepare_step_system(system: BlockTridiagonalSystem, mass: np.ndarray, mass_factor: float,
+                        theta: float) -> BlockTridiagonalSystem:
+    r"""
+    Returns the blocks of the step matrix mass_factor * M - theta * A, theta = 1 in the algebraic equations (M = 0).
+    The right side is not used by the steps and is left zero.
+    """
+    theta = np.where(mass > 0, theta, 1.0)
+    diagonal = -theta[:, :, None] * system.diagonal
+    np.einsum("ikk->ik", diagonal)[:] += mass_factor * mass
+    return BlockTridiagonalSystem(diagonal=diagonal,
+                                  lower=-theta[1:] * system.lower,
+                                  upper=-theta[:-1] * system.upper,
+                                  rhs=np.zeros_like(system.rhs))
+
+
+def factorize_step(system: BlockTridiagonalSystem, mass: np.ndarray, mass_factor: float, theta: float,
+                   report: TransientReport) -> BandedFactorization:
+    start = time.perf_counter()
+    factorization, _ = factorize_banded_system(prepare_step_system(system, mass, mass_factor, theta).to_csr())
+    report.factorizations += 1
+    report.factorization_time += time.perf_counter() - start
+    return factorization
+
+
+def integrate(intervals_number: int,
+              radius: float = DEFAULT_RADIUS,
+              coefficients: Optional[Dict[str, complex]] = None,
+              params: Optional[TransientParams] = None,
+              initial: Optional[np.ndarray] = None) -> Tuple[np.ndarray, TransientReport]:
+    r"""
+    Integrates the system M dx/dt = Ax - b with the fixed time step.
+    Parameters
+    ----------
+    intervals_number - number of the intervals in the mesh (N).
+    radius - radius of the area (R).
+    coefficients - values of the coefficients, which override the default ones.
+    params - parameters of the integration, see TransientParams.
+    initial - initial state ordered as EquationSystem.ordered_variables(), by default the values of the right border
+    (see assembly.RIGHT_BOUNDARY_VALUES) in all points, i.e. the state without the fields.
+
+    Returns
+    -------
+    Tuple of the final state and the statistics of the integration, see TransientReport.
+    """
+    params = params if params is not None else TransientParams()
+    assert params.time_step > 0
+    assert params.steps > 0
+    assert params.snapshot_interval >= 0
+
+    system = assemble_blocks(intervals_number, radius, coefficients)
+    A, b = system.to_csr(), system.rhs_vector()
+    mass = prepare_mass_diagonal(intervals_number, radius)
+    mass_rate, dt = mass.reshape(-1) / params.time_step, params.time_step
+    x = np.tile(RIGHT_BOUNDARY_VALUES, intervals_number + 1) if initial is None \
+        else np.array(initial, dtype=np.cdouble).reshape(-1)
+    assert x.shape[0] == system.dimension, f"Initial state must have {system.dimension} elements"
+
+    report = TransientReport(scheme=params.scheme, steps=params.steps, final_time=params.steps * dt)
+    writer = None
+    if params.snapshot_interval > 0:
+        writer = SnapshotWriter(params.snapshot_path, params.steps // params.snapshot_interval + 1, system.dimension)
+        writer.write(0.0, x)
+
+    theta = 0.5 if params.scheme == TimeScheme.CRANK_NICOLSON else 1.0
+    mass_factor = 3 / (2 * dt) if params.scheme == TimeScheme.BDF2 else 1 / dt
+    factorization = factorize_step(system, mass, mass_factor, theta, report)
+    first_step = factorize_step(system, mass, 1 / dt, 1.0, report) if params.scheme == TimeScheme.BDF2 \
+        else factorization
+    half_rate = 0.5 * mass_rate if params.scheme == TimeScheme.BDF2 else None
+    # explicit part M / dt + A / 2 of CRANK_NICOLSON, theta = 1 in the algebraic equations, thus A is not added to them
+    explicit = (diags(mass_rate) + diags(np.where(mass_rate > 0, 0.5, 0.0)) @ A).tocsr() \
+        if params.scheme == TimeScheme.CRANK_NICOLSON else None
+
+    # the right side is formed in place in the buffer, which is overwritten by the solution, then the buffers
+    # are rotated, so that the steps do not allocate the vectors (except A x[n] of CRANK_NICOLSON)
+    start, previous, rhs = time.perf_counter(), None, np.empty_like(x)
+    for step in range(1, params.steps + 1):
+        if params.scheme == TimeScheme.IMPLICIT_EULER or previous is None and params.scheme == TimeScheme.BDF2:
+            np.multiply(mass_rate, x, out=rhs)
+            rhs -= b
+            solution = first_step.solve(rhs, overwrite_rhs=True)
+        elif params.scheme == TimeScheme.CRANK_NICOLSON:
+            np.subtract(explicit @ x, b, out=rhs)
+            solution = factorization.solve(rhs, overwrite_rhs=True)
+        else:
+            # M / dt (2 x[n] - x[n - 1] / 2) = M / (2 dt) (4 x[n] - x[n - 1])
+            np.multiply(x, 4.0, out=rhs)
+            rhs -= previous
+            rhs *= half_rate
+            rhs -= b
+            solution = factorization.solve(rhs, overwrite_rhs=True)
+
+        if params.scheme == TimeScheme.BDF2:
+            previous, x, rhs = x, solution, previous if previous is not None else np.empty_like(x)
+        else:
+            x, rhs = solution, x
+
+        if writer is not None and step % params.snapshot_interval == 0:
+            writer.write(step * dt, x)
+    report.stepping_time = time.perf_counter() - start
+
+    if writer is not None:
+        report.snapshots = writer.size
+        writer.close()
+    report.stationary_residual = float(np.abs(b - A @ x).max())
+    return x, report
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    scheme = TimeScheme[arguments[0].upper()] if arguments else TimeScheme.BDF2
+    n = int(float(arguments[1])) if len(arguments) > 1 else 10 ** 4
+    transient_params = TransientParams(scheme=scheme,
+                                       steps=int(float(arguments[2])) if len(arguments) > 2 else 1000,
+                                       time_step=float(arguments[3]) if len(arguments) > 3 else 1e-3,
+                                       snapshot_interval=int(arguments[4]) if len(arguments) > 4 else 100)
+
+    final_state, transient_report = integrate(n, params=transient_params)
+    stationary = solve_block_tridiagonal(assemble_blocks(n))
+    print(f"Transient solver: {transient_report.scheme.name}, N = {n}, {transient_report.steps} steps "
+          f"of {transient_params.time_step}, t = {transient_report.final_time}")
+    print(f"Factorizations: {transient_report.factorizations} in {transient_report.factorization_time:.3f} s, "
+          f"steps: {transient_report.stepping_time:.3f} s, snapshots: {transient_report.snapshots} "
+          f"in {transient_params.snapshot_path}")
+    print(f"Max(abs(b - Ax)) of the final state = {transient_report.stationary_residual}, "
+          f"max difference from the stationary state = {np.abs(final_state - stationary).max()}")